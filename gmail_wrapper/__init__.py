@@ -1,5 +1,7 @@
 from gmail_wrapper.client import GmailClient
+from gmail_wrapper.pool import GmailClientPool
 
 __all__ = (
-    "GmailClient"
+    "GmailClient",
+    "GmailClientPool",
 )
@@ -0,0 +1,427 @@
+import asyncio
+
+import httplib2
+from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from gmail_wrapper.async_entities import AsyncMessage
+from gmail_wrapper.client import GmailClient
+from gmail_wrapper.entities import AttachmentBody, Label
+from gmail_wrapper.exceptions import (
+    MessageNotFoundError,
+    AttachmentNotFoundError,
+    GmailError,
+    LabelNotFoundError,
+)
+from gmail_wrapper.label_index import is_label_id, resolve_label_ids
+from gmail_wrapper.service import build_request_service
+
+
+class _RequestBuilder(GmailClient):
+    """
+    GmailClient that only sets credentials up and builds requests for
+    AsyncGmailClient: it neither refreshes the credentials (the async client
+    does, off the event loop) nor holds a transport.
+    """
+
+    def _refresh_credentials(self):
+        pass
+
+    def _build_service(self):
+        return build_request_service()
+
+
+class AsyncGmailClient:
+    """
+    asyncio counterpart of GmailClient, running requests over a pooled
+    aiohttp session. Requires the "async" extra (pip install gmail-wrapper[async]).
+
+    Credentials are set up exactly as in GmailClient, which also builds the
+    requests; only their execution is asynchronous, and credentials are
+    refreshed on the first request, off the event loop. Use it as an async
+    context manager, or await close() when done.
+    """
+
+    API_ENDPOINT = "https://gmail.googleapis.com/"
+    DEFAULT_POOL_SIZE = 100
+    DEFAULT_TIMEOUT = 60
+
+    def __init__(
+        self,
+        email,
+        secrets_json_string,
+        scopes=None,
+        client_strategy=None,
+        token_cache=None,
+        pool_size=None,
+        timeout=None,
+        api_endpoint=None,
+        label_ttl=None,
+    ):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncGmailClient requires aiohttp, install gmail-wrapper[async]"
+            )
+
+        self._sync_client = _RequestBuilder(
+            email,
+            secrets_json_string,
+            scopes=scopes,
+            client_strategy=client_strategy,
+            token_cache=token_cache,
+            label_ttl=label_ttl,
+        )
+        self.email = email
+        self.pool_size = pool_size if pool_size else AsyncGmailClient.DEFAULT_POOL_SIZE
+        self.timeout = timeout if timeout else AsyncGmailClient.DEFAULT_TIMEOUT
+        self.api_endpoint = (
+            api_endpoint if api_endpoint else AsyncGmailClient.API_ENDPOINT
+        )
+        self._session = None
+        self._refresh_lock = None
+        self._message_gets = {}
+
+    @property
+    def credentials(self):
+        return self._sync_client.credentials
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._refresh_lock = asyncio.Lock()
+
+        return self._session
+
+    async def _refresh_credentials(self):
+        async with self._refresh_lock:
+            if not self.credentials.valid:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.credentials.refresh, Request()
+                )
+
+    async def _execute(self, executable):
+        session = self._get_session()
+        if not self.credentials.valid:
+            await self._refresh_credentials()
+
+        headers = dict(executable.headers)
+        self.credentials.apply(headers)
+        uri = executable.uri.replace(
+            AsyncGmailClient.API_ENDPOINT, self.api_endpoint, 1
+        )
+
+        async with session.request(
+            executable.method, uri, data=executable.body, headers=headers
+        ) as response:
+            content = await response.read()
+            resp = httplib2.Response(
+                {"status": response.status, **dict(response.headers)}
+            )
+            resp.reason = response.reason
+
+        try:
+            return executable.postproc(resp, content)
+        except HttpError as e:
+            if e.resp.status >= 500:
+                raise GmailError()
+            raise e
+
+    def _messages_resource(self):
+        return self._sync_client._messages_resource()
+
+    def _labels_resource(self):
+        return self._sync_client._labels_resource()
+
+    async def get_raw_messages(
+        self, query="", limit=None, page_token=None, fields=None
+    ):
+        arguments = {"userId": self.email, "q": query, "maxResults": limit}
+
+        if page_token:
+            arguments.update({"pageToken": page_token})
+
+        return await self._execute(
+            self._messages_resource().list(
+                **self._sync_client._with_fields(arguments, fields)
+            )
+        )
+
+    async def get_messages_paginated(
+        self,
+        query="",
+        limit=None,
+        page_token=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        raw_messages = await self.get_raw_messages(
+            query,
+            limit,
+            page_token,
+            GmailClient._list_fields("messages", None if hydrate else fields),
+        )
+
+        if "messages" not in raw_messages:
+            return [], None
+
+        messages = [
+            AsyncMessage(self, raw_message, fields=None if hydrate else fields)
+            for raw_message in raw_messages["messages"]
+        ]
+
+        if hydrate:
+            await self.hydrate_messages(messages, format, metadata_headers, fields)
+
+        return messages, raw_messages.get("nextPageToken")
+
+    async def get_messages(
+        self,
+        query="",
+        limit=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        messages, _ = await self.get_messages_paginated(
+            query, limit, None, hydrate, format, metadata_headers, fields
+        )
+
+        return messages
+
+    async def hydrate_messages(
+        self, messages, format=None, metadata_headers=None, fields=None
+    ):
+        raw_messages = await asyncio.gather(
+            *[
+                self.get_raw_message(message.id, format, metadata_headers, fields)
+                for message in messages
+            ]
+        )
+
+        for message, raw_message in zip(messages, raw_messages):
+            message._update(
+                raw_message, format or GmailClient.FORMAT_FULL, metadata_headers, fields
+            )
+
+        return messages
+
+    async def get_raw_message(
+        self, id, format=None, metadata_headers=None, fields=None
+    ):
+        """
+        Concurrent gets of the same message are coalesced into a single
+        request, whose raw message is shared by every caller.
+        """
+        key = (id, format, tuple(metadata_headers or ()), fields)
+        task = self._message_gets.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._get_raw_message(id, format, metadata_headers, fields)
+            )
+            self._message_gets[key] = task
+            task.add_done_callback(lambda _: self._message_gets.pop(key, None))
+
+        # Shielded, so a cancelled caller doesn't cancel the others' request
+        return await asyncio.shield(task)
+
+    async def _get_raw_message(self, id, format, metadata_headers, fields):
+        try:
+            return await self._execute(
+                self._messages_resource().get(
+                    **self._sync_client._message_get_arguments(
+                        id, format, metadata_headers, fields
+                    )
+                )
+            )
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise MessageNotFoundError(id)
+            raise e
+
+    async def get_message(self, id, format=None, metadata_headers=None, fields=None):
+        raw_message = await self.get_raw_message(id, format, metadata_headers, fields)
+        raw_message.setdefault("id", id)
+
+        return AsyncMessage(self, raw_message, format, metadata_headers, fields)
+
+    async def resolve_labels(self, labels, strict=True):
+        """
+        Maps label names (or ids, kept as they are) to label ids, like
+        GmailClient.resolve_labels, listing the labels without blocking when
+        a name is given and the label index is stale. Names are then looked
+        up in the labels loaded, never listing them synchronously.
+        """
+        label_index = self._sync_client.label_index
+        if not label_index.is_fresh and not all(
+            is_label_id(label) for label in labels or []
+        ):
+            label_index.load(await self.get_labels())
+
+        return resolve_label_ids(labels, label_index.peek, strict)
+
+    async def modify_raw_message(self, id, add_labels=None, remove_labels=None):
+        """
+        Labels may be given by name or id.
+        """
+        add_label_ids = await self.resolve_labels(add_labels, strict=False)
+        remove_label_ids = await self.resolve_labels(remove_labels, strict=False)
+
+        try:
+            return await self._execute(
+                self._messages_resource().modify(
+                    userId=self.email,
+                    id=id,
+                    body={
+                        "addLabelIds": add_label_ids,
+                        "removeLabelIds": remove_label_ids,
+                    },
+                )
+            )
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise MessageNotFoundError(id)
+            raise e
+
+    async def modify_message(self, id, add_labels=None, remove_labels=None):
+        raw_modified_message = await self.modify_raw_message(
+            id, add_labels, remove_labels
+        )
+
+        return AsyncMessage(self, raw_modified_message)
+
+    async def modify_multiple_messages(self, ids, add_labels=None, remove_labels=None):
+        """
+        Labels may be given by name or id.
+        """
+        await self._execute(
+            self._messages_resource().batchModify(
+                userId=self.email,
+                body={
+                    "ids": ids,
+                    "addLabelIds": await self.resolve_labels(add_labels, strict=False),
+                    "removeLabelIds": await self.resolve_labels(
+                        remove_labels, strict=False
+                    ),
+                },
+            )
+        )
+
+    async def get_raw_attachment_body(self, id, message_id, fields=None):
+        arguments = {"userId": self.email, "id": id, "messageId": message_id}
+
+        try:
+            return await self._execute(
+                self._messages_resource()
+                .attachments()
+                .get(**self._sync_client._with_fields(arguments, fields))
+            )
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise AttachmentNotFoundError(message_id, id)
+            raise e
+
+    async def get_attachment_body(self, id, message_id, fields=None):
+        raw_attachment_body = await self.get_raw_attachment_body(id, message_id, fields)
+
+        return AttachmentBody(raw_attachment_body)
+
+    async def get_raw_labels(self, fields=None):
+        return await self._execute(
+            self._labels_resource().list(
+                **self._sync_client._with_fields({"userId": self.email}, fields)
+            )
+        )
+
+    async def get_raw_label(self, label_id, fields=None):
+        try:
+            return await self._execute(
+                self._labels_resource().get(
+                    **self._sync_client._with_fields(
+                        {"userId": self.email, "id": label_id}, fields
+                    )
+                )
+            )
+        except HttpError as exception:
+            if exception.resp.status == 404:
+                raise LabelNotFoundError(label_id)
+            raise exception
+
+    async def get_labels(self, fields=None):
+        raw_labels = await self.get_raw_labels(
+            GmailClient._list_fields("labels", fields, paginated=False)
+        )
+
+        if "labels" not in raw_labels:
+            return []
+
+        return [Label(raw_label) for raw_label in raw_labels["labels"]]
+
+    async def get_label(self, label_id, fields=None):
+        raw_label = await self.get_raw_label(label_id, fields)
+
+        return Label(raw_label)
+
+    async def send_raw(
+        self,
+        subject,
+        html_content,
+        to,
+        cc=None,
+        bcc=None,
+        references=None,
+        in_reply_to=None,
+        thread_id=None,
+    ):
+        sendable = self._sync_client._make_sendable_message(
+            subject,
+            html_content,
+            to,
+            cc if cc else [],
+            bcc if bcc else [],
+            references if references else [],
+            in_reply_to if in_reply_to else [],
+            thread_id,
+        )
+
+        return await self._execute(
+            self._messages_resource().send(userId=self.email, body=sendable)
+        )
+
+    async def send(
+        self,
+        subject,
+        html_content,
+        to,
+        cc=None,
+        bcc=None,
+        references=None,
+        in_reply_to=None,
+        thread_id=None,
+    ):
+        raw_sent_message = await self.send_raw(
+            subject, html_content, to, cc, bcc, references, in_reply_to, thread_id
+        )
+
+        return AsyncMessage(self, raw_sent_message)
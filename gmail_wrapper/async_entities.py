@@ -0,0 +1,256 @@
+from gmail_wrapper.entities import (
+    Attachment,
+    BodyPart,
+    Message,
+    FORMAT_MINIMAL,
+    FORMAT_METADATA,
+    FORMAT_FULL,
+    FORMAT_RAW,
+)
+
+
+class AsyncAttachment(Attachment):
+    __slots__ = ()
+
+    @property
+    async def body(self):
+        if not self._body.has_data:
+            self._body = await self._client.get_attachment_body(
+                self.id, self.message_id
+            )
+
+        return self._body
+
+    @property
+    async def content(self):
+        return (await self.body).content
+
+    async def iter_content(self, chunk_size=None):
+        for chunk in (await self.body).iter_content(chunk_size):
+            yield chunk
+
+    async def save_to(self, destination, chunk_size=None, memory_map=False):
+        return (await self.body).save_to(destination, chunk_size, memory_map)
+
+
+class AsyncBodyPart(AsyncAttachment, BodyPart):
+    __slots__ = ()
+
+    @property
+    async def body(self):
+        if self.id is not None and not self._body.has_data:
+            self._body = await self._client.get_attachment_body(
+                self.id, self.message_id
+            )
+
+        return self._body
+
+    @property
+    async def text(self):
+        if self._text is None:
+            self._text = self._decode((await self.body).content)
+
+        return self._text
+
+    async def get_text(self, max_size=None):
+        if self._exceeds(max_size):
+            return None
+
+        return await self.text
+
+
+class AsyncMessage(Message):
+    """
+    Message bound to an AsyncGmailClient. Properties that may need to fetch
+    the message are awaitable (e.g. await message.subject), while the ones
+    always at hand (id) stay plain.
+    """
+
+    __slots__ = ()
+
+    def _fetch(self, format, metadata_headers=None):
+        raise RuntimeError(
+            "AsyncMessage can't fetch synchronously, await its properties instead"
+        )
+
+    async def _afetch(self, format, metadata_headers=None):
+        format = self._fetch_format(format)
+
+        if format == FORMAT_FULL:
+            self._update(await self._client.get_raw_message(self.id), FORMAT_FULL)
+        else:
+            raw_message = await self._client.get_raw_message(
+                self.id, format=format, metadata_headers=metadata_headers
+            )
+            self._update(raw_message, format, metadata_headers)
+
+    def _fetch_raw(self):
+        raise RuntimeError(
+            "AsyncMessage can't fetch synchronously, await its properties instead"
+        )
+
+    async def _ensure_raw(self):
+        if "raw" not in self._raw:
+            self._raw.update(
+                await self._client.get_raw_message(self.id, format=FORMAT_RAW)
+            )
+
+    async def _ensure(self, format, path):
+        if not self._holds(format, path):
+            await self._afetch(format)
+
+    async def _aheader(self, name):
+        if self._is_header_left_out(name):
+            await self._afetch(FORMAT_METADATA)
+
+        return (await self.headers).get(name)
+
+    @property
+    async def headers(self):
+        if self._headers is None:
+            await self._ensure(FORMAT_METADATA, "payload.headers")
+
+        return Message.headers.fget(self)
+
+    @property
+    async def labels(self):
+        if "labelIds" not in self._raw:
+            await self._ensure(FORMAT_MINIMAL, "labelIds")
+
+        return Message.labels.fget(self)
+
+    @property
+    async def subject(self):
+        return await self._aheader("Subject")
+
+    @property
+    async def from_address(self):
+        return await self._aheader("From")
+
+    @property
+    async def reply_to(self):
+        return await self._aheader("Reply-To")
+
+    @property
+    async def message_id(self):
+        return await self._aheader("Message-ID")
+
+    @property
+    async def thread_id(self):
+        if "threadId" not in self._raw:
+            await self._ensure(FORMAT_MINIMAL, "threadId")
+
+        return Message.thread_id.fget(self)
+
+    @property
+    async def date(self):
+        if "internalDate" not in self._raw:
+            await self._ensure(FORMAT_MINIMAL, "internalDate")
+
+        return Message.date.fget(self)
+
+    def _make_attachment(self, raw_part):
+        return AsyncAttachment(self.id, self._client, raw_part)
+
+    @property
+    async def parts(self):
+        if self._parts is None:
+            await self._ensure(FORMAT_FULL, "payload.parts")
+
+        return Message.parts.fget(self)
+
+    @property
+    async def attachments(self):
+        if self._attachments is None and self._attachment_parts is None:
+            await self._ensure(FORMAT_FULL, "payload.parts")
+
+        return Message.attachments.fget(self)
+
+    def _is_raw_backed(self):
+        # Parts of raw messages are decoded synchronously: async messages
+        # always read them from the payload
+        return False
+
+    @property
+    async def mime(self):
+        if self._mime is None:
+            await self._ensure_raw()
+
+        return Message.mime.fget(self)
+
+    async def iter_raw(self, chunk_size=None):
+        await self._ensure_raw()
+        for chunk in Message.iter_raw(self, chunk_size):
+            yield chunk
+
+    async def save_raw_to(self, destination, chunk_size=None):
+        await self._ensure_raw()
+
+        return Message.save_raw_to(self, destination, chunk_size)
+
+    def _make_body_part(self, raw_part):
+        return AsyncBodyPart(self.id, self._client, raw_part)
+
+    async def iter_body_parts(self):
+        await self.parts
+        for body_part in Message.iter_body_parts(self):
+            yield body_part
+
+    @property
+    async def text_part(self):
+        await self.parts
+
+        return Message.text_part.fget(self)
+
+    @property
+    async def html_part(self):
+        await self.parts
+
+        return Message.html_part.fget(self)
+
+    @property
+    async def text_body(self):
+        return await self.get_text_body(self.MAX_BODY_SIZE)
+
+    @property
+    async def html_body(self):
+        return await self.get_html_body(self.MAX_BODY_SIZE)
+
+    async def get_text_body(self, max_size=None):
+        text_part = await self.text_part
+
+        return await text_part.get_text(max_size) if text_part else None
+
+    async def get_html_body(self, max_size=None):
+        html_part = await self.html_part
+
+        return await html_part.get_text(max_size) if html_part else None
+
+    @property
+    async def inline_images(self):
+        await self.parts
+
+        return Message.inline_images.fget(self)
+
+    async def modify(self, add_labels=None, remove_labels=None):
+        raw_modified_message = await self._client.modify_raw_message(
+            self.id, add_labels=add_labels, remove_labels=remove_labels
+        )
+        self._update_labels(raw_modified_message)
+
+    async def reply(self, html_content, use_reply_to=True):
+        reply_to = await self.reply_to
+        to = reply_to if (reply_to and use_reply_to) else await self.from_address
+        message_id = await self.message_id
+
+        return await self._client.send(
+            subject=f"Re:{await self.subject}",
+            html_content=html_content,
+            to=to,
+            references=[message_id],
+            in_reply_to=[message_id],
+            thread_id=await self.thread_id,
+        )
+
+    async def archive(self):
+        await self.modify(remove_labels=["INBOX"])
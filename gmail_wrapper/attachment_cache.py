@@ -0,0 +1,189 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+
+
+class AttachmentCache:
+    """
+    Stores decoded attachment contents by (mailbox email address, message id,
+    attachment id), so one cache can be shared by the clients of many
+    mailboxes.
+    """
+
+    def get(self, email, message_id, attachment_id):
+        raise NotImplementedError
+
+    def set(self, email, message_id, attachment_id, content):
+        raise NotImplementedError
+
+
+class DiskAttachmentCache(AttachmentCache):
+    """
+    Attachment cache shared by every process pointing at the same directory.
+    Contents are stored once per sha256 digest, so the same blob forwarded in
+    many messages takes its size only once, and the least recently used blobs
+    are evicted once they add up to more than max_size bytes. An sqlite index
+    serializes writers; blobs are written to a temporary file and renamed in
+    place, so readers never see a partial one.
+    """
+
+    DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+    def __init__(self, directory, max_size=None, timeout=30):
+        self.directory = directory
+        self.max_size = (
+            max_size if max_size is not None else DiskAttachmentCache.DEFAULT_MAX_SIZE
+        )
+        self.timeout = timeout
+        os.makedirs(os.path.join(directory, "blobs"), mode=0o700, exist_ok=True)
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, "
+                    "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS attachments (email TEXT NOT NULL, "
+                    "message_id TEXT NOT NULL, attachment_id TEXT NOT NULL, "
+                    "digest TEXT NOT NULL, "
+                    "PRIMARY KEY (email, message_id, attachment_id))"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS attachments_digest "
+                    "ON attachments (digest)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed)"
+                )
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite"),
+            timeout=self.timeout,
+            isolation_level=None,
+        )
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def get(self, email, message_id, attachment_id):
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT digest FROM attachments "
+                "WHERE email = ? AND message_id = ? AND attachment_id = ?",
+                (email, message_id, attachment_id),
+            ).fetchone()
+            if row is None:
+                return None
+
+            try:
+                with open(self._blob_path(row[0]), "rb") as file:
+                    content = file.read()
+            except FileNotFoundError:
+                # Evicted by another process between the lookup and the read
+                return None
+
+            connection.execute(
+                "UPDATE blobs SET accessed = ? WHERE digest = ?", (time.time(), row[0])
+            )
+        finally:
+            connection.close()
+
+        return content
+
+    def set(self, email, message_id, attachment_id, content):
+        if len(content) > self.max_size:
+            return
+
+        digest = hashlib.sha256(content).hexdigest()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._has_blob(connection, digest):
+                    self._write_blob(digest, content)
+                connection.execute(
+                    "INSERT OR REPLACE INTO blobs (digest, size, accessed) "
+                    "VALUES (?, ?, ?)",
+                    (digest, len(content), time.time()),
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO attachments "
+                    "(email, message_id, attachment_id, digest) VALUES (?, ?, ?, ?)",
+                    (email, message_id, attachment_id, digest),
+                )
+                self._evict(connection, digest)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+
+    def _has_blob(self, connection, digest):
+        row = connection.execute(
+            "SELECT 1 FROM blobs WHERE digest = ?", (digest,)
+        ).fetchone()
+
+        return row is not None and os.path.exists(self._blob_path(digest))
+
+    def _write_blob(self, digest, content):
+        path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(content)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def _evict(self, connection, keep_digest):
+        total_size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM blobs"
+        ).fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        rows = connection.execute(
+            "SELECT digest, size FROM blobs WHERE digest != ? ORDER BY accessed",
+            (keep_digest,),
+        ).fetchall()
+        for digest, size in rows:
+            if total_size <= self.max_size:
+                break
+            connection.execute("DELETE FROM attachments WHERE digest = ?", (digest,))
+            connection.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            try:
+                os.unlink(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def __len__(self):
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM attachments").fetchone()[0]
+        finally:
+            connection.close()
+
+    @property
+    def size(self):
+        """
+        Bytes taken by the cached blobs, each distinct content counted once.
+        """
+        connection = self._connect()
+        try:
+            return connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()[0]
+        finally:
+            connection.close()
@@ -0,0 +1,80 @@
+from itertools import islice
+
+from gmail_wrapper.exceptions import GmailError
+from gmail_wrapper.scheduler import is_retryable
+
+
+def iter_id_chunks(items, size, allow_empty=False):
+    """
+    Splits an iterable of ids or messages (e.g. iter_messages) into lists of
+    up to size ids, consuming it lazily. With allow_empty, an empty iterable
+    still yields one empty chunk.
+    """
+    iterator = iter(items)
+    while True:
+        chunk = [getattr(item, "id", item) for item in islice(iterator, size)]
+        if not chunk and not allow_empty:
+            return
+        yield chunk
+        if len(chunk) < size:
+            return
+        allow_empty = False
+
+
+def is_chunk_retryable(exception):
+    return isinstance(exception, GmailError) or is_retryable(exception)
+
+
+class ChunkResult:
+    """
+    Outcome of one request of a bulk operation: the ids it covered and the
+    error it failed with, if any. When the ids failed one by one (in a batch
+    request), errors holds the error of each.
+    """
+
+    __slots__ = ("ids", "error", "attempts", "errors")
+
+    def __init__(self, ids, error=None, attempts=1, errors=None):
+        self.ids = ids
+        self.error = error
+        self.attempts = attempts
+        self.errors = errors
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __str__(self):
+        return "Bulk chunk of {} ids: {}".format(
+            len(self.ids), "ok" if self.ok else self.error
+        )
+
+
+def split_chunk_results(ids, errors, attempts=1):
+    """
+    Results of a chunk whose ids failed one by one: the ids that went
+    through, then the failed ones grouped by whether they can be retried,
+    so a retry sends only those.
+    """
+    results = []
+    succeeded = [id for id in ids if id not in errors]
+    if succeeded:
+        results.append(ChunkResult(succeeded, attempts=attempts))
+
+    for retryable in (True, False):
+        failed = [
+            id
+            for id in ids
+            if id in errors and is_chunk_retryable(errors[id]) == retryable
+        ]
+        if failed:
+            results.append(
+                ChunkResult(
+                    failed,
+                    errors[failed[0]],
+                    attempts,
+                    {id: errors[id] for id in failed},
+                )
+            )
+
+    return results
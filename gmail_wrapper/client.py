@@ -1,21 +1,57 @@
 import base64
+import copy
 import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
 from google.oauth2.credentials import Credentials
-from googleapiclient import discovery
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 
-from gmail_wrapper.entities import Message, AttachmentBody, Label
+from gmail_wrapper.bulk import (
+    ChunkResult,
+    is_chunk_retryable,
+    iter_id_chunks,
+    split_chunk_results,
+)
+from gmail_wrapper.entities import (
+    Message,
+    AttachmentBody,
+    Label,
+    Thread,
+    FORMAT_MINIMAL,
+    FORMAT_METADATA,
+    FORMAT_FULL,
+    FORMAT_RAW,
+)
+from gmail_wrapper.label_index import LabelIndex, resolve_label_ids
+from gmail_wrapper.scheduler import QUOTA_UNITS, is_idempotent, quota_units
+from gmail_wrapper.service import build_service
+from gmail_wrapper.single_flight import SingleFlight
+from gmail_wrapper.sync import MailboxSync
+from gmail_wrapper.token_cache import CachedCredentials
+from gmail_wrapper.transport import PooledHttp
 from gmail_wrapper.exceptions import (
     MessageNotFoundError,
     AttachmentNotFoundError,
     GmailError, LabelNotFoundError,
+    HistoryNotFoundError,
+    ThreadNotFoundError,
+    BulkOperationError,
 )
 
 
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
 class GmailClient:
     SCOPE_LABELS = "https://www.googleapis.com/auth/gmail.labels"
     SCOPE_SEND = "https://www.googleapis.com/auth/gmail.send"
@@ -24,40 +60,88 @@ class GmailClient:
     SCOPE_INSERT = "https://www.googleapis.com/auth/gmail.insert"
     SCOPE_MODIFY = "https://www.googleapis.com/auth/gmail.modify"
     SCOPE_METADATA = "https://www.googleapis.com/auth/gmail.metadata"
+    FORMAT_MINIMAL = FORMAT_MINIMAL
+    FORMAT_METADATA = FORMAT_METADATA
+    FORMAT_FULL = FORMAT_FULL
+    FORMAT_RAW = FORMAT_RAW
     SECRETS_STRATEGY = "secrets_json"
     ACCOUNT_JSON_STRATEGY = "account_json"
+    CREDENTIALS_STRATEGY = "credentials"
+    MAX_BATCH_SIZE = 100
+    MAX_BULK_SIZE = 1000
+    DEFAULT_MAX_WORKERS = 8
+    FIELDS_REVALIDATE = "id,labelIds,historyId"
+    HISTORY_TYPES_REVALIDATE = ["labelAdded", "labelRemoved", "messageDeleted"]
 
-    def __init__(self, email, secrets_json_string, scopes=None, client_strategy=None):
+    def __init__(
+        self,
+        email,
+        secrets_json_string,
+        scopes=None,
+        client_strategy=None,
+        token_cache=None,
+        http=None,
+        scheduler=None,
+        attachment_cache=None,
+        message_store=None,
+        label_ttl=None,
+        http_factory=None,
+    ):
         self.credentials = None
         if client_strategy is None:
             client_strategy = GmailClient.SECRETS_STRATEGY
         self.email = email
+        self.token_cache = token_cache
+        self._http_factory = http_factory
+        self._http = http if http is not None or not http_factory else http_factory()
+        self.scheduler = scheduler
+        self.attachment_cache = attachment_cache
+        self.message_store = message_store
+        self.label_index = LabelIndex(self, label_ttl)
+        self._local = threading.local()
+        self._owner_thread = threading.get_ident()
+        self._single_flight = SingleFlight()
         self._client = self._make_client(client_strategy)(secrets_json_string, scopes)
 
     def _make_client(self, client_strategy):
         return {
             GmailClient.SECRETS_STRATEGY: self._make_client_json_string,
             GmailClient.ACCOUNT_JSON_STRATEGY: self._make_client_account_json,
+            GmailClient.CREDENTIALS_STRATEGY: self._make_client_credentials,
         }.get(client_strategy)
 
     def _make_client_json_string(self, secrets_json_string, scopes):
         google_secrets_data = json.loads(secrets_json_string)["web"]
-        credentials = Credentials(
-            None,
-            refresh_token=google_secrets_data["refresh_token"],
-            client_id=google_secrets_data["client_id"],
-            client_secret=google_secrets_data["client_secret"],
-            token_uri=google_secrets_data["token_uri"],
-            scopes=scopes if scopes else [GmailClient.SCOPE_READONLY],
+        self._set_credentials(
+            Credentials(
+                None,
+                refresh_token=google_secrets_data["refresh_token"],
+                client_id=google_secrets_data["client_id"],
+                client_secret=google_secrets_data["client_secret"],
+                token_uri=google_secrets_data["token_uri"],
+                scopes=scopes if scopes else [GmailClient.SCOPE_READONLY],
+            )
         )
-        credentials.refresh(Request())
-        return discovery.build("gmail", "v1", credentials=credentials)
+        self._refresh_credentials()
+        return self._build_service()
 
     def _make_client_account_json(self, account_json, scopes):
         self._make_credentials(account_json, scopes)
-        return discovery.build(
-            "gmail", "v1", credentials=self.credentials, cache_discovery=False
+        return self._build_service()
+
+    def _make_client_credentials(self, credentials, scopes):
+        """
+        Builds the client from ready google-auth credentials (already bound
+        to the mailbox subject), skipping secrets parsing altogether.
+        """
+        self._set_credentials(
+            credentials.with_scopes(scopes) if scopes else credentials
         )
+        self._refresh_credentials()
+        return self._build_service()
+
+    def _build_service(self):
+        return build_service(self.credentials, self._http)
 
     def _messages_resource(self):
         return self._client.users().messages()
@@ -69,96 +153,901 @@ class GmailClient:
         credentials = service_account.Credentials.from_service_account_info(
             account_json, scopes=scopes
         )
-        self.credentials = credentials.with_subject(self.email)
+        self._set_credentials(credentials.with_subject(self.email))
         self._refresh_credentials()
         return self.credentials
 
+    def _set_credentials(self, credentials):
+        """
+        With a token_cache, the credentials are wrapped so every refresh
+        (including the ones the transport makes once the token expires) goes
+        through the cache.
+        """
+        if self.token_cache is not None:
+            credentials = CachedCredentials(credentials, self.token_cache, self.email)
+        self.credentials = credentials
+
     def _refresh_credentials(self) -> None:
-        if self.credentials and not self.credentials.valid:
-            self.credentials.refresh(Request())
+        if not self.credentials or self.credentials.valid:
+            return
 
-    def _execute(self, executable):
-        try:
+        self.credentials.refresh(Request())
+
+    def _make_http(self):
+        http = self._client._http.http
+        if self._http_factory is not None:
+            http = self._http_factory()
+        elif isinstance(http, httplib2.Http):
+            # Same settings (proxy, CA certificates, timeout...), but
+            # connections of its own
+            http = copy.copy(http)
+        elif not isinstance(http, PooledHttp):
+            http = build_http()
+
+        return AuthorizedHttp(self._client._http.credentials, http=http)
+
+    def _thread_http(self):
+        """
+        Authorized transports are not thread-safe: the thread that built the
+        client uses the service's own, every other thread gets its own. They
+        all share the connection pool of a PooledHttp, httplib2 transports
+        are copied and any other kind is built by http_factory.
+        """
+        http = getattr(self._local, "http", None)
+        if http is None and threading.get_ident() != self._owner_thread:
+            http = self._local.http = self._make_http()
+
+        return http
+
+    def _execute(self, executable, units=None, idempotent=None):
+        http = self._thread_http()
+
+        def call():
+            if http is not None:
+                return executable.execute(http=http)
             return executable.execute()
+
+        try:
+            if self.scheduler is None:
+                return call()
+            return self.scheduler.run(
+                self.email,
+                units if units else quota_units(executable),
+                call,
+                idempotent if idempotent is not None else is_idempotent(executable),
+            )
         except HttpError as e:
             if e.resp.status >= 500:
                 raise GmailError()
             raise e
 
-    def get_raw_messages(self, query="", limit=None, page_token=None):
+    @staticmethod
+    def _with_fields(arguments, fields):
+        if fields:
+            arguments.update({"fields": fields})
+
+        return arguments
+
+    @staticmethod
+    def _list_fields(key, fields, paginated=True):
+        """
+        Wraps an entity-level fields mask (e.g. Message.FIELDS_IDS) into the
+        mask of a list response.
+        """
+        if not fields:
+            return None
+
+        list_fields = f"{key}({fields})"
+
+        return f"nextPageToken,{list_fields}" if paginated else list_fields
+
+    def get_raw_messages(self, query="", limit=None, page_token=None, fields=None):
         arguments = {"userId": self.email, "q": query, "maxResults": limit}
 
         if page_token:
             arguments.update({"pageToken": page_token})
 
-        return self._execute(self._messages_resource().list(**arguments))
+        return self._execute(
+            self._messages_resource().list(**self._with_fields(arguments, fields))
+        )
+
+    def _history_resource(self):
+        return self._client.users().history()
+
+    def get_raw_profile(self, fields=None):
+        return self._execute(
+            self._client.users().getProfile(
+                **self._with_fields({"userId": self.email}, fields)
+            )
+        )
+
+    def get_raw_history(
+        self,
+        start_history_id,
+        page_token=None,
+        history_types=None,
+        label_id=None,
+        limit=None,
+        fields=None,
+    ):
+        arguments = {"userId": self.email, "startHistoryId": start_history_id}
+
+        if page_token:
+            arguments.update({"pageToken": page_token})
+
+        if history_types:
+            arguments.update({"historyTypes": history_types})
+
+        if label_id:
+            arguments.update({"labelId": label_id})
 
-    def get_raw_labels(self):
-        return self._execute(self._labels_resource().list(userId=self.email))
+        if limit:
+            arguments.update({"maxResults": limit})
 
-    def get_raw_label(self, label_id):
         try:
-            return self._execute(self._labels_resource().get(userId=self.email, id=label_id))
+            return self._execute(
+                self._history_resource().list(**self._with_fields(arguments, fields))
+            )
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise HistoryNotFoundError(start_history_id)
+            raise e
+
+    def watch(self, topic_name, label_ids=None, label_filter_behavior=None):
+        """
+        Asks Gmail to publish the mailbox changes to a Pub/Sub topic. Returns
+        the raw response, holding the current historyId and the expiration
+        of the watch, to be renewed (at least daily is recommended).
+        """
+        body = {"topicName": topic_name}
+
+        if label_ids:
+            body.update({"labelIds": label_ids})
+
+        if label_filter_behavior:
+            body.update({"labelFilterBehavior": label_filter_behavior})
+
+        return self._execute(self._client.users().watch(userId=self.email, body=body))
+
+    def stop(self):
+        self._execute(self._client.users().stop(userId=self.email))
+
+    def sync(
+        self,
+        start_history_id=None,
+        history_types=None,
+        label_id=None,
+        resync_query="",
+        page_size=500,
+    ):
+        """
+        Returns a MailboxSync over the changes since start_history_id, whose
+        history_id is the checkpoint for the next call once it is consumed.
+        """
+        return MailboxSync(
+            self, start_history_id, history_types, label_id, resync_query, page_size
+        )
+
+    def get_raw_labels(self, fields=None):
+        return self._execute(
+            self._labels_resource().list(
+                **self._with_fields({"userId": self.email}, fields)
+            )
+        )
+
+    def get_raw_label(self, label_id, fields=None):
+        try:
+            return self._execute(
+                self._labels_resource().get(
+                    **self._with_fields({"userId": self.email, "id": label_id}, fields)
+                )
+            )
         except HttpError as exception:
             if exception.resp.status == 404:
                 raise LabelNotFoundError(label_id)
             raise exception
 
-    def get_labels(self):
-        raw_labels = self.get_raw_labels()
+    def get_labels(self, fields=None):
+        raw_labels = self.get_raw_labels(
+            self._list_fields("labels", fields, paginated=False)
+        )
 
         if "labels" not in raw_labels:
             return []
 
-        return [Label(raw_label) for raw_label in raw_labels['labels']]
+        return [
+            Label(raw_label, self, fields) for raw_label in raw_labels['labels']
+        ]
+
+    def get_label(self, label_id, fields=None):
+        raw_label = self.get_raw_label(label_id, fields)
+        raw_label.setdefault("id", label_id)
+
+        return Label(raw_label, self, fields)
+
+    def create_label(
+        self, name, label_list_visibility=None, message_list_visibility=None
+    ):
+        raw_label = self._execute(
+            self._labels_resource().create(
+                userId=self.email,
+                body=self._label_body(
+                    name, label_list_visibility, message_list_visibility
+                ),
+            )
+        )
+        label = Label(raw_label)
+        self.label_index.add(label)
+
+        return label
 
-    def get_label(self, label_id):
-        raw_label = self.get_raw_label(label_id)
+    @staticmethod
+    def _label_body(name, label_list_visibility, message_list_visibility):
+        body = {"name": name}
 
-        return Label(raw_label)
+        if label_list_visibility:
+            body.update({"labelListVisibility": label_list_visibility})
 
-    def get_messages_paginated(self, query="", limit=None, page_token=None):
-        raw_messages = self.get_raw_messages(query, limit, page_token)
+        if message_list_visibility:
+            body.update({"messageListVisibility": message_list_visibility})
+
+        return body
+
+    def delete_label(self, label_id):
+        try:
+            self._execute(
+                self._labels_resource().delete(userId=self.email, id=label_id)
+            )
+        except HttpError as exception:
+            if exception.resp.status == 404:
+                self.label_index.remove(label_id)
+                raise LabelNotFoundError(label_id)
+            raise exception
+        self.label_index.remove(label_id)
+
+    def resolve_labels(self, labels, strict=True):
+        """
+        Maps label names (or ids, kept as they are) to label ids through the
+        label index, which lists the labels at most once per label_ttl.
+        Unknown names raise LabelNotFoundError, or are kept as they are when
+        not strict.
+        """
+        return resolve_label_ids(labels, self.label_index.get, strict)
+
+    def ensure_labels(
+        self, names, label_list_visibility=None, message_list_visibility=None
+    ):
+        """
+        Returns the labels of the given names, creating the missing ones in a
+        single batch request.
+        """
+        names = list(names)
+        missing = list(
+            dict.fromkeys(
+                name for name in names if self.label_index.get_by_name(name) is None
+            )
+        )
+
+        if missing:
+            conflicts = []
+
+            def raise_for_error(exception, request_id):
+                # Created meanwhile, e.g. by another worker
+                if exception.resp.status == 409:
+                    conflicts.append(request_id)
+                    return
+                if exception.resp.status >= 500:
+                    raise GmailError()
+                raise exception
+
+            raw_labels = self._batch_get(
+                [str(position) for position in range(len(missing))],
+                lambda position: self._labels_resource().create(
+                    userId=self.email,
+                    body=self._label_body(
+                        missing[int(position)],
+                        label_list_visibility,
+                        message_list_visibility,
+                    ),
+                ),
+                QUOTA_UNITS["gmail.users.labels.create"],
+                raise_for_error,
+            )
+            for raw_label in raw_labels.values():
+                self.label_index.add(Label(raw_label))
+            if conflicts:
+                self.label_index.invalidate()
+
+        labels = [self.label_index.get_by_name(name) for name in names]
+        for name, label in zip(names, labels):
+            if label is None:
+                raise LabelNotFoundError(name)
+
+        return labels
+
+    def get_messages_paginated(
+        self,
+        query="",
+        limit=None,
+        page_token=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        """
+        When hydrating, fields projects the fetched messages; otherwise it
+        projects the listed ones.
+        """
+        raw_messages = self.get_raw_messages(
+            query,
+            limit,
+            page_token,
+            self._list_fields("messages", None if hydrate else fields),
+        )
 
         if "messages" not in raw_messages:
             return [], None
 
-        return [
-            Message(self, raw_message) for raw_message in raw_messages["messages"]
-        ], raw_messages["nextPageToken"]
+        messages = [
+            Message(self, raw_message, fields=None if hydrate else fields)
+            for raw_message in raw_messages["messages"]
+        ]
 
-    def get_messages(self, query="", limit=None):
-        raw_messages = self.get_raw_messages(query, limit)
+        if hydrate:
+            self.hydrate_messages(messages, format, metadata_headers, fields)
 
-        if "messages" not in raw_messages:
-            return []
+        return messages, raw_messages.get("nextPageToken")
+
+    def get_messages(
+        self,
+        query="",
+        limit=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        messages, _ = self.get_messages_paginated(
+            query, limit, None, hydrate, format, metadata_headers, fields
+        )
+
+        return messages
+
+    def iter_messages(
+        self,
+        query="",
+        page_size=500,
+        max_results=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        """
+        Yields every message matching the query, following nextPageToken.
+        The next page is fetched (and hydrated, if asked to) on a background
+        thread while the current one is consumed, so at most two pages are
+        held in memory.
+        """
+        return self._iter_pages(
+            lambda limit, page_token: self.get_messages_paginated(
+                query, limit, page_token, hydrate, format, metadata_headers, fields
+            ),
+            page_size,
+            max_results,
+        )
+
+    def _iter_pages(self, get_page, page_size, max_results):
+        executor = ThreadPoolExecutor(max_workers=1)
+        remaining = max_results
+
+        def submit(page_token):
+            limit = page_size if remaining is None else min(page_size, remaining)
+            return executor.submit(get_page, limit, page_token)
+
+        try:
+            future = submit(None)
+            while future is not None:
+                items, page_token = future.result()
+                if remaining is not None:
+                    items = items[:remaining]
+                    remaining -= len(items)
+
+                has_next_page = page_token and (remaining is None or remaining > 0)
+                future = submit(page_token) if has_next_page else None
+
+                yield from items
+        finally:
+            executor.shutdown(wait=False)
+
+    def map(self, fn, *iterables, max_workers=None):
+        """
+        Calls fn (e.g. client.get_message) over the iterables from up to
+        max_workers threads, yielding results in input order. Only a bounded
+        window of calls is in flight, so iterables may be unbounded streams.
+        """
+        max_workers = max_workers if max_workers else GmailClient.DEFAULT_MAX_WORKERS
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = deque()
+
+        try:
+            for arguments in zip(*iterables):
+                futures.append(executor.submit(fn, *arguments))
+                if len(futures) >= max_workers * 2:
+                    yield futures.popleft().result()
+
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def get_raw_message(self, id, format=None, metadata_headers=None, fields=None):
+        """
+        Concurrent gets of the same message (e.g. lazy properties read from
+        several threads) are coalesced into a single request, whose raw
+        message is shared by every caller.
+        """
+        key = (id, format, tuple(metadata_headers or ()), fields)
+        return self._single_flight.run(
+            key, lambda: self._get_raw_message(id, format, metadata_headers, fields)
+        )
+
+    def _get_raw_message(self, id, format, metadata_headers, fields):
+        if self._uses_message_store(format):
+            stored = self._get_stored_raw_messages([id])
+            if id in stored:
+                return stored[id]
 
-        return [Message(self, raw_message) for raw_message in raw_messages["messages"]]
+        raw_message = self._fetch_raw_message(id, format, metadata_headers, fields)
+        if self._is_storable(format, metadata_headers, fields):
+            self.message_store.set(self.email, id, raw_message)
 
-    def get_raw_message(self, id):
+        return raw_message
+
+    def _fetch_raw_message(self, id, format, metadata_headers, fields):
         try:
             return self._execute(
-                self._messages_resource().get(userId=self.email, id=id)
+                self._messages_resource().get(
+                    **self._message_get_arguments(id, format, metadata_headers, fields)
+                )
             )
         except HttpError as e:
             if e.resp.status == 404:
+                if self.message_store is not None:
+                    self.message_store.delete(self.email, id)
                 raise MessageNotFoundError(id)
             raise e
 
-    def get_message(self, id):
-        raw_message = self.get_raw_message(id)
+    def _uses_message_store(self, format):
+        return self.message_store is not None and format != FORMAT_RAW
+
+    def _is_storable(self, format, metadata_headers, fields):
+        """
+        Only full messages are stored, so a stored message serves every
+        format but raw.
+        """
+        return (
+            self.message_store is not None
+            and format in (None, FORMAT_FULL)
+            and not metadata_headers
+            and not fields
+        )
+
+    def _revalidate_stored(self, stored, fresh):
+        """
+        Labels are the only mutable part of a message: takes them from a
+        minimal get, updating the store when the message changed since.
+        """
+        stored["labelIds"] = fresh.get("labelIds", [])
+        if fresh.get("historyId") != stored.get("historyId"):
+            stored["historyId"] = fresh.get("historyId")
+            self.message_store.set(self.email, stored["id"], stored)
+
+    def _get_stored_history(self, stored):
+        """
+        The label changes and deletions of the mailbox since the oldest
+        stored message, or None when Gmail no longer keeps that history or
+        it spans more than a page. A single page is probed, so falling back
+        to minimal gets costs one history.list at most.
+        """
+        history_ids = [raw_message.get("historyId") for raw_message in stored.values()]
+        if None in history_ids:
+            return None
+
+        try:
+            raw_history = self.get_raw_history(
+                str(min(int(history_id) for history_id in history_ids)),
+                history_types=GmailClient.HISTORY_TYPES_REVALIDATE,
+                limit=500,
+            )
+        except HistoryNotFoundError:
+            return None
+
+        return None if raw_history.get("nextPageToken") else raw_history
+
+    @staticmethod
+    def _apply_label_change(raw_message, key, raw_change):
+        label_ids = raw_message.get("labelIds", [])
+        changed_label_ids = raw_change.get("labelIds", [])
+        if key == "labelsAdded":
+            raw_message["labelIds"] = label_ids + [
+                label_id for label_id in changed_label_ids if label_id not in label_ids
+            ]
+        else:
+            raw_message["labelIds"] = [
+                label_id for label_id in label_ids if label_id not in changed_label_ids
+            ]
+
+    def _apply_stored_history(self, stored, raw_history):
+        """
+        Replays the label changes newer than each stored message on it and
+        drops the deleted ones. Returns the messages still in the mailbox.
+        Only the changed ones are stored again, checked up to the history id
+        of the page: the others replay to the same labels next time.
+        """
+        changed = set()
+        for raw_record in raw_history.get("history", []):
+            for key in ("messagesDeleted", "labelsAdded", "labelsRemoved"):
+                for raw_change in raw_record.get(key, []):
+                    raw_message = stored.get(raw_change["message"]["id"])
+                    if raw_message is None:
+                        continue
+                    if int(raw_record["id"]) <= int(raw_message["historyId"]):
+                        # Already in the stored message
+                        continue
+                    if key == "messagesDeleted":
+                        del stored[raw_message["id"]]
+                        changed.discard(raw_message["id"])
+                        self.message_store.delete(self.email, raw_message["id"])
+                    else:
+                        label_ids = raw_message.get("labelIds", [])
+                        self._apply_label_change(raw_message, key, raw_change)
+                        if raw_message["labelIds"] != label_ids:
+                            changed.add(raw_message["id"])
+
+        for id in changed:
+            stored[id]["historyId"] = raw_history.get("historyId")
+            self.message_store.set(self.email, id, stored[id])
+
+        return stored
+
+    def get_message(self, id, format=None, metadata_headers=None, fields=None):
+        raw_message = self.get_raw_message(id, format, metadata_headers, fields)
+        raw_message.setdefault("id", id)
+
+        return Message(self, raw_message, format, metadata_headers, fields)
+
+    def _raise_for_message_error(self, exception, id):
+        if exception.resp.status == 404:
+            if self.message_store is not None:
+                self.message_store.delete(self.email, id)
+            raise MessageNotFoundError(id)
+        if exception.resp.status >= 500:
+            raise GmailError()
+        raise exception
+
+    def _message_error(self, exception, id):
+        try:
+            self._raise_for_message_error(exception, id)
+        except (HttpError, GmailError, MessageNotFoundError) as error:
+            return error
+
+    def _message_get_arguments(self, id, format, metadata_headers, fields):
+        arguments = {"userId": self.email, "id": id}
+
+        if format:
+            arguments.update({"format": format})
+
+        if metadata_headers:
+            arguments.update({"metadataHeaders": metadata_headers})
+
+        return self._with_fields(arguments, fields)
+
+    def get_raw_messages_batch(
+        self, ids, format=None, metadata_headers=None, fields=None
+    ):
+        """
+        Fetches many messages through the Gmail batch endpoint, packing up
+        to MAX_BATCH_SIZE gets per HTTP request. Returned raw messages keep
+        the order of the given ids.
+        """
+        ids = list(ids)
+        unique_ids = list(dict.fromkeys(ids))
+        raw_messages = {}
+
+        if self._uses_message_store(format):
+            raw_messages = self._get_stored_raw_messages(unique_ids)
+
+        missing_ids = [id for id in unique_ids if id not in raw_messages]
+        fetched = self._batch_get_raw_messages(
+            missing_ids, format, metadata_headers, fields
+        )
+        if self._is_storable(format, metadata_headers, fields):
+            for id, raw_message in fetched.items():
+                self.message_store.set(self.email, id, raw_message)
+        raw_messages.update(fetched)
+
+        return [raw_messages[id] for id in ids]
+
+    def _get_stored_raw_messages(self, ids):
+        stored = {}
+        for id in ids:
+            raw_message = self.message_store.get(self.email, id)
+            if raw_message is not None:
+                stored[id] = raw_message
+
+        if not stored or not self.message_store.revalidate_labels:
+            return stored
+
+        raw_history = self._get_stored_history(stored)
+        if raw_history is not None:
+            return self._apply_stored_history(stored, raw_history)
+
+        if len(stored) == 1:
+            id = next(iter(stored))
+            fresh = {
+                id: self._fetch_raw_message(
+                    id, FORMAT_MINIMAL, None, GmailClient.FIELDS_REVALIDATE
+                )
+            }
+        else:
+            fresh = self._batch_get_raw_messages(
+                list(stored), FORMAT_MINIMAL, None, GmailClient.FIELDS_REVALIDATE
+            )
+        for id, raw_message in stored.items():
+            self._revalidate_stored(raw_message, fresh[id])
+
+        return stored
+
+    def _batch_get_raw_messages(self, unique_ids, format, metadata_headers, fields):
+        return self._batch_get(
+            unique_ids,
+            lambda id: self._messages_resource().get(
+                **self._message_get_arguments(id, format, metadata_headers, fields)
+            ),
+            QUOTA_UNITS["gmail.users.messages.get"],
+            self._raise_for_message_error,
+        )
+
+    def _batch_get(self, unique_ids, make_request, units, raise_for_error):
+        """
+        Runs make_request(id) for each id through the batch endpoint, packing
+        up to MAX_BATCH_SIZE requests per HTTP request, and returns the
+        responses by id. raise_for_error(exception, id) raises the error of
+        a failed request.
+        """
+        responses, errors = self._batch_send(unique_ids, make_request, units)
+        for id in unique_ids:
+            if id in errors:
+                raise_for_error(errors[id], id)
+
+        return responses
+
+    def _batch_send(self, unique_ids, make_request, units):
+        """
+        Like _batch_get, but returns the responses and the errors of the
+        failed requests by id instead of raising.
+        """
+        responses = {}
+        errors = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                responses[request_id] = response
+
+        for chunk in _chunks(unique_ids, GmailClient.MAX_BATCH_SIZE):
+            pending = chunk
+            attempt = 0
+            while pending:
+                batch = self._client.new_batch_http_request(callback=callback)
+                requests = [make_request(id) for id in pending]
+                idempotent = all(is_idempotent(request) for request in requests)
+                for id, request in zip(pending, requests):
+                    batch.add(request, request_id=id)
+                self._execute(batch, len(pending) * units, idempotent)
+                pending = self._batch_retries(pending, errors, attempt, idempotent)
+                attempt += 1
+
+        return responses, errors
+
+    def _batch_retries(self, ids, errors, attempt, idempotent=True):
+        """
+        Picks the ids of a batch that failed with a retryable error (each
+        request of a batch is rate limited on its own) and waits before they
+        are sent again. Only done when a scheduler is set.
+        """
+        failed = [id for id in ids if id in errors]
+        if self.scheduler is None or not failed:
+            return []
+
+        retryable = [
+            id
+            for id in failed
+            if self.scheduler.should_retry(attempt, errors[id], idempotent)
+        ]
+        if not retryable:
+            return []
+
+        self.scheduler.wait_before_retry(self.email, attempt, errors[retryable[0]])
+        for id in retryable:
+            errors.pop(id)
+
+        return retryable
+
+    def hydrate_messages(
+        self, messages, format=None, metadata_headers=None, fields=None
+    ):
+        raw_messages = self.get_raw_messages_batch(
+            [message.id for message in messages], format, metadata_headers, fields
+        )
+
+        for message, raw_message in zip(messages, raw_messages):
+            message._update(
+                raw_message, format or FORMAT_FULL, metadata_headers, fields
+            )
+
+        return messages
+
+    def _threads_resource(self):
+        return self._client.users().threads()
+
+    @staticmethod
+    def _thread_fields(fields):
+        """
+        Wraps a message-level fields mask into the mask of a thread.
+        """
+        return f"id,historyId,messages({fields})" if fields else None
+
+    def _raise_for_thread_error(self, exception, id):
+        if exception.resp.status == 404:
+            raise ThreadNotFoundError(id)
+        if exception.resp.status >= 500:
+            raise GmailError()
+        raise exception
+
+    def get_raw_threads(self, query="", limit=None, page_token=None, fields=None):
+        arguments = {"userId": self.email, "q": query, "maxResults": limit}
+
+        if page_token:
+            arguments.update({"pageToken": page_token})
+
+        return self._execute(
+            self._threads_resource().list(**self._with_fields(arguments, fields))
+        )
+
+    def get_raw_thread(self, id, format=None, metadata_headers=None, fields=None):
+        try:
+            return self._execute(
+                self._threads_resource().get(
+                    **self._message_get_arguments(id, format, metadata_headers, fields)
+                )
+            )
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise ThreadNotFoundError(id)
+            raise e
+
+    def get_thread(self, id, format=None, metadata_headers=None, fields=None):
+        """
+        Fetches a thread with all of its messages in a single request. fields
+        is a message-level mask (e.g. Message.FIELDS_ROUTING).
+        """
+        raw_thread = self.get_raw_thread(
+            id, format, metadata_headers, self._thread_fields(fields)
+        )
+        raw_thread.setdefault("id", id)
+
+        return Thread(self, raw_thread, format, metadata_headers, fields)
 
-        return Message(self, raw_message)
+    def get_raw_threads_batch(
+        self, ids, format=None, metadata_headers=None, fields=None
+    ):
+        ids = list(ids)
+        raw_threads = self._batch_get(
+            list(dict.fromkeys(ids)),
+            lambda id: self._threads_resource().get(
+                **self._message_get_arguments(id, format, metadata_headers, fields)
+            ),
+            QUOTA_UNITS["gmail.users.threads.get"],
+            self._raise_for_thread_error,
+        )
+
+        return [raw_threads[id] for id in ids]
+
+    def hydrate_threads(self, threads, format=None, metadata_headers=None, fields=None):
+        raw_threads = self.get_raw_threads_batch(
+            [thread.id for thread in threads],
+            format,
+            metadata_headers,
+            self._thread_fields(fields),
+        )
+
+        for thread, raw_thread in zip(threads, raw_threads):
+            thread._update(raw_thread, format, metadata_headers, fields)
+
+        return threads
+
+    def get_threads_paginated(
+        self,
+        query="",
+        limit=None,
+        page_token=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        raw_threads = self.get_raw_threads(query, limit, page_token)
+
+        if "threads" not in raw_threads:
+            return [], None
+
+        threads = [
+            Thread(self, raw_thread, format, metadata_headers, fields)
+            for raw_thread in raw_threads["threads"]
+        ]
+
+        if hydrate:
+            self.hydrate_threads(threads, format, metadata_headers, fields)
+
+        return threads, raw_threads.get("nextPageToken")
+
+    def get_threads(
+        self,
+        query="",
+        limit=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        threads, _ = self.get_threads_paginated(
+            query, limit, None, hydrate, format, metadata_headers, fields
+        )
+
+        return threads
+
+    def iter_threads(
+        self,
+        query="",
+        page_size=100,
+        max_results=None,
+        hydrate=False,
+        format=None,
+        metadata_headers=None,
+        fields=None,
+    ):
+        """
+        Yields every thread matching the query, prefetching the next page
+        like iter_messages.
+        """
+        return self._iter_pages(
+            lambda limit, page_token: self.get_threads_paginated(
+                query, limit, page_token, hydrate, format, metadata_headers, fields
+            ),
+            page_size,
+            max_results,
+        )
 
     def modify_raw_message(self, id, add_labels=None, remove_labels=None):
+        """
+        Labels may be given by name or id.
+        """
         try:
             return self._execute(
                 self._messages_resource().modify(
                     userId=self.email,
                     id=id,
                     body={
-                        "addLabelIds": add_labels if add_labels else [],
-                        "removeLabelIds": remove_labels if remove_labels else [],
+                        "addLabelIds": self.resolve_labels(add_labels, strict=False),
+                        "removeLabelIds": self.resolve_labels(
+                            remove_labels, strict=False
+                        ),
                     },
                 )
             )
@@ -172,34 +1061,152 @@ class GmailClient:
 
         return Message(self, raw_modified_message)
 
-    def modify_multiple_messages(self, ids, add_labels=None, remove_labels=None):
-        self._execute(
-            self._messages_resource().batchModify(
-                userId=self.email,
-                body={
-                    "ids": ids,
-                    "addLabelIds": add_labels if add_labels else [],
-                    "removeLabelIds": remove_labels if remove_labels else [],
-                },
+    def _run_bulk(self, chunks, run_chunk, max_workers, retries):
+        """
+        Runs run_chunk(ids) over the chunks from up to max_workers threads,
+        then retries the chunks that failed with a retryable error up to
+        retries times. run_chunk may return the errors of the ids that failed
+        one by one, splitting its chunk so only those are reported and
+        retried. Returns the ChunkResults, or raises them in a
+        BulkOperationError if any chunk still failed.
+        """
+
+        def attempt(ids, attempts=1):
+            try:
+                errors = run_chunk(ids)
+            except (HttpError, GmailError, MessageNotFoundError) as e:
+                return [ChunkResult(ids, e, attempts)]
+            if errors:
+                return split_chunk_results(ids, errors, attempts)
+            return [ChunkResult(ids, attempts=attempts)]
+
+        results = [
+            result
+            for chunk_results in self.map(attempt, chunks, max_workers=max_workers)
+            for result in chunk_results
+        ]
+        for _ in range(retries):
+            results = [
+                retried
+                for result in results
+                for retried in (
+                    attempt(result.ids, result.attempts + 1)
+                    if not result.ok and is_chunk_retryable(result.error)
+                    else [result]
+                )
+            ]
+
+        if not all(result.ok for result in results):
+            raise BulkOperationError(results)
+
+        return results
+
+    def modify_multiple_messages(
+        self, ids, add_labels=None, remove_labels=None, max_workers=None, retries=1
+    ):
+        """
+        Modifies the labels of any number of messages, given as ids or
+        Message objects (including a streaming iter_messages), in concurrent
+        batchModify calls of up to MAX_BULK_SIZE ids. Labels may be given by
+        name or id.
+        """
+        add_labels = self.resolve_labels(add_labels, strict=False)
+        remove_labels = self.resolve_labels(remove_labels, strict=False)
+
+        def modify(chunk):
+            self._execute(
+                self._messages_resource().batchModify(
+                    userId=self.email,
+                    body={
+                        "ids": chunk,
+                        "addLabelIds": add_labels,
+                        "removeLabelIds": remove_labels,
+                    },
+                )
+            )
+
+        return self._run_bulk(
+            iter_id_chunks(ids, GmailClient.MAX_BULK_SIZE, allow_empty=True),
+            modify,
+            max_workers,
+            retries,
+        )
+
+    def delete_multiple_messages(self, ids, max_workers=None, retries=1):
+        """
+        Permanently deletes any number of messages, like
+        modify_multiple_messages, through batchDelete.
+        """
+
+        def delete(chunk):
+            self._execute(
+                self._messages_resource().batchDelete(
+                    userId=self.email, body={"ids": chunk}
+                )
+            )
+
+        return self._run_bulk(
+            iter_id_chunks(ids, GmailClient.MAX_BULK_SIZE), delete, max_workers, retries
+        )
+
+    def trash_multiple_messages(self, ids, max_workers=None, retries=1):
+        """
+        Moves any number of messages to the trash. There is no bulk trash
+        endpoint, so messages are trashed through batch requests of up to
+        MAX_BATCH_SIZE calls.
+        """
+
+        def trash(chunk):
+            _, errors = self._batch_send(
+                chunk,
+                lambda id: self._messages_resource().trash(userId=self.email, id=id),
+                QUOTA_UNITS["gmail.users.messages.trash"],
             )
+
+            return {id: self._message_error(error, id) for id, error in errors.items()}
+
+        return self._run_bulk(
+            iter_id_chunks(ids, GmailClient.MAX_BATCH_SIZE), trash, max_workers, retries
         )
 
-    def get_raw_attachment_body(self, id, message_id):
+    def get_raw_attachment_body(self, id, message_id, fields=None):
+        arguments = {"userId": self.email, "id": id, "messageId": message_id}
+
         try:
             return self._execute(
                 self._messages_resource()
                 .attachments()
-                .get(userId=self.email, id=id, messageId=message_id)
+                .get(**self._with_fields(arguments, fields))
             )
         except HttpError as e:
             if e.resp.status == 404:
                 raise AttachmentNotFoundError(message_id, id)
             raise e
 
-    def get_attachment_body(self, id, message_id):
-        raw_attachment_body = self.get_raw_attachment_body(id, message_id)
+    def get_attachment_body(self, id, message_id, fields=None):
+        """
+        With an attachment_cache, cached contents are served without any
+        request, and fetched ones are stored for the next call.
+        """
+        if self.attachment_cache is not None:
+            content = self.attachment_cache.get(self.email, message_id, id)
+            if content is not None:
+                return AttachmentBody(
+                    {"attachmentId": id, "size": len(content)}, content
+                )
+
+        raw_attachment_body = self.get_raw_attachment_body(id, message_id, fields)
+        raw_attachment_body.setdefault("attachmentId", id)
+        attachment_body = AttachmentBody(
+            raw_attachment_body, client=self, message_id=message_id, fields=fields
+        )
+
+        if self.attachment_cache is not None and raw_attachment_body.get("data"):
+            self.attachment_cache.set(
+                self.email, message_id, id, attachment_body.content
+            )
 
-        return AttachmentBody(raw_attachment_body)
+        return attachment_body
 
     def _make_sendable_message(
         self,
@@ -1,12 +1,82 @@
 import base64
-import cgi
+import email.message
+import email.policy
+import email.utils
+import mmap
+from collections.abc import Mapping
 from datetime import datetime
+from email.parser import BytesHeaderParser, BytesParser
+
+
+def _header_message(name, value):
+    """
+    A bare message holding a single header, to parse the parameters of a
+    structured one (e.g. Content-Type) with the email package.
+    """
+    message = email.message.Message()
+    message[name] = value
+
+    return message
+
+
+class Headers(Mapping):
+    """
+    Read-only, case-insensitive view of a list of raw headers. Lookups return
+    the last value of a header, get_all returns every value of a repeated one
+    (e.g. Received), in order.
+    """
+
+    __slots__ = ("_names", "_values")
+
+    def __init__(self, raw_headers):
+        self._names = {}
+        self._values = {}
+        for header in raw_headers:
+            key = header["name"].lower()
+            self._names.setdefault(key, header["name"])
+            self._values.setdefault(key, []).append(header["value"])
+
+    def __getitem__(self, name):
+        return self._values[name.lower()][-1]
+
+    def __contains__(self, name):
+        return isinstance(name, str) and name.lower() in self._values
+
+    def __iter__(self):
+        return iter(self._names.values())
+
+    def __len__(self):
+        return len(self._names)
+
+    def get_all(self, name):
+        return list(self._values.get(name.lower(), []))
 
 
 class AttachmentBody:
-    def __init__(self, raw_body):
+    CHUNK_SIZE = 1024 * 1024
+
+    __slots__ = ("_raw", "_content", "_client", "_message_id", "_fields")
+
+    def __init__(
+        self, raw_body, content=None, client=None, message_id=None, fields=None
+    ):
         self._raw = raw_body
-        self._content = None
+        self._content = content
+        self._client = client
+        self._message_id = message_id
+        self._fields = _parse_fields(fields) if fields else None
+
+    def _require(self, name):
+        if (
+            self._fields is None
+            or self._client is None
+            or _fields_cover(self._fields, name)
+        ):
+            return
+
+        # Fields left out by the mask are fetched on first read
+        self._raw = self._client.get_raw_attachment_body(self.id, self._message_id)
+        self._fields = None
 
     @property
     def id(self):
@@ -14,25 +84,107 @@ class AttachmentBody:
 
     @property
     def size(self):
+        self._require("size")
+
         return self._raw.get("size")
 
+    @property
+    def has_data(self):
+        if self._content is not None:
+            return True
+
+        self._require("data")
+
+        return bool(self._raw.get("data"))
+
     @property
     def content(self):
-        data = self._raw.get("data")
-        if not data:
-            return None
+        if self._content is None and self.has_data:
+            self._content = base64.urlsafe_b64decode(self._raw["data"].encode("UTF-8"))
+
+        return self._content
+
+    @property
+    def decoded_size(self):
+        if self._content is not None:
+            return len(self._content)
+
+        self._require("data")
+        data = self._raw.get("data") or ""
+
+        return len(data.rstrip("=")) * 3 // 4
+
+    def iter_content(self, chunk_size=None):
+        """
+        Yields the decoded content in chunks of about chunk_size bytes,
+        decoding only one chunk of the base64 data at a time.
+        """
+        chunk_size = chunk_size or AttachmentBody.CHUNK_SIZE
+        if self._content is not None:
+            content = memoryview(self._content)
+            for start in range(0, len(content), chunk_size):
+                yield bytes(content[start : start + chunk_size])
+            return
+
+        self._require("data")
+        data = self._raw.get("data") or ""
+        encoded_chunk_size = max(chunk_size // 3, 1) * 4
+        for start in range(0, len(data), encoded_chunk_size):
+            encoded_chunk = data[start : start + encoded_chunk_size]
+            padding = "=" * (-len(encoded_chunk) % 4)
+            yield base64.urlsafe_b64decode((encoded_chunk + padding).encode("UTF-8"))
+
+    def save_to(self, destination, chunk_size=None, memory_map=False):
+        """
+        Writes the decoded content to destination, a path or a binary file
+        object, chunk by chunk. With memory_map, a path is written through a
+        memory-mapped file of the decoded size. Returns the bytes written.
+        """
+        if not hasattr(destination, "write"):
+            if memory_map:
+                return self._save_to_memory_map(destination, chunk_size)
+            with open(destination, "wb") as file:
+                return self.save_to(file, chunk_size)
 
-        return base64.urlsafe_b64decode(data.encode("UTF-8"))
+        if memory_map:
+            raise ValueError("memory_map requires a path destination")
+
+        written = 0
+        for chunk in self.iter_content(chunk_size):
+            destination.write(chunk)
+            written += len(chunk)
+
+        return written
+
+    def _save_to_memory_map(self, path, chunk_size):
+        size = self.decoded_size
+        with open(path, "w+b") as file:
+            if not size:
+                return 0
+            file.truncate(size)
+            with mmap.mmap(file.fileno(), size) as mapped:
+                position = 0
+                for chunk in self.iter_content(chunk_size):
+                    mapped[position : position + len(chunk)] = chunk
+                    position += len(chunk)
+
+        return position
 
 
 class Attachment:
+    __slots__ = ("_raw", "_client", "_body", "_headers", "message_id")
+
     def __init__(self, message_id, client, raw_part):
         self._raw = raw_part
         self._client = client
         self._body = AttachmentBody(raw_part["body"])
-        self._headers = raw_part.get("headers", [])
+        self._headers = Headers(raw_part.get("headers") or [])
         self.message_id = message_id
 
+    @property
+    def _part(self):
+        return self._raw
+
     @property
     def id(self):
         return self._body.id
@@ -46,55 +198,646 @@ class Attachment:
         return self._raw.get("mimeType")
 
     @property
-    def content(self):
-        if not self._body.content:
+    def body(self):
+        if not self._body.has_data:
             self._body = self._client.get_attachment_body(self.id, self.message_id)
 
-        return self._body.content
+        return self._body
 
     @property
-    def content_disposition(self):
-        content_disposition_header = next(
-            (
-                header
-                for header in self._headers
-                if header.get("name") == "Content-Disposition"
-            ),
-            {},
-        )
+    def content(self):
+        return self.body.content
+
+    def iter_content(self, chunk_size=None):
+        return self.body.iter_content(chunk_size)
+
+    def save_to(self, destination, chunk_size=None, memory_map=False):
+        return self.body.save_to(destination, chunk_size, memory_map)
 
-        content_disposition_value = content_disposition_header.get("value")
+    @property
+    def content_disposition(self):
+        content_disposition_value = self._headers.get("Content-Disposition")
 
         return (
-            cgi.parse_header(content_disposition_value)[0]
+            _header_message(
+                "Content-Disposition", content_disposition_value
+            ).get_content_disposition()
             if content_disposition_value
             else None
         )
 
 
+class BodyPart(Attachment):
+    """
+    A text part of a message body. Its content is base64 decoded once and
+    its text decoded once with the charset of its Content-Type (UTF-8 when
+    there is none or it is unknown), only when read.
+    """
+
+    DEFAULT_CHARSET = "utf-8"
+
+    __slots__ = ("_text",)
+
+    def __init__(self, message_id, client, raw_part):
+        super().__init__(message_id, client, raw_part)
+        self._text = None
+
+    @property
+    def part_id(self):
+        return self._raw.get("partId")
+
+    @property
+    def size(self):
+        return self._body.size or 0
+
+    @property
+    def charset(self):
+        content_type = self._headers.get("Content-Type")
+        if content_type:
+            charset = email.utils.collapse_rfc2231_value(
+                _header_message("Content-Type", content_type).get_param("charset", "")
+            )
+            if charset:
+                return charset
+
+        return BodyPart.DEFAULT_CHARSET
+
+    @property
+    def body(self):
+        if self.id is None:
+            # Small parts carry their data inline, or are empty
+            return self._body
+
+        return super().body
+
+    def _decode(self, content):
+        if content is None:
+            return None
+
+        try:
+            return content.decode(self.charset, errors="replace")
+        except LookupError:
+            return content.decode(BodyPart.DEFAULT_CHARSET, errors="replace")
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self._decode(self.content)
+
+        return self._text
+
+    def _exceeds(self, max_size):
+        return max_size is not None and self.size > max_size
+
+    def get_text(self, max_size=None):
+        """
+        Like text, but None when the part is larger than max_size bytes,
+        without decoding (nor fetching) it.
+        """
+        if self._exceeds(max_size):
+            return None
+
+        return self.text
+
+
+def _mime_raw_part(mime_part):
+    """
+    Describes a part of a parsed RFC 822 message the way Gmail describes the
+    parts of a payload, leaving its (still encoded) body out.
+    """
+    return {
+        "mimeType": mime_part.get_content_type(),
+        "filename": mime_part.get_filename() or "",
+        "headers": [
+            {"name": name, "value": str(value)} for name, value in mime_part.items()
+        ],
+        "body": {"size": _mime_part_size(mime_part)},
+    }
+
+
+def _mime_part_size(mime_part):
+    """
+    Estimates the decoded size of a MIME part from its encoded payload:
+    exact for base64, an upper bound for quoted-printable and as is for
+    anything else.
+    """
+    payload = mime_part.get_payload() or ""
+    encoding = (mime_part.get("Content-Transfer-Encoding") or "").strip().lower()
+    if encoding != "base64":
+        return len(payload)
+
+    data = "".join(payload.split())
+
+    return len(data) * 3 // 4 - (len(data) - len(data.rstrip("=")))
+
+
+def _decode_mime_part(mime_part):
+    content = mime_part.get_payload(decode=True) or b""
+
+    return AttachmentBody({"size": len(content)}, content)
+
+
+class MimeAttachment(Attachment):
+    """
+    Attachment of a message fetched in the raw format: its content comes
+    with the message and is decoded from the MIME part when first read.
+    """
+
+    __slots__ = ("_mime_part",)
+
+    def __init__(self, message_id, client, mime_part):
+        super().__init__(message_id, client, _mime_raw_part(mime_part))
+        self._mime_part = mime_part
+
+    @property
+    def _part(self):
+        return self._mime_part
+
+    @property
+    def body(self):
+        if not self._body.has_data:
+            self._body = _decode_mime_part(self._mime_part)
+
+        return self._body
+
+
+class MimeBodyPart(BodyPart):
+    __slots__ = ("_mime_part",)
+
+    def __init__(self, message_id, client, mime_part):
+        super().__init__(message_id, client, _mime_raw_part(mime_part))
+        self._mime_part = mime_part
+
+    @property
+    def charset(self):
+        return self._mime_part.get_content_charset() or BodyPart.DEFAULT_CHARSET
+
+    @property
+    def body(self):
+        if not self._body.has_data:
+            self._body = _decode_mime_part(self._mime_part)
+
+        return self._body
+
+
+def _part_header(raw_part, name):
+    name = name.lower()
+    for header in raw_part.get("headers") or []:
+        if header["name"].lower() == name:
+            return header["value"]
+
+    return None
+
+
+def _is_attachment_part(raw_part):
+    return bool(
+        raw_part.get("filename") and (raw_part.get("body") or {}).get("attachmentId")
+    )
+
+
+class MessageParts:
+    """
+    Index of the MIME part tree of a payload, walked once (iteratively) in
+    document order and keyed by partId.
+    """
+
+    __slots__ = ("_root", "_parts", "_by_id")
+
+    def __init__(self, payload):
+        self._root = payload
+        self._parts = []
+        self._by_id = {}
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            self._parts.append(part)
+            if part.get("partId") is not None:
+                self._by_id[part["partId"]] = part
+            stack.extend(reversed(part.get("parts") or []))
+
+    def __iter__(self):
+        return iter(self._parts)
+
+    def __len__(self):
+        return len(self._parts)
+
+    def __getitem__(self, part_id):
+        return self._by_id[part_id]
+
+    def get(self, part_id, default=None):
+        return self._by_id.get(part_id, default)
+
+    def iter_attachment_parts(self):
+        """
+        Parts with a filename whose body is stored apart (has an
+        attachmentId), the payload itself excluded.
+        """
+        for part in self._parts:
+            if part is not self._root and _is_attachment_part(part):
+                yield part
+
+    def iter_body_parts(self):
+        """
+        Text parts that make the body, i.e. neither attachments nor
+        containers of other parts.
+        """
+        for part in self._parts:
+            if not (part.get("mimeType") or "").startswith("text/"):
+                continue
+            if part.get("filename") or part.get("parts"):
+                continue
+            disposition = _part_header(part, "Content-Disposition")
+            if disposition and disposition.lower().startswith("attachment"):
+                continue
+            yield part
+
+    def _first_body_part(self, mimetype):
+        for part in self.iter_body_parts():
+            if part.get("mimeType") == mimetype:
+                return part
+
+        return None
+
+    @property
+    def text_part(self):
+        return self._first_body_part("text/plain")
+
+    @property
+    def html_part(self):
+        return self._first_body_part("text/html")
+
+    def iter_inline_image_parts(self):
+        """
+        Image parts meant to be shown in the body: referenced by a Content-ID
+        or with an inline Content-Disposition.
+        """
+        for part in self._parts:
+            if not (part.get("mimeType") or "").startswith("image/"):
+                continue
+            disposition = _part_header(part, "Content-Disposition") or ""
+            if _part_header(part, "Content-ID") or disposition.lower().startswith(
+                "inline"
+            ):
+                yield part
+
+
+class MimeParts:
+    """
+    The MessageParts counterpart for messages fetched in the raw format,
+    over the parts of the parsed RFC 822 message (which have no partId).
+    """
+
+    __slots__ = ("_root", "_parts")
+
+    def __init__(self, mime):
+        self._root = mime
+        self._parts = list(mime.walk())
+
+    def __iter__(self):
+        return iter(self._parts)
+
+    def __len__(self):
+        return len(self._parts)
+
+    def iter_attachment_parts(self):
+        for part in self._parts:
+            if part is not self._root and not part.is_multipart():
+                if part.get_filename():
+                    yield part
+
+    def iter_body_parts(self):
+        for part in self._parts:
+            if part.get_content_maintype() != "text" or part.is_multipart():
+                continue
+            if part.get_filename() or part.is_attachment():
+                continue
+            yield part
+
+    def _first_body_part(self, mimetype):
+        for part in self.iter_body_parts():
+            if part.get_content_type() == mimetype:
+                return part
+
+        return None
+
+    @property
+    def text_part(self):
+        return self._first_body_part("text/plain")
+
+    @property
+    def html_part(self):
+        return self._first_body_part("text/html")
+
+    def iter_inline_image_parts(self):
+        for part in self._parts:
+            if part.get_content_maintype() != "image" or part.is_multipart():
+                continue
+            if part.get("Content-ID") or part.get_content_disposition() == "inline":
+                yield part
+
+
+FORMAT_MINIMAL = "minimal"
+FORMAT_METADATA = "metadata"
+FORMAT_FULL = "full"
+FORMAT_RAW = "raw"
+
+
+def _merge_fields(tree, name, subtree):
+    if name in tree and tree[name] is not None and subtree is not None:
+        for subname, subsubtree in subtree.items():
+            _merge_fields(tree[name], subname, subsubtree)
+    elif name in tree and subtree is not None:
+        return
+    else:
+        tree[name] = subtree
+
+
+def _parse_fields(fields):
+    """
+    Parses a partial response mask (e.g. "id,payload(headers,body/size)") into
+    a tree of dicts, where None stands for a fully selected field.
+    """
+
+    def parse_list(position):
+        tree = {}
+        while True:
+            position = parse_item(tree, position)
+            if position < len(fields) and fields[position] == ",":
+                position += 1
+                continue
+            return tree, position
+
+    def parse_item(tree, position):
+        start = position
+        while position < len(fields) and fields[position] not in ",/()":
+            position += 1
+        name = fields[start:position].strip()
+        subtree = None
+
+        if position < len(fields) and fields[position] == "/":
+            subtree = {}
+            position = parse_item(subtree, position + 1)
+        elif position < len(fields) and fields[position] == "(":
+            subtree, position = parse_list(position + 1)
+            position += 1
+
+        _merge_fields(tree, name, subtree)
+        return position
+
+    return parse_list(0)[0]
+
+
+def _fields_cover(tree, path):
+    node = tree
+    for name in path.split("."):
+        if node is None:
+            return True
+        if name not in node:
+            return False
+        node = node[name]
+
+    return True
+
+
+def _part_fields(depth):
+    fields = "partId,mimeType,filename,headers,body(attachmentId,size)"
+    if depth:
+        fields += f",parts({_part_fields(depth - 1)})"
+
+    return fields
+
+
+def _strip_body_data(raw_body):
+    return {key: value for key, value in raw_body.items() if key != "data"}
+
+
+_FORMAT_LEVELS = {
+    None: 0,
+    FORMAT_MINIMAL: 1,
+    FORMAT_RAW: 1,
+    FORMAT_METADATA: 2,
+    FORMAT_FULL: 3,
+}
+
+
 class Message:
-    def __init__(self, client, raw_message):
+    FIELDS_IDS = "id,threadId"
+    # Bodies larger than this many bytes are left undecoded by text_body and
+    # html_body (None means no limit)
+    MAX_BODY_SIZE = None
+    RAW_HEADER_CHUNK_SIZE = 16 * 1024
+    FIELDS_ROUTING = "id,threadId,labelIds"
+    FIELDS_ATTACHMENTS = f"id,threadId,payload({_part_fields(8)})"
+    COMPACT_FIELDS = (
+        "id",
+        "threadId",
+        "labelIds",
+        "internalDate",
+        "historyId",
+        "sizeEstimate",
+        "snippet",
+    )
+
+    __slots__ = (
+        "_raw",
+        "_client",
+        "_format",
+        "_metadata_headers",
+        "_fields",
+        "_headers",
+        "_attachment_parts",
+        "_parts",
+        "_attachments",
+        "_inline_images",
+        "_body_parts",
+        "_mime",
+        "_targeted",
+    )
+
+    def __init__(
+        self, client, raw_message, format=None, metadata_headers=None, fields=None
+    ):
         self._raw = raw_message
         self._client = client
+        self._format = format if format else self._guess_format(raw_message)
+        self._targeted = bool(format or fields)
+        self._metadata_headers = metadata_headers
+        self._fields = _parse_fields(fields) if fields else None
+        self._headers = None
+        self._attachment_parts = None
+        self._parts = None
+        self._attachments = None
+        self._inline_images = None
+        self._body_parts = {}
+        self._mime = None
+
+    @staticmethod
+    def _guess_format(raw_message):
+        if "payload" in raw_message:
+            return FORMAT_FULL
+        if "raw" in raw_message:
+            return FORMAT_RAW
+        if "labelIds" in raw_message:
+            return FORMAT_MINIMAL
+        return None
+
+    @property
+    def format(self):
+        return self._format
+
+    @property
+    def fields(self):
+        """
+        The partial response mask this message was fetched with, as a tree,
+        or None when it holds every field of its format.
+        """
+        return self._fields
+
+    def _update(self, raw_message, format, metadata_headers=None, fields=None):
+        if _FORMAT_LEVELS[format] < _FORMAT_LEVELS[self._format]:
+            # A poorer format (e.g. metadata over full) only fills what the
+            # message lacks, never its richer payload
+            for key, value in raw_message.items():
+                self._raw.setdefault(key, value)
+            return
+
+        self._raw.update(raw_message)
+        self._headers = None
+        self._attachment_parts = None
+        self._parts = None
+        self._attachments = None
+        self._inline_images = None
+        self._body_parts = {}
+        self._mime = None
+        self._format = format
+        self._targeted = True
+        self._metadata_headers = metadata_headers
+        self._fields = _parse_fields(fields) if fields else None
+
+    def _fetch_format(self, format):
+        if _FORMAT_LEVELS[self._format] > _FORMAT_LEVELS[format]:
+            # Only reachable for projected messages: refetch the format we
+            # already hold, without the fields mask
+            return self._format
+
+        if not self._targeted:
+            # Messages we know little about (listed, sent or modified ones)
+            # are fetched in full, so a single request serves every property
+            # afterwards
+            return FORMAT_FULL
+
+        return format
+
+    def _fetch(self, format, metadata_headers=None):
+        format = self._fetch_format(format)
+
+        if format == FORMAT_FULL:
+            self._update(self._client.get_raw_message(self.id), FORMAT_FULL)
+        else:
+            raw_message = self._client.get_raw_message(
+                self.id, format=format, metadata_headers=metadata_headers
+            )
+            self._update(raw_message, format, metadata_headers)
+
+    def _holds(self, format, path):
+        if _FORMAT_LEVELS[self._format] < _FORMAT_LEVELS[format]:
+            return False
+
+        return self._fields is None or _fields_cover(self._fields, path)
+
+    def _require(self, format, path):
+        if not self._holds(format, path):
+            self._fetch(format)
 
     @property
     def _payload(self):
-        if "payload" not in self._raw:
-            self._raw = self._client.get_raw_message(self.id)
+        self._require(FORMAT_METADATA, "payload")
 
         return self._raw["payload"]
 
+    def _is_header_left_out(self, name):
+        if not self._metadata_headers:
+            return False
+
+        return name.lower() not in (header.lower() for header in self._metadata_headers)
+
+    def _header(self, name):
+        if self._is_header_left_out(name):
+            self._fetch(FORMAT_METADATA)
+
+        return self.headers.get(name)
+
     @property
     def headers(self):
-        headers = {}
-        for header in self._payload.get("headers"):
-            headers[header["name"]] = header["value"]
-        return headers
+        if self._headers is None:
+            if self._is_raw_backed():
+                self._headers = Headers(self._raw_headers())
+            else:
+                self._require(FORMAT_METADATA, "payload.headers")
+                self._headers = Headers(self._payload.get("headers") or [])
+
+        return self._headers
+
+    def _is_raw_backed(self):
+        return self._format == FORMAT_RAW and "raw" in self._raw
+
+    def _fetch_raw(self):
+        self._raw.update(self._client.get_raw_message(self.id, format=FORMAT_RAW))
+
+    def _raw_body(self):
+        if "raw" not in self._raw:
+            self._fetch_raw()
+
+        return AttachmentBody({"data": self._raw["raw"]})
+
+    def _raw_headers(self):
+        """
+        Parses only the header block of the RFC 822 message, decoding just
+        enough of it to reach the blank line that ends it.
+        """
+        if self._mime is not None:
+            mime = self._mime
+        else:
+            head = b""
+            for chunk in self._raw_body().iter_content(Message.RAW_HEADER_CHUNK_SIZE):
+                head += chunk
+                if b"\r\n\r\n" in head or b"\n\n" in head:
+                    break
+            mime = BytesHeaderParser(policy=email.policy.default).parsebytes(head)
+
+        return [{"name": name, "value": str(value)} for name, value in mime.items()]
+
+    @property
+    def mime(self):
+        """
+        The message parsed from its RFC 822 form (an email.message.EmailMessage),
+        fetched in the raw format if need be. Parts are decoded when read.
+        """
+        if self._mime is None:
+            self._mime = BytesParser(policy=email.policy.default).parsebytes(
+                self._raw_body().content
+            )
+
+        return self._mime
+
+    def iter_raw(self, chunk_size=None):
+        """
+        Yields the RFC 822 bytes of the message chunk by chunk, fetching it in
+        the raw format if need be.
+        """
+        return self._raw_body().iter_content(chunk_size)
+
+    def save_raw_to(self, destination, chunk_size=None):
+        """
+        Writes the RFC 822 bytes of the message (e.g. an .eml archival copy)
+        to a path or binary file object. Returns the bytes written.
+        """
+        return self._raw_body().save_to(destination, chunk_size)
 
     @property
     def labels(self):
         if "labelIds" not in self._raw:
-            self._raw = self._client.get_raw_message(self.id)
+            self._require(FORMAT_MINIMAL, "labelIds")
 
         return self._raw.get("labelIds", [])
 
@@ -104,15 +847,15 @@ class Message:
 
     @property
     def subject(self):
-        return self.headers.get("Subject")
+        return self._header("Subject")
 
     @property
     def from_address(self):
-        return self.headers.get("From")
+        return self._header("From")
 
     @property
     def reply_to(self):
-        return self.headers.get("Reply-To")
+        return self._header("Reply-To")
 
     @property
     def message_id(self):
@@ -120,44 +863,188 @@ class Message:
         While self.id is the user-bound id of the message, self.message_id
         is the global id of the message, valid for every user on the thread.
         """
-        return self.headers.get("Message-ID", self.headers.get("Message-Id"))
+        return self._header("Message-ID")
 
     @property
     def thread_id(self):
         if "threadId" not in self._raw:
-            self._raw = self._client.get_raw_message(self.id)
+            self._require(FORMAT_MINIMAL, "threadId")
 
         return self._raw.get("threadId")
 
     @property
     def date(self):
+        if "internalDate" not in self._raw:
+            self._require(FORMAT_MINIMAL, "internalDate")
+
         ms_in_seconds = 1000
         date_in_seconds = int(self._raw.get("internalDate")) / ms_in_seconds
         return datetime.utcfromtimestamp(date_in_seconds)
 
-    def _extract_attachments_from_parts(self, parts):
+    def _make_attachment(self, raw_part):
+        if not isinstance(raw_part, dict):
+            return MimeAttachment(self.id, self._client, raw_part)
+
+        return Attachment(self.id, self._client, raw_part)
+
+    def _part_index(self):
+        if self._parts is None:
+            if self._is_raw_backed():
+                self._parts = MimeParts(self.mime)
+            else:
+                self._require(FORMAT_FULL, "payload.parts")
+                self._parts = MessageParts(self._payload)
+
+        return self._parts
+
+    @property
+    def parts(self):
+        """
+        The MessageParts index of the payload (MimeParts for messages fetched
+        in the raw format), built once.
+        """
+        return self._part_index()
+
+    def iter_attachments(self):
+        if self._attachments is not None:
+            yield from self._attachments
+            return
+
+        if self._attachment_parts is not None:
+            raw_parts = self._attachment_parts
+        else:
+            raw_parts = self._part_index().iter_attachment_parts()
+
         attachments = []
-        for part in parts:
-            if part.get("filename") and part.get("body", {}).get("attachmentId"):
-                attachments.append(Attachment(self.id, self._client, part))
-            if part.get("parts"):
-                attachments += self._extract_attachments_from_parts(part.get("parts"))
+        for raw_part in raw_parts:
+            attachment = self._make_attachment(raw_part)
+            attachments.append(attachment)
+            yield attachment
 
-        return attachments
+        self._attachments = attachments
 
     @property
     def attachments(self):
-        parts = self._payload.get("parts")
+        if self._attachments is None:
+            for _ in self.iter_attachments():
+                pass
+
+        return list(self._attachments)
+
+    def _make_body_part(self, raw_part):
+        if not isinstance(raw_part, dict):
+            return MimeBodyPart(self.id, self._client, raw_part)
+
+        return BodyPart(self.id, self._client, raw_part)
+
+    def _body_part(self, raw_part):
+        if raw_part is None:
+            return None
+
+        body_part = self._body_parts.get(id(raw_part))
+        if body_part is None:
+            body_part = self._body_parts[id(raw_part)] = self._make_body_part(raw_part)
+
+        return body_part
+
+    def iter_body_parts(self):
+        """
+        Yields the text parts of the body (text/plain, text/html...), in
+        document order, leaving attachments out. Nothing is decoded until
+        read.
+        """
+        for raw_part in self._part_index().iter_body_parts():
+            yield self._body_part(raw_part)
+
+    @property
+    def text_part(self):
+        return self._body_part(self._part_index().text_part)
 
-        if not parts:
-            return []
+    @property
+    def html_part(self):
+        return self._body_part(self._part_index().html_part)
+
+    @property
+    def text_body(self):
+        return self.get_text_body(self.MAX_BODY_SIZE)
+
+    @property
+    def html_body(self):
+        return self.get_html_body(self.MAX_BODY_SIZE)
+
+    def get_text_body(self, max_size=None):
+        """
+        Like text_body, but None when the part is larger than max_size bytes
+        instead of MAX_BODY_SIZE.
+        """
+        text_part = self.text_part
+
+        return text_part.get_text(max_size) if text_part else None
+
+    def get_html_body(self, max_size=None):
+        html_part = self.html_part
+
+        return html_part.get_text(max_size) if html_part else None
+
+    @property
+    def inline_images(self):
+        if self._inline_images is None:
+            # Images stored apart are attachments too: share those objects
+            attachments = {
+                id(attachment._part): attachment
+                for attachment in Message.attachments.fget(self)
+            }
+            self._inline_images = [
+                attachments.get(id(raw_part)) or self._make_attachment(raw_part)
+                for raw_part in self._part_index().iter_inline_image_parts()
+            ]
+
+        return list(self._inline_images)
+
+    def compact(self):
+        """
+        Sheds the raw payload, keeping only the headers index, the attachment
+        manifest and COMPACT_FIELDS, to hold large sets of messages in memory.
+        Anything else the payload had is fetched again if ever needed.
+        """
+        # Through Message, as subclasses may make these properties awaitable
+        if self._holds(FORMAT_METADATA, "payload.headers") or self._is_raw_backed():
+            Message.headers.fget(self)
+
+        if self._holds(FORMAT_FULL, "payload.parts"):
+            self._attachment_parts = [
+                {**attachment._raw, "body": _strip_body_data(attachment._raw["body"])}
+                for attachment in Message.attachments.fget(self)
+            ]
+
+        self._raw = {
+            key: self._raw[key] for key in Message.COMPACT_FIELDS if key in self._raw
+        }
+        self._parts = None
+        self._attachments = None
+        self._inline_images = None
+        self._body_parts = {}
+        self._mime = None
+        self._fields = {key: None for key in Message.COMPACT_FIELDS}
+
+        return self
 
-        return self._extract_attachments_from_parts(parts)
+    def _update_labels(self, raw_modified_message):
+        self._raw.update(raw_modified_message)
+        if "payload" in raw_modified_message:
+            self._headers = None
+            self._parts = None
+            self._attachments = None
+            self._inline_images = None
+            self._body_parts = {}
+        if self._format is None:
+            self._format = FORMAT_MINIMAL
 
     def modify(self, add_labels=None, remove_labels=None):
-        self._raw = self._client.modify_raw_message(
+        raw_modified_message = self._client.modify_raw_message(
             self.id, add_labels=add_labels, remove_labels=remove_labels
         )
+        self._update_labels(raw_modified_message)
 
     def reply(self, html_content, use_reply_to=True):
         to = self.reply_to if (self.reply_to and use_reply_to) else self.from_address
@@ -178,9 +1065,111 @@ class Message:
         return "Gmail message: {}".format(self.id)
 
 
+class Thread:
+    """
+    A conversation. Its messages come from a single threads.get, made the
+    first time they are needed unless the thread was fetched or hydrated
+    with them.
+    """
+
+    __slots__ = (
+        "_raw",
+        "_client",
+        "_format",
+        "_metadata_headers",
+        "_fields",
+        "_messages",
+    )
+
+    def __init__(
+        self, client, raw_thread, format=None, metadata_headers=None, fields=None
+    ):
+        self._raw = raw_thread
+        self._client = client
+        self._format = format
+        self._metadata_headers = metadata_headers
+        self._fields = fields
+        self._messages = None
+
+    def _update(self, raw_thread, format, metadata_headers=None, fields=None):
+        self._raw.update(raw_thread)
+        self._format = format
+        self._metadata_headers = metadata_headers
+        self._fields = fields
+        self._messages = None
+
+    @property
+    def id(self):
+        return self._raw.get("id")
+
+    @property
+    def snippet(self):
+        return self._raw.get("snippet")
+
+    @property
+    def history_id(self):
+        return self._raw.get("historyId")
+
+    @property
+    def messages(self):
+        if "messages" not in self._raw:
+            self._update(
+                self._client.get_raw_thread(
+                    self.id, self._format, self._metadata_headers
+                ),
+                self._format,
+                self._metadata_headers,
+            )
+
+        if self._messages is None:
+            # Built once, so what each message fetches or caches is kept
+            self._messages = [
+                Message(
+                    self._client,
+                    raw_message,
+                    self._format or FORMAT_FULL,
+                    self._metadata_headers,
+                    self._fields,
+                )
+                for raw_message in self._raw["messages"]
+            ]
+
+        return list(self._messages)
+
+    @property
+    def last_message(self):
+        messages = self.messages
+
+        return messages[-1] if messages else None
+
+    def reply(self, html_content, use_reply_to=True):
+        return self.last_message.reply(html_content, use_reply_to)
+
+    def __str__(self):
+        return "Gmail thread: {}".format(self.id)
+
+
 class Label:
-    def __init__(self, raw_label):
+    FIELDS_IDS = "id,name"
+
+    __slots__ = ("_raw", "_client", "_fields")
+
+    def __init__(self, raw_label, client=None, fields=None):
         self._raw = raw_label
+        self._client = client
+        self._fields = _parse_fields(fields) if fields else None
+
+    def _get(self, name):
+        if (
+            self._fields is not None
+            and self._client is not None
+            and not _fields_cover(self._fields, name)
+        ):
+            # Fields left out by the mask are fetched on first read
+            self._raw = self._client.get_raw_label(self.id)
+            self._fields = None
+
+        return self._raw.get(name)
 
     @property
     def id(self):
@@ -188,8 +1177,64 @@ class Label:
 
     @property
     def name(self):
-        return self._raw.get("name")
+        return self._get("name")
 
     @property
     def type(self):
-        return self._raw.get("type")
+        return self._get("type")
+
+
+class HistoryEvent:
+    """
+    A change of a history record: the message it touched (holding only its
+    id, thread id and labels until something else is read) and, for label
+    changes, the labels added or removed.
+    """
+
+    TYPE = None
+
+    __slots__ = ("_raw", "_client", "history_id")
+
+    def __init__(self, client, history_id, raw_change):
+        self._raw = raw_change
+        self._client = client
+        self.history_id = history_id
+
+    @property
+    def message(self):
+        return Message(self._client, dict(self._raw["message"]))
+
+    @property
+    def message_id(self):
+        return self._raw["message"].get("id")
+
+    @property
+    def label_ids(self):
+        return self._raw.get("labelIds", [])
+
+    def __str__(self):
+        return "Gmail {}: {}".format(self.TYPE, self.message_id)
+
+
+class MessageAdded(HistoryEvent):
+    TYPE = "messageAdded"
+
+    __slots__ = ()
+
+
+class MessageDeleted(HistoryEvent):
+    TYPE = "messageDeleted"
+
+    __slots__ = ()
+
+
+class LabelsAdded(HistoryEvent):
+    TYPE = "labelAdded"
+
+    __slots__ = ()
+
+
+class LabelsRemoved(HistoryEvent):
+    TYPE = "labelRemoved"
+
+    __slots__ = ()
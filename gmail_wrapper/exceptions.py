@@ -19,6 +19,14 @@ class LabelNotFoundError(Exception):
         return f"LabelNotFoundError: Gmail returned 404 when attempting to get label {self.label_id}"
 
 
+class ThreadNotFoundError(Exception):
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+
+    def __str__(self):
+        return f"ThreadNotFoundError: Gmail returned 404 when attempting to get thread {self.thread_id}"
+
+
 class AttachmentNotFoundError(Exception):
     def __init__(self, message_id, attachment_id):
         self.message_id = message_id
@@ -26,3 +34,27 @@ class AttachmentNotFoundError(Exception):
 
     def __str__(self):
         return f"AttachmentNotFoundError: Gmail returned 404 when attempting to get attachment {self.attachment_id} of message {self.message_id}"
+
+
+class HistoryNotFoundError(Exception):
+    def __init__(self, start_history_id):
+        self.start_history_id = start_history_id
+
+    def __str__(self):
+        return f"HistoryNotFoundError: Gmail returned 404 when attempting to list history since {self.start_history_id}"
+
+
+class BulkOperationError(GmailError):
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def failed_ids(self):
+        return [id for result in self.failed for id in result.ids]
+
+    def __str__(self):
+        return f"BulkOperationError: {len(self.failed)} of {len(self.results)} requests failed, leaving {len(self.failed_ids)} messages untouched"
@@ -0,0 +1,143 @@
+import threading
+import time
+
+from gmail_wrapper.exceptions import LabelNotFoundError
+
+SYSTEM_LABEL_IDS = frozenset(
+    (
+        "CHAT",
+        "SENT",
+        "INBOX",
+        "IMPORTANT",
+        "TRASH",
+        "DRAFT",
+        "SPAM",
+        "STARRED",
+        "UNREAD",
+        "CATEGORY_FORUMS",
+        "CATEGORY_UPDATES",
+        "CATEGORY_PERSONAL",
+        "CATEGORY_PROMOTIONS",
+        "CATEGORY_SOCIAL",
+    )
+)
+
+
+def is_label_id(value):
+    """
+    Tells the ids Gmail gives labels (system ones and "Label_" prefixed user
+    ones) apart from label names, without any request.
+    """
+    return value in SYSTEM_LABEL_IDS or value.startswith("Label_")
+
+
+def resolve_label_ids(labels, lookup, strict=True):
+    """
+    Maps label names (or ids, kept as they are) to label ids through
+    lookup(name), which returns the Label of a name or None. Unknown names
+    raise LabelNotFoundError, or are kept as they are when not strict.
+    """
+    label_ids = []
+    for label in labels or []:
+        if is_label_id(label):
+            label_ids.append(label)
+            continue
+
+        indexed = lookup(label)
+        if indexed is not None:
+            label_ids.append(indexed.id)
+        elif strict:
+            raise LabelNotFoundError(label)
+        else:
+            label_ids.append(label)
+
+    return label_ids
+
+
+class LabelIndex:
+    """
+    Looks labels of a mailbox up by id or name (case-insensitively, as Gmail
+    compares them), listing them at most once every ttl seconds.
+    """
+
+    DEFAULT_TTL = 300
+
+    def __init__(self, client, ttl=None):
+        self._client = client
+        self.ttl = ttl if ttl is not None else LabelIndex.DEFAULT_TTL
+        self._by_id = None
+        self._by_name = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and self._loaded_at + self.ttl > time.time()
+
+    @property
+    def is_fresh(self):
+        return self._is_fresh()
+
+    def _fill(self, labels):
+        self._by_id = {label.id: label for label in labels}
+        self._by_name = {label.name.casefold(): label for label in labels}
+        self._loaded_at = time.time()
+
+    def _load(self):
+        with self._lock:
+            if self._is_fresh():
+                return
+            self._fill(self._client.get_labels())
+
+    def load(self, labels):
+        """
+        Fills the index with labels listed elsewhere, e.g. by an async client.
+        """
+        with self._lock:
+            self._fill(labels)
+
+    def get_by_id(self, id):
+        self._load()
+
+        return self._by_id.get(id)
+
+    def get_by_name(self, name):
+        self._load()
+
+        return self._by_name.get(name.casefold())
+
+    def get(self, id_or_name):
+        return self.get_by_id(id_or_name) or self.get_by_name(id_or_name)
+
+    def peek(self, id_or_name):
+        """
+        Looks a label up in the labels loaded so far, never listing them.
+        """
+        with self._lock:
+            if self._by_id is None:
+                return None
+            return self._by_id.get(id_or_name) or self._by_name.get(
+                id_or_name.casefold()
+            )
+
+    def add(self, label):
+        with self._lock:
+            if self._is_fresh():
+                self._by_id[label.id] = label
+                self._by_name[label.name.casefold()] = label
+
+    def remove(self, id):
+        with self._lock:
+            if self._is_fresh():
+                label = self._by_id.pop(id, None)
+                if label is not None:
+                    self._by_name.pop(label.name.casefold(), None)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    @property
+    def labels(self):
+        self._load()
+
+        return list(self._by_id.values())
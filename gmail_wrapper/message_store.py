@@ -0,0 +1,172 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MessageStore:
+    """
+    Keeps full raw messages by mailbox (email address) and id, so one store
+    can be shared by the clients of many mailboxes. Messages are handed out
+    until max_age seconds after they were stored, and at most max_messages
+    are kept, evicting the least recently used. With revalidate_labels, the client
+    refreshes the labels of stored messages (the only mutable part of a
+    message) before handing them out, replaying the mailbox history since
+    they were stored or, when that history is gone, with a minimal get.
+    """
+
+    def __init__(self, max_age=None, max_messages=None, revalidate_labels=True):
+        self.max_age = max_age
+        self.max_messages = max_messages
+        self.revalidate_labels = revalidate_labels
+
+    def _is_fresh(self, stored_at):
+        return self.max_age is None or stored_at + self.max_age > time.time()
+
+    def get(self, email, id):
+        raise NotImplementedError
+
+    def set(self, email, id, raw_message):
+        raise NotImplementedError
+
+    def delete(self, email, id):
+        raise NotImplementedError
+
+
+class MemoryMessageStore(MessageStore):
+    def __init__(self, max_age=None, max_messages=None, revalidate_labels=True):
+        super().__init__(max_age, max_messages, revalidate_labels)
+        self._messages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email, id):
+        key = (email, id)
+        with self._lock:
+            stored = self._messages.get(key)
+            if stored is None:
+                return None
+            if not self._is_fresh(stored[1]):
+                del self._messages[key]
+                return None
+            self._messages.move_to_end(key)
+
+        return copy.deepcopy(stored[0])
+
+    def set(self, email, id, raw_message):
+        key = (email, id)
+        with self._lock:
+            self._messages[key] = (copy.deepcopy(raw_message), time.time())
+            self._messages.move_to_end(key)
+            if self.max_messages is not None:
+                while len(self._messages) > self.max_messages:
+                    self._messages.popitem(last=False)
+
+    def delete(self, email, id):
+        with self._lock:
+            self._messages.pop((email, id), None)
+
+    def __len__(self):
+        return len(self._messages)
+
+
+class SqliteMessageStore(MessageStore):
+    """
+    Message store shared by every process pointing at the same file. The file
+    is created readable by its owner only, as it holds mail contents.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_age=None,
+        max_messages=None,
+        revalidate_labels=True,
+        timeout=30,
+    ):
+        super().__init__(max_age, max_messages, revalidate_labels)
+        self.path = path
+        self.timeout = timeout
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS messages (email TEXT NOT NULL, "
+                    "id TEXT NOT NULL, raw TEXT NOT NULL, stored_at REAL NOT NULL, "
+                    "accessed REAL NOT NULL, PRIMARY KEY (email, id))"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS messages_accessed "
+                    "ON messages (accessed)"
+                )
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def get(self, email, id):
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT raw, stored_at FROM messages WHERE email = ? AND id = ?",
+                (email, id),
+            ).fetchone()
+            if row is None:
+                return None
+
+            with connection:
+                if not self._is_fresh(row[1]):
+                    connection.execute(
+                        "DELETE FROM messages WHERE email = ? AND id = ?", (email, id)
+                    )
+                    return None
+                connection.execute(
+                    "UPDATE messages SET accessed = ? WHERE email = ? AND id = ?",
+                    (time.time(), email, id),
+                )
+        finally:
+            connection.close()
+
+        return json.loads(row[0])
+
+    def set(self, email, id, raw_message):
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO messages "
+                    "(email, id, raw, stored_at, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (email, id, json.dumps(raw_message), now, now),
+                )
+                if self.max_messages is not None:
+                    connection.execute(
+                        "DELETE FROM messages WHERE rowid IN (SELECT rowid FROM "
+                        "messages ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                        (self.max_messages,),
+                    )
+        finally:
+            connection.close()
+
+    def delete(self, email, id):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "DELETE FROM messages WHERE email = ? AND id = ?", (email, id)
+                )
+        finally:
+            connection.close()
+
+    def __len__(self):
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        finally:
+            connection.close()
@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+
+from google.oauth2 import service_account
+
+from gmail_wrapper.client import GmailClient
+from gmail_wrapper.token_cache import MemoryTokenCache
+from gmail_wrapper.transport import PooledHttp
+
+
+class GmailClientPool:
+    """
+    Hands out GmailClient instances for the mailboxes of a domain-wide
+    delegated service account. The account is parsed once, every client
+    shares the same connection pool (a PooledHttp unless http is given, or
+    built by http_factory), and at most max_clients are kept alive, evicting
+    the least recently used.
+    """
+
+    DEFAULT_MAX_CLIENTS = 128
+
+    def __init__(
+        self,
+        account_json,
+        scopes=None,
+        max_clients=None,
+        token_cache=None,
+        http=None,
+        scheduler=None,
+        attachment_cache=None,
+        message_store=None,
+        http_factory=None,
+    ):
+        self.credentials = service_account.Credentials.from_service_account_info(
+            account_json,
+            scopes=scopes if scopes else [GmailClient.SCOPE_READONLY],
+        )
+        self.max_clients = (
+            max_clients if max_clients else GmailClientPool.DEFAULT_MAX_CLIENTS
+        )
+        self.token_cache = token_cache if token_cache else MemoryTokenCache()
+        if http is None:
+            http = http_factory() if http_factory else PooledHttp()
+        self._http = http
+        self._http_factory = http_factory
+        self.scheduler = scheduler
+        self.attachment_cache = attachment_cache
+        self.message_store = message_store
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, email):
+        return email in self._clients
+
+    def get_client(self, email):
+        with self._lock:
+            client = self._clients.get(email)
+            if client is not None:
+                self._clients.move_to_end(email)
+                return client
+
+        client = GmailClient(
+            email,
+            self.credentials.with_subject(email),
+            client_strategy=GmailClient.CREDENTIALS_STRATEGY,
+            token_cache=self.token_cache,
+            http=self._http,
+            scheduler=self.scheduler,
+            attachment_cache=self.attachment_cache,
+            message_store=self.message_store,
+            http_factory=self._http_factory,
+        )
+
+        with self._lock:
+            client = self._clients.setdefault(email, client)
+            self._clients.move_to_end(email)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+        return client
+
+    def evict(self, email):
+        with self._lock:
+            self._clients.pop(email, None)
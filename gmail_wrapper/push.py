@@ -0,0 +1,160 @@
+import base64
+import json
+import threading
+
+
+class PushNotification:
+    """
+    Gmail push notification, as delivered by a Pub/Sub push subscription:
+    the mailbox that changed and its history id after the change.
+    """
+
+    __slots__ = ("email_address", "history_id", "message_id")
+
+    def __init__(self, email_address, history_id, message_id=None):
+        self.email_address = email_address
+        self.history_id = history_id
+        self.message_id = message_id
+
+    def __str__(self):
+        return "Gmail push notification: {} at {}".format(
+            self.email_address, self.history_id
+        )
+
+
+def decode_push_message(payload):
+    """
+    Decodes the body of a Pub/Sub push request (bytes, str or the parsed
+    dict), whose message data is the base64 encoded JSON Gmail publishes.
+    Raises ValueError on anything else.
+    """
+    try:
+        if isinstance(payload, (bytes, str)):
+            payload = json.loads(payload)
+        message = payload["message"]
+        data = json.loads(base64.b64decode(message["data"]))
+
+        return PushNotification(
+            data["emailAddress"], str(data["historyId"]), message.get("messageId")
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid Gmail push message: {e}") from e
+
+
+class PushDispatcher:
+    """
+    Turns push notifications into history events. Notifications of a mailbox
+    arriving within debounce seconds of the first one are coalesced into a
+    single sync from the mailbox checkpoint, whose events are passed to
+    handler(email_address, event) before the checkpoint moves forward.
+
+    get_client maps an email address to its GmailClient (e.g.
+    GmailClientPool.get_client) and checkpoints is any mutable mapping of
+    email address to history id, so checkpoints can outlive the process.
+    """
+
+    DEFAULT_DEBOUNCE = 5
+
+    def __init__(self, get_client, handler, checkpoints=None, debounce=None):
+        self.get_client = get_client
+        self.handler = handler
+        self.checkpoints = checkpoints if checkpoints is not None else {}
+        self.debounce = (
+            debounce if debounce is not None else PushDispatcher.DEFAULT_DEBOUNCE
+        )
+        self._timers = {}
+        self._mailbox_locks = {}
+        self._lock = threading.Lock()
+
+    def watch(self, email_address, topic_name, label_ids=None):
+        """
+        Starts the mailbox watch, checkpointing the history id it returns
+        unless the mailbox already has a checkpoint.
+        """
+        raw_watch = self.get_client(email_address).watch(topic_name, label_ids)
+        with self._lock:
+            if email_address not in self.checkpoints:
+                self.checkpoints[email_address] = raw_watch["historyId"]
+
+        return raw_watch
+
+    def dispatch(self, notification):
+        with self._lock:
+            checkpoint = self.checkpoints.get(notification.email_address)
+            if checkpoint is None:
+                # There is nothing to sync from: the notification becomes the
+                # checkpoint of the mailbox
+                self.checkpoints[notification.email_address] = notification.history_id
+                return
+            if int(notification.history_id) <= int(checkpoint):
+                # Redelivered or already synced
+                return
+            if notification.email_address in self._timers:
+                return
+
+            timer = threading.Timer(
+                self.debounce, self._sync, args=(notification.email_address,)
+            )
+            timer.daemon = True
+            self._timers[notification.email_address] = timer
+
+        timer.start()
+
+    def dispatch_payload(self, payload):
+        notification = decode_push_message(payload)
+        self.dispatch(notification)
+
+        return notification
+
+    def flush(self):
+        """
+        Syncs every mailbox with pending notifications right away.
+        """
+        with self._lock:
+            email_addresses = list(self._timers)
+            for timer in self._timers.values():
+                timer.cancel()
+
+        for email_address in email_addresses:
+            self._sync(email_address)
+
+    @property
+    def pending(self):
+        return list(self._timers)
+
+    def _mailbox_lock(self, email_address):
+        with self._lock:
+            return self._mailbox_locks.setdefault(email_address, threading.Lock())
+
+    def _sync(self, email_address):
+        with self._mailbox_lock(email_address):
+            with self._lock:
+                if self._timers.pop(email_address, None) is None:
+                    return
+                checkpoint = self.checkpoints[email_address]
+
+            sync = self.get_client(email_address).sync(checkpoint)
+            for event in sync:
+                self.handler(email_address, event)
+
+            with self._lock:
+                self.checkpoints[email_address] = sync.history_id
+
+    def wsgi_app(self, environ, start_response):
+        """
+        WSGI endpoint for the Pub/Sub push subscription. Acknowledges valid
+        notifications with 204 and rejects anything else with 400.
+        """
+        if environ.get("REQUEST_METHOD") != "POST":
+            start_response("405 Method Not Allowed", [("Allow", "POST")])
+            return [b""]
+
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            self.dispatch_payload(environ["wsgi.input"].read(length))
+        except ValueError:
+            start_response("400 Bad Request", [("Content-Type", "text/plain")])
+            return [b"Invalid Gmail push message"]
+
+        start_response("204 No Content", [])
+        return [b""]
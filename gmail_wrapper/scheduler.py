@@ -0,0 +1,260 @@
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from googleapiclient.errors import HttpError
+
+# Quota units charged per method, see https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.watch": 100,
+    "gmail.users.stop": 50,
+    "gmail.users.history.list": 2,
+    "gmail.users.labels.create": 5,
+    "gmail.users.labels.delete": 5,
+    "gmail.users.labels.get": 1,
+    "gmail.users.labels.list": 1,
+    "gmail.users.labels.patch": 5,
+    "gmail.users.labels.update": 5,
+    "gmail.users.messages.attachments.get": 5,
+    "gmail.users.messages.batchDelete": 50,
+    "gmail.users.messages.batchModify": 50,
+    "gmail.users.messages.delete": 10,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.import": 25,
+    "gmail.users.messages.insert": 25,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.modify": 5,
+    "gmail.users.messages.send": 100,
+    "gmail.users.messages.trash": 5,
+    "gmail.users.messages.untrash": 5,
+    "gmail.users.threads.get": 10,
+    "gmail.users.threads.list": 10,
+    "gmail.users.threads.modify": 10,
+    "gmail.users.threads.trash": 10,
+}
+DEFAULT_QUOTA_UNITS = 5
+# Methods whose server errors may come after they took effect (e.g. the mail
+# was sent), so they are retried only when rate limited
+NON_IDEMPOTENT_METHODS = frozenset(
+    (
+        "gmail.users.drafts.create",
+        "gmail.users.drafts.send",
+        "gmail.users.labels.create",
+        "gmail.users.messages.import",
+        "gmail.users.messages.insert",
+        "gmail.users.messages.send",
+    )
+)
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+def quota_units(executable):
+    return QUOTA_UNITS.get(getattr(executable, "methodId", None), DEFAULT_QUOTA_UNITS)
+
+
+def is_idempotent(executable):
+    return getattr(executable, "methodId", None) not in NON_IDEMPOTENT_METHODS
+
+
+def _error_reasons(exception):
+    try:
+        error = json.loads(exception.content.decode("utf-8"))["error"]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return []
+
+    return [detail.get("reason") for detail in error.get("errors", [])]
+
+
+def is_rate_limited(exception):
+    if not isinstance(exception, HttpError):
+        return False
+
+    if exception.resp.status == 429:
+        return True
+
+    return exception.resp.status == 403 and any(
+        reason in RATE_LIMIT_REASONS for reason in _error_reasons(exception)
+    )
+
+
+def is_retryable(exception, idempotent=True):
+    """
+    Rate limited requests were rejected before running and can always be
+    retried. Server errors are retried only for idempotent requests.
+    """
+    if is_rate_limited(exception):
+        return True
+
+    return (
+        idempotent
+        and isinstance(exception, HttpError)
+        and exception.resp.status in RETRYABLE_STATUSES
+    )
+
+
+def retry_after(exception):
+    """
+    Seconds to wait according to the Retry-After header of the error, if any.
+    """
+    try:
+        value = exception.resp.get("retry-after")
+    except AttributeError:
+        return None
+
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(now - self._updated_at, 0)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def acquire(self, units):
+        """
+        Waits until the bucket holds units (or is full, for requests costing
+        more than it can hold) and draws them. Large requests leave the bucket
+        in debt, so every unit is charged and the next callers wait for it.
+        """
+        needed = min(units, self.capacity)
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    # Tolerates the float error of refilling after the wait
+                    if self._tokens >= needed - 1e-9:
+                        self._tokens -= units
+                        return
+                    wait = (needed - self._tokens) / self.rate
+
+            self._sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Holds every caller of the bucket, as the API just asked us to slow
+        down, and drops the burst allowance accumulated so far.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens = 0
+            self._paused_until = max(self._paused_until, now + seconds)
+
+
+class QuotaScheduler:
+    """
+    Paces requests under the Gmail per-user quota (250 units per second) with
+    one token bucket per user, and retries rate limited and server errors with
+    jittered exponential backoff, honouring Retry-After. Share one instance
+    between the clients of a process so they draw from the same buckets.
+    """
+
+    DEFAULT_UNITS_PER_SECOND = 240
+    DEFAULT_MAX_RETRIES = 5
+    DEFAULT_BACKOFF_BASE = 1
+    DEFAULT_BACKOFF_CAP = 64
+
+    def __init__(
+        self,
+        units_per_second=None,
+        max_retries=None,
+        backoff_base=None,
+        backoff_cap=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.units_per_second = (
+            units_per_second
+            if units_per_second
+            else QuotaScheduler.DEFAULT_UNITS_PER_SECOND
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else QuotaScheduler.DEFAULT_MAX_RETRIES
+        )
+        self.backoff_base = (
+            backoff_base if backoff_base else QuotaScheduler.DEFAULT_BACKOFF_BASE
+        )
+        self.backoff_cap = (
+            backoff_cap if backoff_cap else QuotaScheduler.DEFAULT_BACKOFF_CAP
+        )
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, user):
+        with self._lock:
+            if user not in self._buckets:
+                self._buckets[user] = TokenBucket(
+                    self.units_per_second,
+                    self.units_per_second,
+                    clock=self._clock,
+                    sleep=self._sleep,
+                )
+
+            return self._buckets[user]
+
+    def backoff(self, attempt, exception=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+        server_delay = retry_after(exception) if exception is not None else None
+
+        return max(delay, server_delay) if server_delay is not None else delay
+
+    def should_retry(self, attempt, exception, idempotent=True):
+        return attempt < self.max_retries and is_retryable(exception, idempotent)
+
+    def wait_before_retry(self, user, attempt, exception):
+        delay = self.backoff(attempt, exception)
+        if exception.resp.status in (403, 429):
+            self.bucket(user).pause(delay)
+        self._sleep(delay)
+
+    def run(self, user, units, call, idempotent=True):
+        """
+        Runs call() once the user's bucket holds the units it costs, retrying
+        it while it fails with a retryable error (only rate limits unless it
+        is idempotent).
+        """
+        bucket = self.bucket(user)
+        attempt = 0
+        while True:
+            bucket.acquire(units)
+            try:
+                return call()
+            except HttpError as e:
+                if not self.should_retry(attempt, e, idempotent):
+                    raise e
+
+                self.wait_before_retry(user, attempt, e)
+                attempt += 1
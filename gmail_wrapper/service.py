@@ -0,0 +1,50 @@
+import copy
+import functools
+import json
+import os
+
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery
+from googleapiclient.http import build_http
+
+from gmail_wrapper.transport import PooledHttp
+
+DISCOVERY_DOCUMENT_PATH = os.path.join(
+    os.path.dirname(__file__), "discovery_documents", "gmail.v1.json"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_discovery_document():
+    with open(DISCOVERY_DOCUMENT_PATH, "r") as discovery_document:
+        return json.load(discovery_document)
+
+
+@functools.lru_cache(maxsize=None)
+def _service_skeleton():
+    return discovery.build_from_document(_load_discovery_document(), http=build_http())
+
+
+def build_service(credentials, http=None):
+    """
+    Builds a Gmail v1 service from the bundled discovery document, so no
+    request is made to the discovery endpoint. The document is parsed once
+    per process and every service is a shallow copy of the same skeleton,
+    bound to its own authorized transport. The underlying http connection
+    pool (a PooledHttp by default) may be shared by passing it in, and any
+    httplib2.Http compatible transport may be plugged.
+    """
+    service = copy.copy(_service_skeleton())
+    service._http = AuthorizedHttp(
+        credentials, http=http if http is not None else PooledHttp()
+    )
+    return service
+
+
+def build_request_service():
+    """
+    Builds a Gmail v1 service that only builds requests, bound to neither
+    credentials nor a transport of its own, for clients that execute them
+    elsewhere (e.g. AsyncGmailClient).
+    """
+    return copy.copy(_service_skeleton())
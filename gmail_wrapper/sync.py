@@ -0,0 +1,93 @@
+from gmail_wrapper.entities import (
+    MessageAdded,
+    MessageDeleted,
+    LabelsAdded,
+    LabelsRemoved,
+)
+from gmail_wrapper.exceptions import HistoryNotFoundError
+
+HISTORY_EVENTS = {
+    "messagesAdded": MessageAdded,
+    "messagesDeleted": MessageDeleted,
+    "labelsAdded": LabelsAdded,
+    "labelsRemoved": LabelsRemoved,
+}
+
+
+class MailboxSync:
+    """
+    Iterates over the changes of a mailbox since start_history_id, following
+    the pages of users.history.list. Once exhausted, history_id holds the
+    checkpoint to resume from.
+
+    When there is no start_history_id, or Gmail no longer keeps history that
+    old, every message matching resync_query is yielded as MessageAdded
+    instead, and resynced is set before the first of them.
+    """
+
+    def __init__(
+        self,
+        client,
+        start_history_id=None,
+        history_types=None,
+        label_id=None,
+        resync_query="",
+        page_size=500,
+    ):
+        self._client = client
+        self.start_history_id = start_history_id
+        self.history_types = history_types
+        self.label_id = label_id
+        self.resync_query = resync_query
+        self.page_size = page_size
+        self.history_id = None
+        self.resynced = False
+
+    def __iter__(self):
+        if self.start_history_id is None:
+            return self._resync()
+
+        try:
+            raw_history = self._get_raw_history(None)
+        except HistoryNotFoundError:
+            return self._resync()
+
+        return self._history(raw_history)
+
+    def _get_raw_history(self, page_token):
+        return self._client.get_raw_history(
+            self.start_history_id,
+            page_token=page_token,
+            history_types=self.history_types,
+            label_id=self.label_id,
+            limit=self.page_size,
+        )
+
+    def _history(self, raw_history):
+        while True:
+            for raw_record in raw_history.get("history", []):
+                yield from self._record_events(raw_record)
+
+            page_token = raw_history.get("nextPageToken")
+            if not page_token:
+                self.history_id = raw_history.get("historyId")
+                return
+            raw_history = self._get_raw_history(page_token)
+
+    def _record_events(self, raw_record):
+        for key, event_class in HISTORY_EVENTS.items():
+            for raw_change in raw_record.get(key, []):
+                yield event_class(self._client, raw_record.get("id"), raw_change)
+
+    def _resync(self):
+        # The checkpoint is taken before listing, so changes made while the
+        # mailbox is listed are picked by the next sync
+        history_id = self._client.get_raw_profile()["historyId"]
+        self.resynced = True
+
+        for message in self._client.iter_messages(
+            query=self.resync_query, page_size=self.page_size
+        ):
+            yield MessageAdded(self._client, history_id, {"message": message._raw})
+
+        self.history_id = history_id
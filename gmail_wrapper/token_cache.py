@@ -0,0 +1,177 @@
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def token_cache_key(credentials, subject):
+    """
+    Identifies the tokens minted for a credential, impersonated subject and
+    set of scopes. Secrets are hashed, never stored in the key.
+    """
+    identity = getattr(credentials, "service_account_email", None) or getattr(
+        credentials, "client_id", None
+    )
+    refresh_token = getattr(credentials, "refresh_token", None) or ""
+    parts = [
+        type(credentials).__name__,
+        identity or "",
+        hashlib.sha256(refresh_token.encode("utf-8")).hexdigest(),
+        subject or "",
+        " ".join(sorted(credentials.scopes or [])),
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class CachedCredentials:
+    """
+    Wraps google-auth credentials so that refreshing them hands out a token
+    cached under token_cache_key, refreshing (and caching) only when there
+    is none or the cached one is the token being replaced. Anything else is
+    delegated to the wrapped credentials.
+    """
+
+    def __init__(self, credentials, token_cache, subject):
+        self._credentials = credentials
+        self.token_cache = token_cache
+        self._subject = subject
+        self._key = None
+
+    def __getattr__(self, name):
+        return getattr(self._credentials, name)
+
+    def refresh(self, request):
+        credentials = self._credentials
+        if self._key is None:
+            self._key = token_cache_key(credentials, self._subject)
+
+        cached = self.token_cache.get(self._key)
+        if cached is not None and cached[0] != credentials.token:
+            credentials.token, credentials.expiry = cached
+            return
+
+        credentials.refresh(request)
+        if credentials.expiry is not None:
+            self.token_cache.set(self._key, credentials.token, credentials.expiry)
+
+    def before_request(self, request, method, url, headers):
+        if not self._credentials.valid:
+            self.refresh(request)
+        self._credentials.apply(headers)
+
+
+class TokenCache:
+    """
+    Stores access tokens by token_cache_key, handing them out until
+    expiry_margin before they expire.
+    """
+
+    DEFAULT_EXPIRY_MARGIN = datetime.timedelta(minutes=5)
+
+    def __init__(self, expiry_margin=None):
+        self.expiry_margin = (
+            expiry_margin
+            if expiry_margin is not None
+            else TokenCache.DEFAULT_EXPIRY_MARGIN
+        )
+
+    def _is_fresh(self, expiry):
+        return expiry - self.expiry_margin > datetime.datetime.utcnow()
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, token, expiry):
+        raise NotImplementedError
+
+
+class MemoryTokenCache(TokenCache):
+    """
+    Token cache of a single process. Stale tokens are dropped when read and,
+    with max_tokens, the least recently used ones are evicted past that size.
+    """
+
+    def __init__(self, expiry_margin=None, max_tokens=None):
+        super().__init__(expiry_margin)
+        self.max_tokens = max_tokens
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            cached = self._tokens.get(key)
+            if cached is None:
+                return None
+            if not self._is_fresh(cached[1]):
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+
+        return cached
+
+    def set(self, key, token, expiry):
+        with self._lock:
+            self._tokens[key] = (token, expiry)
+            self._tokens.move_to_end(key)
+            if self.max_tokens is not None:
+                while len(self._tokens) > self.max_tokens:
+                    self._tokens.popitem(last=False)
+
+    def __len__(self):
+        return len(self._tokens)
+
+
+class SqliteTokenCache(TokenCache):
+    """
+    Token cache shared by every process pointing at the same file. The file
+    is created readable by its owner only, as it holds access tokens.
+    """
+
+    def __init__(self, path, expiry_margin=None, timeout=30):
+        super().__init__(expiry_margin)
+        self.path = path
+        self.timeout = timeout
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tokens "
+                "(key TEXT PRIMARY KEY, token TEXT NOT NULL, expiry REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def get(self, key):
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT token, expiry FROM tokens WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            connection.close()
+
+        if row is None:
+            return None
+
+        expiry = datetime.datetime.utcfromtimestamp(row[1])
+        if not self._is_fresh(expiry):
+            return None
+
+        return row[0], expiry
+
+    def set(self, key, token, expiry):
+        timestamp = expiry.replace(tzinfo=datetime.timezone.utc).timestamp()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO tokens (key, token, expiry) "
+                    "VALUES (?, ?, ?)",
+                    (key, token, timestamp),
+                )
+        finally:
+            connection.close()
@@ -0,0 +1,80 @@
+import socket
+
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledHttp:
+    """
+    httplib2.Http compatible transport over a requests session, so the
+    googleapiclient service (which speaks httplib2) runs on a thread-safe
+    urllib3 connection pool. Connections are kept alive and reused across
+    requests and threads, sparing a TLS handshake per request.
+
+    pool_size bounds the connections kept per host, keep_alive=False closes
+    each connection after its response and timeout (in seconds) applies to
+    connecting and to every read.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_TIMEOUT = 60
+    redirect_codes = frozenset((300, 301, 302, 303, 307))
+
+    def __init__(self, pool_size=None, keep_alive=True, timeout=None, session=None):
+        self.pool_size = pool_size if pool_size else PooledHttp.DEFAULT_POOL_SIZE
+        self.keep_alive = keep_alive
+        self.timeout = timeout if timeout is not None else PooledHttp.DEFAULT_TIMEOUT
+        self.follow_redirects = True
+        self.session = session if session is not None else requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(
+        self,
+        uri,
+        method="GET",
+        body=None,
+        headers=None,
+        redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type=None,
+    ):
+        headers = dict(headers) if headers else {}
+        if not self.keep_alive:
+            headers["connection"] = "close"
+
+        try:
+            response = self.session.request(
+                method,
+                uri,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=self.follow_redirects and redirections > 0,
+            )
+        except requests.exceptions.Timeout as e:
+            # Raised as the errors googleapiclient retries on
+            raise socket.timeout(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+
+        return self._make_response(response), response.content
+
+    @staticmethod
+    def _make_response(response):
+        info = {key.lower(): value for key, value in response.headers.items()}
+        if "content-encoding" in info:
+            # requests already decoded the content, as httplib2 would have
+            info["-content-encoding"] = info.pop("content-encoding")
+            info["content-length"] = str(len(response.content))
+        info["status"] = response.status_code
+        raw_response = httplib2.Response(info)
+        raw_response.reason = response.reason
+
+        return raw_response
+
+    def close(self):
+        self.session.close()
@@ -23,7 +23,9 @@ setup(
     author_email="engineering@loadsmart.com",
     url="https://github.com/loadsmart/gmail-wrapper",
     packages=find_packages(exclude=["tests"]),
+    package_data={"gmail_wrapper": ["discovery_documents/*.json"]},
     install_requires=requirements,
+    extras_require={"async": ["aiohttp>=3.8,<4"]},
     keywords=["gmail"],
     classifiers=[
         "Natural Language :: English",
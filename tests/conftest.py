@@ -122,6 +122,31 @@ def raw_complete_message():
     }
 
 
+@pytest.fixture
+def raw_complete_thread(raw_complete_message):
+    return {
+        "id": "AA121212",
+        "historyId": "125",
+        "messages": [
+            raw_complete_message,
+            {
+                "id": "123AAC",
+                "threadId": "AA121212",
+                "labelIds": ["INBOX"],
+                "internalDate": "1566398700",
+                "payload": {
+                    "headers": [
+                        {"name": "From", "value": "foo@loadsmart.com"},
+                        {"name": "Reply-To", "value": "foo+reply@loadsmart.com"},
+                        {"name": "Subject", "value": "Re:Urgent errand"},
+                        {"name": "Message-ID", "value": "<CAF123@mail.gmail.com>"},
+                    ],
+                },
+            },
+        ],
+    }
+
+
 @pytest.fixture
 def raw_attachment_body():
     return {
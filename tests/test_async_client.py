@@ -0,0 +1,375 @@
+import asyncio
+import datetime
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.oauth2.credentials import Credentials
+
+from gmail_wrapper import GmailClient
+from gmail_wrapper.async_client import AsyncGmailClient
+from gmail_wrapper.async_entities import AsyncMessage, AsyncAttachment, AsyncBodyPart
+from gmail_wrapper.entities import AttachmentBody, Label, Message
+from gmail_wrapper.exceptions import GmailError, MessageNotFoundError
+from gmail_wrapper.token_cache import MemoryTokenCache
+
+
+class FakeGmailServer(ThreadingHTTPServer):
+    def __init__(self, routes):
+        super().__init__(("127.0.0.1", 0), FakeGmailHandler)
+        self.routes = routes
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.requests.append((self.command, url.path, parse_qs(url.query), body))
+        status, payload = self.server.routes.get(
+            (self.command, url.path), (404, {"error": {"code": 404}})
+        )
+        content = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+MESSAGES_PATH = "/gmail/v1/users/foo@bar.com/messages"
+RFC822_MESSAGE = b"Subject: Urgent errand\r\nTo: mary@doe.com\r\n\r\nHello\r\n"
+
+
+@pytest.fixture
+def routes(raw_complete_message, raw_attachment_body, list_label_payload):
+    return {
+        ("GET", MESSAGES_PATH): (
+            200,
+            {"messages": [{"id": "123AAB", "threadId": "AA121212"}]},
+        ),
+        ("GET", f"{MESSAGES_PATH}/123AAB"): (200, raw_complete_message),
+        ("GET", f"{MESSAGES_PATH}/BROKEN"): (500, {"error": {"code": 500}}),
+        ("POST", f"{MESSAGES_PATH}/123AAB/modify"): (
+            200,
+            {"id": "123AAB", "threadId": "AA121212", "labelIds": ["processed"]},
+        ),
+        ("POST", f"{MESSAGES_PATH}/send"): (
+            200,
+            {"id": "114ADC", "threadId": "AA121212", "labelIds": ["SENT"]},
+        ),
+        ("GET", f"{MESSAGES_PATH}/123AAB/attachments/CCX457"): (
+            200,
+            raw_attachment_body,
+        ),
+        ("GET", "/gmail/v1/users/foo@bar.com/labels"): (200, list_label_payload),
+        ("GET", f"{MESSAGES_PATH}/ALT001"): (
+            200,
+            {
+                "id": "ALT001",
+                "payload": {
+                    "partId": "",
+                    "mimeType": "multipart/alternative",
+                    "parts": [
+                        {
+                            "partId": "0",
+                            "mimeType": "text/plain",
+                            "body": {"attachmentId": "CCX457", "size": 43},
+                        },
+                        {
+                            "partId": "1",
+                            "mimeType": "text/html",
+                            "body": {"data": "PHA-SGk8L3A-", "size": 9},
+                        },
+                    ],
+                },
+            },
+        ),
+        ("GET", f"{MESSAGES_PATH}/ALT001/attachments/CCX457"): (
+            200,
+            raw_attachment_body,
+        ),
+        ("GET", f"{MESSAGES_PATH}/RAW001"): (
+            200,
+            {
+                "id": "RAW001",
+                "raw": base64.urlsafe_b64encode(RFC822_MESSAGE).decode("utf-8"),
+            },
+        ),
+    }
+
+
+@pytest.fixture
+def fake_server(routes):
+    server = FakeGmailServer(routes)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def async_client(fake_server):
+    return AsyncGmailClient(
+        "foo@bar.com",
+        AnonymousCredentials(),
+        client_strategy=GmailClient.CREDENTIALS_STRATEGY,
+        api_endpoint=fake_server.url,
+    )
+
+
+def run(coroutine_function, async_client):
+    async def wrapper():
+        async with async_client:
+            return await coroutine_function()
+
+    return asyncio.run(wrapper())
+
+
+class TestAsyncGmailClient:
+    def test_it_refreshes_credentials_off_the_constructor(
+        self, mocker, fake_server, secrets_string
+    ):
+        def refresh(credentials, request):
+            credentials.token = "fresh-token"
+            credentials.expiry = datetime.datetime.utcnow() + datetime.timedelta(
+                hours=1
+            )
+
+        mocked_refresh = mocker.patch.object(
+            Credentials, "refresh", autospec=True, side_effect=refresh
+        )
+        mocked_pooled_http = mocker.patch("gmail_wrapper.service.PooledHttp")
+        async_client = AsyncGmailClient(
+            "foo@bar.com", secrets_string, api_endpoint=fake_server.url
+        )
+        mocked_refresh.assert_not_called()
+        mocked_pooled_http.assert_not_called()
+
+        labels = run(async_client.get_labels, async_client)
+        assert len(labels) == 2
+        mocked_refresh.assert_called_once()
+
+    def test_it_refreshes_credentials_through_the_token_cache(
+        self, mocker, fake_server, secrets_string
+    ):
+        def refresh(credentials, request):
+            credentials.token = "fresh-token"
+            credentials.expiry = datetime.datetime.utcnow() + datetime.timedelta(
+                hours=1
+            )
+
+        mocked_refresh = mocker.patch.object(
+            Credentials, "refresh", autospec=True, side_effect=refresh
+        )
+        token_cache = MemoryTokenCache()
+        mocker.patch("gmail_wrapper.client.build_service")
+        GmailClient("foo@bar.com", secrets_string, token_cache=token_cache)
+        async_client = AsyncGmailClient(
+            "foo@bar.com",
+            secrets_string,
+            token_cache=token_cache,
+            api_endpoint=fake_server.url,
+        )
+
+        run(async_client.get_labels, async_client)
+        mocked_refresh.assert_called_once()
+        assert async_client.credentials.token == "fresh-token"
+
+    def test_it_lists_and_hydrates_messages(self, async_client, fake_server):
+        async def scenario():
+            messages = await async_client.get_messages(
+                "filename:pdf", limit=5, hydrate=True
+            )
+            return messages, await messages[0].subject
+
+        messages, subject = run(scenario, async_client)
+        assert all([isinstance(message, AsyncMessage) for message in messages])
+        assert subject == "Urgent errand"
+        assert [request[1] for request in fake_server.requests] == [
+            MESSAGES_PATH,
+            f"{MESSAGES_PATH}/123AAB",
+        ]
+        assert fake_server.requests[0][2]["q"] == ["filename:pdf"]
+
+    def test_messages_await_lazy_hydration(self, async_client, fake_server):
+        async def scenario():
+            message = (await async_client.get_messages())[0]
+            return (
+                await message.labels,
+                await message.subject,
+                await message.thread_id,
+            )
+
+        assert run(scenario, async_client) == (
+            ["phishing"],
+            "Urgent errand",
+            "AA121212",
+        )
+        assert len(fake_server.requests) == 2
+
+    def test_it_reads_raw_messages(self, async_client, fake_server, tmp_path):
+        async def scenario():
+            message = AsyncMessage(async_client, {"id": "RAW001"})
+            chunks = [chunk async for chunk in message.iter_raw(chunk_size=16)]
+            written = await message.save_raw_to(str(tmp_path / "message.eml"))
+            return chunks, written, (await message.mime)["Subject"]
+
+        chunks, written, subject = run(scenario, async_client)
+        assert b"".join(chunks) == RFC822_MESSAGE
+        assert written == len(RFC822_MESSAGE)
+        assert (tmp_path / "message.eml").read_bytes() == RFC822_MESSAGE
+        assert subject == "Urgent errand"
+        assert len(fake_server.requests) == 1
+        assert fake_server.requests[0][2]["format"] == ["raw"]
+
+    def test_it_refuses_to_fetch_raw_messages_synchronously(self, async_client):
+        message = AsyncMessage(async_client, {"id": "RAW001"})
+        with pytest.raises(RuntimeError):
+            Message.iter_raw(message)
+
+    def test_it_downloads_attachments(self, async_client):
+        async def scenario():
+            message = await async_client.get_message("123AAB")
+            attachment = (await message.attachments)[0]
+            return attachment, await attachment.content
+
+        attachment, content = run(scenario, async_client)
+        assert isinstance(attachment, AsyncAttachment)
+        assert content == b"The Quick Brown Fox Jumps Over The Lazy Dog"
+
+    def test_it_reads_bodies(self, async_client, fake_server):
+        async def scenario():
+            message = AsyncMessage(async_client, {"id": "ALT001"})
+            body_parts = [part async for part in message.iter_body_parts()]
+            return body_parts, await message.text_body, await message.html_body
+
+        body_parts, text_body, html_body = run(scenario, async_client)
+        assert all([isinstance(part, AsyncBodyPart) for part in body_parts])
+        assert text_body == "The Quick Brown Fox Jumps Over The Lazy Dog"
+        assert html_body == "<p>Hi</p>"
+        assert [request[1] for request in fake_server.requests] == [
+            f"{MESSAGES_PATH}/ALT001",
+            f"{MESSAGES_PATH}/ALT001/attachments/CCX457",
+        ]
+
+    def test_it_compacts_messages(self, async_client, fake_server):
+        async def scenario():
+            message = (await async_client.get_message("123AAB")).compact()
+            return (
+                message,
+                await message.subject,
+                [attachment.filename for attachment in await message.attachments],
+            )
+
+        message, subject, filenames = run(scenario, async_client)
+        assert "payload" not in message._raw
+        assert subject == "Urgent errand"
+        assert filenames == ["fox.txt", "tigers.pdf", "image001.jpg"]
+        assert len(fake_server.requests) == 1
+
+    def test_it_modifies_messages(self, async_client, fake_server):
+        async def scenario():
+            message = await async_client.modify_message(
+                "123AAB", add_labels=["processed"]
+            )
+            return await message.labels
+
+        assert run(scenario, async_client) == ["processed"]
+        assert fake_server.requests[-1][3] == {
+            "addLabelIds": ["processed"],
+            "removeLabelIds": [],
+        }
+
+    def test_it_resolves_label_names(self, async_client, fake_server):
+        async def scenario():
+            await async_client.modify_raw_message(
+                "123AAB", add_labels=["label created by user"], remove_labels=["INBOX"]
+            )
+            await async_client.modify_raw_message(
+                "123AAB", add_labels=["Label created by user"]
+            )
+
+        run(scenario, async_client)
+        paths = [request[1] for request in fake_server.requests]
+        assert paths.count("/gmail/v1/users/foo@bar.com/labels") == 1
+        assert fake_server.requests[1][3] == {
+            "addLabelIds": ["Label_192818"],
+            "removeLabelIds": ["INBOX"],
+        }
+        assert fake_server.requests[-1][3]["addLabelIds"] == ["Label_192818"]
+
+    def test_it_never_lists_labels_synchronously(self, mocker, fake_server):
+        mocked_get_labels = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_labels"
+        )
+        async_client = AsyncGmailClient(
+            "foo@bar.com",
+            AnonymousCredentials(),
+            client_strategy=GmailClient.CREDENTIALS_STRATEGY,
+            api_endpoint=fake_server.url,
+            label_ttl=0,
+        )
+
+        async def scenario():
+            return await async_client.resolve_labels(["Label created by user"])
+
+        assert run(scenario, async_client) == ["Label_192818"]
+        mocked_get_labels.assert_not_called()
+
+    def test_it_replies_messages(self, async_client, fake_server):
+        async def scenario():
+            message = await async_client.get_message("123AAB")
+            return await message.reply("Any content")
+
+        sent_message = run(scenario, async_client)
+        assert sent_message.id == "114ADC"
+        assert fake_server.requests[-1][1] == f"{MESSAGES_PATH}/send"
+        assert fake_server.requests[-1][3]["threadId"] == "AA121212"
+
+    def test_it_returns_labels_and_attachment_bodies(self, async_client):
+        async def scenario():
+            return (
+                await async_client.get_labels(),
+                await async_client.get_attachment_body("CCX457", "123AAB"),
+            )
+
+        labels, attachment_body = run(scenario, async_client)
+        assert all([isinstance(label, Label) for label in labels])
+        assert isinstance(attachment_body, AttachmentBody)
+
+    @pytest.mark.parametrize(
+        "message_id,exception_expected",
+        [("BROKEN", GmailError), ("MISSING", MessageNotFoundError)],
+    )
+    def test_it_encapsulates_gmail_exceptions(
+        self, async_client, message_id, exception_expected
+    ):
+        with pytest.raises(exception_expected):
+            run(lambda: async_client.get_message(message_id), async_client)
+
+    def test_it_coalesces_concurrent_gets_of_a_message(self, async_client, fake_server):
+        async def scenario():
+            messages = [AsyncMessage(async_client, {"id": "123AAB"}) for _ in range(5)]
+            return await asyncio.gather(*[message.subject for message in messages])
+
+        assert run(scenario, async_client) == ["Urgent errand"] * 5
+        assert len(fake_server.requests) == 1
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from gmail_wrapper.attachment_cache import DiskAttachmentCache
+
+
+@pytest.fixture
+def attachment_cache(tmp_path):
+    return DiskAttachmentCache(str(tmp_path / "attachments"), max_size=100)
+
+
+class TestDiskAttachmentCache:
+    def test_it_returns_cached_contents(self, attachment_cache):
+        attachment_cache.set("foo@bar.com", "123AAB", "CCX457", b"The Quick Fox")
+        assert attachment_cache.get("foo@bar.com", "123AAB", "CCX457") == (
+            b"The Quick Fox"
+        )
+        assert attachment_cache.get("foo@bar.com", "123AAB", "CCX458") is None
+
+    def test_it_stores_identical_contents_once(self, attachment_cache):
+        attachment_cache.set("foo@bar.com", "123AAB", "CCX457", b"tigers.pdf")
+        attachment_cache.set("foo@bar.com", "456CCD", "CCX999", b"tigers.pdf")
+        assert len(attachment_cache) == 2
+        assert attachment_cache.size == len(b"tigers.pdf")
+        assert attachment_cache.get("foo@bar.com", "456CCD", "CCX999") == (
+            b"tigers.pdf"
+        )
+
+    def test_it_isolates_mailboxes(self, attachment_cache):
+        attachment_cache.set("foo@bar.com", "123AAB", "CCX457", b"tigers.pdf")
+        assert attachment_cache.get("john@doe.com", "123AAB", "CCX457") is None
+
+    def test_it_evicts_the_least_recently_used_contents(self, attachment_cache):
+        attachment_cache.set("foo@bar.com", "1", "A", b"a" * 40)
+        attachment_cache.set("foo@bar.com", "2", "B", b"b" * 40)
+        attachment_cache.get("foo@bar.com", "1", "A")
+        attachment_cache.set("foo@bar.com", "3", "C", b"c" * 40)
+        assert attachment_cache.get("foo@bar.com", "2", "B") is None
+        assert attachment_cache.get("foo@bar.com", "1", "A") == b"a" * 40
+        assert attachment_cache.get("foo@bar.com", "3", "C") == b"c" * 40
+        assert attachment_cache.size == 80
+
+    def test_it_skips_contents_larger_than_the_cache(self, attachment_cache):
+        attachment_cache.set("foo@bar.com", "1", "A", b"a" * 101)
+        assert attachment_cache.get("foo@bar.com", "1", "A") is None
+
+    def test_it_misses_blobs_removed_from_disk(self, attachment_cache, tmp_path):
+        attachment_cache.set("foo@bar.com", "1", "A", b"a")
+        for directory, _, filenames in os.walk(tmp_path / "attachments" / "blobs"):
+            for filename in filenames:
+                os.unlink(os.path.join(directory, filename))
+        assert attachment_cache.get("foo@bar.com", "1", "A") is None
+        attachment_cache.set("foo@bar.com", "1", "A", b"a")
+        assert attachment_cache.get("foo@bar.com", "1", "A") == b"a"
+
+    def test_it_is_shared_through_the_directory(self, tmp_path):
+        directory = str(tmp_path / "attachments")
+        DiskAttachmentCache(directory).set("foo@bar.com", "1", "A", b"a")
+        assert DiskAttachmentCache(directory).get("foo@bar.com", "1", "A") == b"a"
@@ -1,16 +1,31 @@
 import base64
+import json
+import threading
+import time
 
+import httplib2
 import pytest
+from google.auth.credentials import AnonymousCredentials
 from googleapiclient.errors import HttpError
 
 from gmail_wrapper import GmailClient
-from gmail_wrapper.entities import Message, AttachmentBody, Label
+from gmail_wrapper.attachment_cache import DiskAttachmentCache
+from gmail_wrapper.entities import Message, AttachmentBody, Label, Thread
+from gmail_wrapper.message_store import MemoryMessageStore
+from gmail_wrapper.service import build_service
 from gmail_wrapper.exceptions import (
     MessageNotFoundError,
     AttachmentNotFoundError,
     GmailError, LabelNotFoundError,
+    ThreadNotFoundError,
+    BulkOperationError,
+    HistoryNotFoundError,
+)
+from tests.utils import (
+    make_gmail_client,
+    make_batch_client,
+    patch_single_flight_followers,
 )
-from tests.utils import make_gmail_client
 
 
 class TestGetRawMessages:
@@ -39,6 +54,12 @@ class TestGetRawMessages:
         with pytest.raises(GmailError):
             client.get_raw_messages()
 
+    def test_it_sends_the_fields_mask(self, client):
+        client.get_raw_messages(fields="messages/id")
+        client._messages_resource().list.assert_called_once_with(
+            userId="foo@bar.com", q="", maxResults=None, fields="messages/id"
+        )
+
 
 class TestGetMessages:
     def test_it_returns_a_message_list(self, mocker, client, raw_incomplete_message):
@@ -47,7 +68,7 @@ class TestGetMessages:
             return_value={"messages": [raw_incomplete_message, raw_incomplete_message]},
         )
         messages = client.get_messages(query="filename:pdf", limit=5)
-        mocked_get_raw_messages.assert_called_once_with("filename:pdf", 5)
+        mocked_get_raw_messages.assert_called_once_with("filename:pdf", 5, None, None)
         assert all([isinstance(message, Message) for message in messages])
         assert all([message.id is not None for message in messages])
         assert len(messages) == 2
@@ -81,6 +102,33 @@ class TestGetMessages:
         messages = client.get_messages()
         assert messages == []
 
+    def test_it_projects_listed_messages(self, mocker, client):
+        mocked_get_raw_messages = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            return_value={"messages": [{"id": "123AAB"}]},
+        )
+        messages = client.get_messages(fields=Message.FIELDS_IDS)
+        mocked_get_raw_messages.assert_called_once_with(
+            "", None, None, "nextPageToken,messages(id,threadId)"
+        )
+        assert messages[0].fields == {"id": None, "threadId": None}
+
+    def test_it_projects_hydrated_messages(self, mocker, client):
+        mocked_get_raw_messages = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            return_value={"messages": [{"id": "123AAB"}]},
+        )
+        mocked_get_raw_messages_batch = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages_batch",
+            return_value=[{"id": "123AAB", "labelIds": ["INBOX"]}],
+        )
+        messages = client.get_messages(hydrate=True, fields=Message.FIELDS_ROUTING)
+        mocked_get_raw_messages.assert_called_once_with("", None, None, None)
+        mocked_get_raw_messages_batch.assert_called_once_with(
+            ["123AAB"], None, None, Message.FIELDS_ROUTING
+        )
+        assert messages[0].labels == ["INBOX"]
+
 
 class TestGetMessagesPaginated:
     def test_it_returns_a_message_list(self, mocker, client, raw_incomplete_message):
@@ -94,7 +142,7 @@ class TestGetMessagesPaginated:
         messages, page_token = client.get_messages_paginated(
             query="filename:pdf", limit=5
         )
-        mocked_get_raw_messages.assert_called_once_with("filename:pdf", 5, None)
+        mocked_get_raw_messages.assert_called_once_with("filename:pdf", 5, None, None)
         assert all([isinstance(message, Message) for message in messages])
         assert all([message.id is not None for message in messages])
         assert page_token == "92781kd3"
@@ -164,6 +212,185 @@ class TestGetMessagesPaginated:
         messages, _ = client.get_messages_paginated()
         assert messages == []
 
+    def test_it_doesnt_break_on_the_last_page(self, mocker, client):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            return_value={"messages": [{"id": "123AAB"}]},
+        )
+        messages, page_token = client.get_messages_paginated()
+        assert len(messages) == 1
+        assert page_token is None
+
+
+class TestIterMessages:
+    def test_it_follows_page_tokens(self, mocker, client):
+        mocked_get_raw_messages = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            side_effect=[
+                {"messages": [{"id": "1"}, {"id": "2"}], "nextPageToken": "p2"},
+                {"messages": [{"id": "3"}], "nextPageToken": "p3"},
+                {"messages": [{"id": "4"}]},
+            ],
+        )
+        messages = list(client.iter_messages("filename:pdf", page_size=2))
+        assert all([isinstance(message, Message) for message in messages])
+        assert [message.id for message in messages] == ["1", "2", "3", "4"]
+        assert mocked_get_raw_messages.call_args_list == [
+            mocker.call("filename:pdf", 2, None, None),
+            mocker.call("filename:pdf", 2, "p2", None),
+            mocker.call("filename:pdf", 2, "p3", None),
+        ]
+
+    def test_it_stops_at_max_results(self, mocker, client):
+        mocked_get_raw_messages = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            side_effect=[
+                {"messages": [{"id": "1"}, {"id": "2"}], "nextPageToken": "p2"},
+                {"messages": [{"id": "3"}, {"id": "4"}], "nextPageToken": "p3"},
+            ],
+        )
+        messages = list(client.iter_messages(page_size=2, max_results=3))
+        assert [message.id for message in messages] == ["1", "2", "3"]
+        assert mocked_get_raw_messages.call_args_list == [
+            mocker.call("", 2, None, None),
+            mocker.call("", 1, "p2", None),
+        ]
+
+    def test_it_doesnt_break_when_no_results(self, mocker, client):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            return_value={"resultSizeEstimate": 0},
+        )
+        assert list(client.iter_messages()) == []
+
+    def test_it_fetches_pages_with_its_own_transport(self, mocker):
+        mocked_gmail_client = make_gmail_client(
+            mocker, list_return={"messages": [{"id": "1"}]}
+        )
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=mocked_gmail_client,
+        )
+        client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
+        http = mocker.sentinel.http
+        mocker.patch("gmail_wrapper.client.GmailClient._make_http", return_value=http)
+        assert [message.id for message in client.iter_messages()] == ["1"]
+        execute = mocked_gmail_client().users().messages().list().execute
+        execute.assert_called_once_with(http=http)
+
+
+    def test_it_fetches_pages_with_a_transport_of_the_factory(self):
+        class RecordingHttp:
+            def __init__(self, timeout):
+                self.timeout = timeout
+                self.requests = []
+
+            def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+                self.requests.append(threading.get_ident())
+                content = json.dumps({"messages": [{"id": "1"}]}).encode("utf-8")
+                return httplib2.Response({"status": 200}), content
+
+        transports = []
+
+        def http_factory():
+            transports.append(RecordingHttp(timeout=3))
+            return transports[-1]
+
+        client = GmailClient(
+            "foo@bar.com",
+            AnonymousCredentials(),
+            client_strategy=GmailClient.CREDENTIALS_STRATEGY,
+            http_factory=http_factory,
+        )
+        assert [message.id for message in client.iter_messages()] == ["1"]
+        assert len(transports) == 2
+        assert transports[0].requests == []
+        assert transports[1].timeout == 3
+        assert transports[1].requests[0] != threading.get_ident()
+
+    def test_it_copies_httplib2_transports_for_other_threads(self):
+        http = httplib2.Http(timeout=3)
+        client = GmailClient(
+            "foo@bar.com",
+            AnonymousCredentials(),
+            client_strategy=GmailClient.CREDENTIALS_STRATEGY,
+            http=http,
+        )
+        thread_http = client._make_http().http
+        assert thread_http is not http
+        assert thread_http.timeout == 3
+        assert thread_http.connections is not http.connections
+
+
+class TestMap:
+    def test_it_yields_results_in_order(self, mocker, client):
+        def get_message(id):
+            time.sleep(0.01 * (5 - int(id)))
+            return id
+
+        results = client.map(get_message, ["1", "2", "3", "4"], max_workers=4)
+        assert list(results) == ["1", "2", "3", "4"]
+
+    def test_it_bounds_calls_in_flight(self, client):
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def modify_message(id, add_labels):
+            with lock:
+                in_flight.append(id)
+                peak.append(len(in_flight))
+            time.sleep(0.005)
+            with lock:
+                in_flight.remove(id)
+            return (id, add_labels)
+
+        ids = [str(i) for i in range(40)]
+        results = list(
+            client.map(modify_message, ids, [["processed"]] * 40, max_workers=3)
+        )
+        assert results == [(id, ["processed"]) for id in ids]
+        assert max(peak) <= 3
+
+    def test_it_raises_the_first_error(self, client):
+        def get_message(id):
+            if id == "2":
+                raise MessageNotFoundError(id)
+            return id
+
+        results = client.map(get_message, ["1", "2", "3"])
+        assert next(results) == "1"
+        with pytest.raises(MessageNotFoundError):
+            next(results)
+
+    def test_each_thread_executes_with_its_own_transport(self, mocker):
+        mocked_gmail_client = make_gmail_client(mocker, get_return={"id": "1"})
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=mocked_gmail_client,
+        )
+        client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_http",
+            side_effect=lambda: mocker.MagicMock(),
+        )
+        list(client.map(client.get_raw_message, ["1", "2", "3"], max_workers=3))
+        client.get_raw_message("4")
+        execute = mocked_gmail_client().users().messages().get().execute
+        transports = [call[1].get("http") for call in execute.call_args_list]
+        assert transports[-1] is None
+        assert all(transport is not None for transport in transports[:-1])
+
+    def test_threads_share_the_pooled_connections(self, mocker):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=lambda *args: build_service(AnonymousCredentials()),
+        )
+        client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
+        http = client._make_http()
+        assert http is not client._client._http
+        assert http.http is client._client._http.http
+
 
 class TestGetRawMessage:
     def test_it_returns_a_raw_message(self, mocker, raw_complete_message):
@@ -174,6 +401,35 @@ class TestGetRawMessage:
         client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
         message = client.get_raw_message("123AAB")
         assert message == raw_complete_message
+        client._messages_resource().get.assert_called_once_with(
+            userId="foo@bar.com", id="123AAB"
+        )
+
+    def test_it_sends_the_fields_mask(self, client):
+        client.get_raw_message("123AAB", fields=Message.FIELDS_ROUTING)
+        client._messages_resource().get.assert_called_once_with(
+            userId="foo@bar.com", id="123AAB", fields="id,threadId,labelIds"
+        )
+
+    def test_it_requests_the_given_format_and_headers(
+        self, mocker, raw_complete_message
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=make_gmail_client(mocker, get_return=raw_complete_message),
+        )
+        client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
+        client.get_raw_message(
+            "123AAB",
+            format=GmailClient.FORMAT_METADATA,
+            metadata_headers=["Subject", "From"],
+        )
+        client._messages_resource().get.assert_called_once_with(
+            userId="foo@bar.com",
+            id="123AAB",
+            format="metadata",
+            metadataHeaders=["Subject", "From"],
+        )
 
     @pytest.mark.parametrize(
         "error_code,exception_expected",
@@ -194,6 +450,171 @@ class TestGetRawMessage:
         with pytest.raises(exception_expected):
             client.get_raw_message("123AAB")
 
+    def test_it_coalesces_concurrent_gets_of_a_message(
+        self, mocker, client, raw_complete_message
+    ):
+        following = patch_single_flight_followers(mocker)
+        entered = threading.Event()
+        release = threading.Event()
+
+        def execute(executable):
+            entered.set()
+            release.wait()
+            return raw_complete_message
+
+        mocked_execute = mocker.patch(
+            "gmail_wrapper.client.GmailClient._execute", side_effect=execute
+        )
+        messages = [Message(client, {"id": "123AAB"}) for _ in range(4)]
+        subjects = []
+        threads = [
+            threading.Thread(target=lambda m=message: subjects.append(m.subject))
+            for message in messages
+        ]
+        for thread in threads:
+            thread.start()
+        assert entered.wait(5)
+        for _ in range(3):
+            assert following.acquire(timeout=5)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert subjects == ["Urgent errand"] * 4
+        mocked_execute.assert_called_once()
+
+    def test_it_stores_full_messages_and_revalidates_their_labels(
+        self, mocker, raw_complete_message
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=make_gmail_client(mocker, get_return=raw_complete_message),
+        )
+        client = GmailClient(
+            email="foo@bar.com",
+            secrets_json_string="{}",
+            message_store=MemoryMessageStore(),
+        )
+        client.get_raw_message("123AAB")
+        mocked_get_raw_history = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            return_value={
+                "history": [
+                    {
+                        "id": "120",
+                        "labelsAdded": [
+                            {"message": {"id": "123AAB"}, "labelIds": ["phishing"]}
+                        ],
+                    },
+                    {
+                        "id": "124",
+                        "labelsAdded": [
+                            {"message": {"id": "123AAB"}, "labelIds": ["INBOX"]}
+                        ],
+                    },
+                    {
+                        "id": "125",
+                        "labelsRemoved": [
+                            {"message": {"id": "123AAB"}, "labelIds": ["phishing"]},
+                            {"message": {"id": "456CCD"}, "labelIds": ["INBOX"]},
+                        ],
+                    },
+                ],
+                "historyId": "126",
+            },
+        )
+        raw_message = client.get_raw_message(
+            "123AAB", format=GmailClient.FORMAT_METADATA
+        )
+        assert raw_message["payload"] == raw_complete_message["payload"]
+        assert raw_message["labelIds"] == ["INBOX"]
+        assert client.message_store.get("foo@bar.com", "123AAB")["historyId"] == "126"
+        client._messages_resource().get().execute.assert_called_once()
+        mocked_get_raw_history.assert_called_once_with(
+            "123",
+            history_types=GmailClient.HISTORY_TYPES_REVALIDATE,
+            limit=500,
+        )
+
+    def test_it_revalidates_with_a_minimal_get_without_history(
+        self, mocker, raw_complete_message
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=make_gmail_client(mocker, get_return=raw_complete_message),
+        )
+        client = GmailClient(
+            email="foo@bar.com",
+            secrets_json_string="{}",
+            message_store=MemoryMessageStore(),
+        )
+        client.get_raw_message("123AAB")
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            side_effect=HistoryNotFoundError("123"),
+        )
+        client._messages_resource().get().execute.return_value = {
+            "id": "123AAB",
+            "labelIds": ["INBOX"],
+            "historyId": 124,
+        }
+        raw_message = client.get_raw_message("123AAB")
+        assert raw_message["labelIds"] == ["INBOX"]
+        assert client.message_store.get("foo@bar.com", "123AAB")["historyId"] == 124
+        client._messages_resource().get.assert_called_with(
+            userId="foo@bar.com",
+            id="123AAB",
+            format="minimal",
+            fields=GmailClient.FIELDS_REVALIDATE,
+        )
+
+    def test_it_revalidates_with_a_minimal_get_when_history_is_long(
+        self, mocker, client, raw_complete_message
+    ):
+        client.message_store = MemoryMessageStore()
+        client.message_store.set("foo@bar.com", "123AAB", raw_complete_message)
+        mocked_get_raw_history = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            return_value={"history": [], "nextPageToken": "next"},
+        )
+        mocked_fetch_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient._fetch_raw_message",
+            return_value={"id": "123AAB", "labelIds": [], "historyId": 123},
+        )
+        assert client.get_raw_message("123AAB")["labelIds"] == []
+        mocked_get_raw_history.assert_called_once()
+        mocked_fetch_raw_message.assert_called_once()
+
+    def test_it_does_not_store_unchanged_messages_again(
+        self, mocker, client, raw_complete_message
+    ):
+        client.message_store = MemoryMessageStore()
+        client.message_store.set("foo@bar.com", "123AAB", raw_complete_message)
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            return_value={
+                "history": [
+                    {
+                        "id": "124",
+                        "labelsRemoved": [
+                            {"message": {"id": "123AAB"}, "labelIds": ["INBOX"]}
+                        ],
+                    }
+                ],
+                "historyId": "124",
+            },
+        )
+        mocked_set = mocker.spy(client.message_store, "set")
+        assert client.get_raw_message("123AAB")["labelIds"] == ["phishing"]
+        mocked_set.assert_not_called()
+        stored = client.message_store.get("foo@bar.com", "123AAB")
+        assert stored["historyId"] == raw_complete_message["historyId"]
+
+    def test_it_does_not_store_projected_messages(self, client):
+        client.message_store = MemoryMessageStore()
+        client.get_raw_message("123AAB", fields=Message.FIELDS_ROUTING)
+        assert client.message_store.get("foo@bar.com", "123AAB") is None
+
 
 class TestGetMessage:
     def test_it_returns_a_message(self, mocker, client, raw_complete_message):
@@ -202,9 +623,161 @@ class TestGetMessage:
             return_value=raw_complete_message,
         )
         message = client.get_message("123AAB")
-        mocked_get_raw_message.assert_called_once_with("123AAB")
+        mocked_get_raw_message.assert_called_once_with("123AAB", None, None, None)
         assert isinstance(message, Message)
         assert message.id == raw_complete_message["id"]
+        assert message.format == GmailClient.FORMAT_FULL
+
+    def test_it_returns_a_message_in_the_requested_format(self, mocker, client):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value={"id": "123AAB", "labelIds": ["INBOX"]},
+        )
+        message = client.get_message("123AAB", format=GmailClient.FORMAT_MINIMAL)
+        mocked_get_raw_message.assert_called_once_with("123AAB", "minimal", None, None)
+        assert message.format == GmailClient.FORMAT_MINIMAL
+        assert message.labels == ["INBOX"]
+
+
+class TestGetRawMessagesBatch:
+    def test_it_returns_raw_messages_in_order(self, mocker, client):
+        responses = {str(i): {"id": str(i), "payload": {}} for i in range(3)}
+        batches = make_batch_client(mocker, client, responses)
+        raw_messages = client.get_raw_messages_batch(["2", "0", "1", "0"])
+        assert [raw_message["id"] for raw_message in raw_messages] == [
+            "2",
+            "0",
+            "1",
+            "0",
+        ]
+        assert len(batches) == 1
+        assert batches[0].request_ids == ["2", "0", "1"]
+
+    def test_it_splits_ids_into_batches_of_max_size(self, mocker, client):
+        responses = {str(i): {"id": str(i)} for i in range(250)}
+        batches = make_batch_client(mocker, client, responses)
+        raw_messages = client.get_raw_messages_batch(responses.keys())
+        assert len(raw_messages) == 250
+        assert [len(batch.request_ids) for batch in batches] == [100, 100, 50]
+
+    @pytest.mark.parametrize(
+        "error_code,exception_expected",
+        [(500, GmailError), (404, MessageNotFoundError), (403, HttpError)],
+    )
+    def test_it_encapsulates_gmail_exceptions(
+        self, mocker, client, error_code, exception_expected
+    ):
+        error_response = mocker.MagicMock(status=error_code)
+        responses = {
+            "123AAB": {"id": "123AAB"},
+            "456CCD": HttpError(error_response, b"Content"),
+        }
+        make_batch_client(mocker, client, responses)
+        with pytest.raises(exception_expected):
+            client.get_raw_messages_batch(["123AAB", "456CCD"])
+
+    def test_it_serves_stored_messages_revalidating_labels_from_history(
+        self, mocker, client, raw_complete_message
+    ):
+        client.message_store = MemoryMessageStore()
+        client.message_store.set("foo@bar.com", "123AAB", raw_complete_message)
+        client.message_store.set(
+            "foo@bar.com", "789EEF", {**raw_complete_message, "id": "789EEF"}
+        )
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            return_value={
+                "history": [
+                    {
+                        "id": "124",
+                        "labelsAdded": [
+                            {"message": {"id": "123AAB"}, "labelIds": ["INBOX"]}
+                        ],
+                        "messagesDeleted": [{"message": {"id": "789EEF"}}],
+                    }
+                ],
+                "historyId": "124",
+            },
+        )
+        responses = {
+            "456CCD": {"id": "456CCD", "payload": {}},
+            "789EEF": HttpError(mocker.MagicMock(status=404), b"Not found"),
+        }
+        batches = make_batch_client(mocker, client, responses)
+        raw_messages = client.get_raw_messages_batch(["123AAB", "456CCD"])
+        assert raw_messages[0]["payload"] == raw_complete_message["payload"]
+        assert raw_messages[0]["labelIds"] == ["phishing", "INBOX"]
+        assert [batch.request_ids for batch in batches] == [["456CCD"]]
+        assert client.message_store.get("foo@bar.com", "456CCD") == responses["456CCD"]
+        with pytest.raises(MessageNotFoundError):
+            client.get_raw_messages_batch(["789EEF"])
+        assert client.message_store.get("foo@bar.com", "789EEF") is None
+
+
+class TestHydrateMessages:
+    def test_get_messages_hydrates_messages_in_a_single_batch(
+        self, mocker, client, raw_complete_message
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            return_value={"messages": [{"id": "123AAB", "threadId": "AA121212"}]},
+        )
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message"
+        )
+        batches = make_batch_client(mocker, client, {"123AAB": raw_complete_message})
+        messages = client.get_messages(hydrate=True)
+        assert len(batches) == 1
+        assert messages[0].subject == "Urgent errand"
+        assert messages[0].labels == ["phishing"]
+        mocked_get_raw_message.assert_not_called()
+
+    def test_it_does_not_downgrade_full_messages(
+        self, mocker, client, raw_complete_message
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages_batch",
+            return_value=[{"id": "123AAB", "payload": {"headers": []}}],
+        )
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message"
+        )
+        message = Message(client, raw_complete_message)
+        client.hydrate_messages([message], format=GmailClient.FORMAT_METADATA)
+        assert len(message.attachments) == 3
+        assert message.subject == "Urgent errand"
+        mocked_get_raw_message.assert_not_called()
+
+    def test_it_hydrates_messages_in_the_requested_format(self, mocker, client):
+        mocked_get_raw_messages_batch = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages_batch",
+            return_value=[{"id": "123AAB", "labelIds": ["INBOX"]}],
+        )
+        messages = client.hydrate_messages(
+            [Message(client, {"id": "123AAB"})],
+            format=GmailClient.FORMAT_METADATA,
+            metadata_headers=["Subject"],
+        )
+        mocked_get_raw_messages_batch.assert_called_once_with(
+            ["123AAB"], "metadata", ["Subject"], None
+        )
+        assert messages[0].format == GmailClient.FORMAT_METADATA
+        assert messages[0].labels == ["INBOX"]
+
+    def test_get_messages_paginated_hydrates_messages(
+        self, mocker, client, raw_complete_message
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_messages",
+            return_value={
+                "messages": [{"id": "123AAB", "threadId": "AA121212"}],
+                "nextPageToken": "92781kd3",
+            },
+        )
+        make_batch_client(mocker, client, {"123AAB": raw_complete_message})
+        messages, page_token = client.get_messages_paginated(hydrate=True)
+        assert messages[0].subject == "Urgent errand"
+        assert page_token == "92781kd3"
 
 
 class TestGetRawAttachmentBody:
@@ -248,10 +821,139 @@ class TestGetAttachmentBody:
             return_value=raw_attachment_body,
         )
         attachment_body = client.get_attachment_body(id="CCX457", message_id="123AAB")
-        mocked_get_raw_attachment_body.assert_called_once_with("CCX457", "123AAB")
+        mocked_get_raw_attachment_body.assert_called_once_with("CCX457", "123AAB", None)
         assert isinstance(attachment_body, AttachmentBody)
         assert attachment_body.id == raw_attachment_body["attachmentId"]
 
+    def test_it_serves_cached_attachment_bodies(
+        self, mocker, client, tmp_path, raw_attachment_body
+    ):
+        client.attachment_cache = DiskAttachmentCache(str(tmp_path / "attachments"))
+        mocked_get_raw_attachment_body = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_attachment_body",
+            return_value=raw_attachment_body,
+        )
+        first_body = client.get_attachment_body(id="CCX457", message_id="123AAB")
+        second_body = client.get_attachment_body(id="CCX457", message_id="123AAB")
+        mocked_get_raw_attachment_body.assert_called_once_with("CCX457", "123AAB", None)
+        assert second_body.id == "CCX457"
+        assert second_body.content == first_body.content
+        assert second_body.decoded_size == len(first_body.content)
+
+    def test_it_fetches_fields_left_out_of_the_mask(
+        self, mocker, client, raw_attachment_body
+    ):
+        mocked_get_raw_attachment_body = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_attachment_body",
+            side_effect=[{"size": 1024}, raw_attachment_body],
+        )
+        attachment_body = client.get_attachment_body(
+            id="CCX457", message_id="123AAB", fields="size"
+        )
+        assert attachment_body.size == 1024
+        assert attachment_body.id == "CCX457"
+        assert attachment_body.has_data
+        assert attachment_body.content == base64.urlsafe_b64decode(
+            raw_attachment_body["data"].encode("UTF-8")
+        )
+        assert mocked_get_raw_attachment_body.call_args_list == [
+            mocker.call("CCX457", "123AAB", "size"),
+            mocker.call("CCX457", "123AAB"),
+        ]
+
+
+class TestGetThread:
+    def test_it_returns_a_thread_with_its_messages(self, mocker, raw_complete_thread):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=make_gmail_client(
+                mocker, get_return=raw_complete_thread, method="threads"
+            ),
+        )
+        client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
+        thread = client.get_thread("AA121212")
+        assert isinstance(thread, Thread)
+        assert [message.id for message in thread.messages] == ["123AAB", "123AAC"]
+        assert thread.messages[0].subject == "Urgent errand"
+        assert thread.last_message.reply_to == "foo+reply@loadsmart.com"
+        client._threads_resource().get.assert_called_once_with(
+            userId="foo@bar.com", id="AA121212"
+        )
+
+    def test_it_wraps_message_fields_into_the_thread_mask(self, client):
+        client.get_thread(
+            "AA121212",
+            format=GmailClient.FORMAT_METADATA,
+            fields=Message.FIELDS_ROUTING,
+        )
+        client._threads_resource().get.assert_called_once_with(
+            userId="foo@bar.com",
+            id="AA121212",
+            format="metadata",
+            fields="id,historyId,messages(id,threadId,labelIds)",
+        )
+
+    def test_it_raises_when_the_thread_does_not_exist(self, mocker):
+        error_response = mocker.MagicMock(status=404)
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=make_gmail_client(
+                mocker,
+                get_effect=HttpError(error_response, b"Content"),
+                method="threads",
+            ),
+        )
+        client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
+        with pytest.raises(ThreadNotFoundError):
+            client.get_thread("AA121212")
+
+
+class TestGetThreads:
+    def test_it_returns_threads_hydrated_in_one_batch(
+        self, mocker, client, raw_complete_thread
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_threads",
+            return_value={"threads": [{"id": "AA121212", "snippet": "I am Dr."}]},
+        )
+        batches = make_batch_client(mocker, client, {"AA121212": raw_complete_thread})
+        threads = client.get_threads("label:inbox", hydrate=True)
+        assert [thread.snippet for thread in threads] == ["I am Dr."]
+        assert len(threads[0].messages) == 2
+        assert [batch.request_ids for batch in batches] == [["AA121212"]]
+
+    def test_it_fetches_messages_of_listed_threads_when_needed(
+        self, mocker, client, raw_complete_thread
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_threads",
+            return_value={"threads": [{"id": "AA121212"}]},
+        )
+        mocked_get_raw_thread = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_thread",
+            return_value=raw_complete_thread,
+        )
+        thread = client.get_threads()[0]
+        mocked_get_raw_thread.assert_not_called()
+        assert thread.last_message.id == "123AAC"
+        assert thread.messages[0].id == "123AAB"
+        mocked_get_raw_thread.assert_called_once_with("AA121212", None, None)
+
+    def test_it_iterates_over_thread_pages(self, mocker, client):
+        mocked_get_raw_threads = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_threads",
+            side_effect=[
+                {"threads": [{"id": "1"}, {"id": "2"}], "nextPageToken": "p2"},
+                {"threads": [{"id": "3"}]},
+            ],
+        )
+        threads = list(client.iter_threads("label:inbox", page_size=2))
+        assert [thread.id for thread in threads] == ["1", "2", "3"]
+        assert mocked_get_raw_threads.call_args_list == [
+            mocker.call("label:inbox", 2, None),
+            mocker.call("label:inbox", 2, "p2"),
+        ]
+
 
 class TestModifyRawMessage:
     def test_it_modifies_and_return_a_raw_message(self, mocker, raw_complete_message):
@@ -331,6 +1033,107 @@ class TestModifyMultipleMessages:
         )
 
 
+    def test_it_chunks_streamed_messages_to_the_api_limit(self, client):
+        messages = (Message(client, {"id": str(i)}) for i in range(2500))
+        results = client.modify_multiple_messages(messages, ["processed"])
+        assert [len(result.ids) for result in results] == [1000, 1000, 500]
+        assert all(result.ok for result in results)
+        batch_modify = client._messages_resource().batchModify
+        assert batch_modify.call_count == 3
+        sent_ids = [call[1]["body"]["ids"] for call in batch_modify.call_args_list]
+        assert sorted(id for ids in sent_ids for id in ids) == sorted(
+            str(i) for i in range(2500)
+        )
+
+    def test_it_retries_only_failed_chunks(self, mocker, client):
+        calls = []
+
+        def execute(executable, units=None):
+            calls.append(executable)
+            if len(calls) == 1:
+                raise GmailError()
+
+        mocker.patch("gmail_wrapper.client.GmailClient._execute", side_effect=execute)
+        results = client.modify_multiple_messages(
+            [str(i) for i in range(1500)], ["Label_123"], max_workers=1
+        )
+        assert len(calls) == 3
+        assert [result.attempts for result in results] == [2, 1]
+        assert all(result.ok for result in results)
+
+    def test_it_reports_chunks_that_keep_failing(self, mocker, client):
+        error = HttpError(mocker.MagicMock(status=400), b"Content")
+
+        def execute(executable, units=None):
+            if executable.ids[0] == "1000":
+                raise error
+
+        def batch_modify(userId, body):
+            return mocker.MagicMock(ids=body["ids"])
+
+        client._messages_resource().batchModify.side_effect = batch_modify
+        mocker.patch("gmail_wrapper.client.GmailClient._execute", side_effect=execute)
+        with pytest.raises(BulkOperationError) as error_info:
+            client.modify_multiple_messages([str(i) for i in range(1500)])
+        assert [result.ok for result in error_info.value.results] == [True, False]
+        assert error_info.value.failed[0].error is error
+        assert error_info.value.failed[0].attempts == 1
+        assert error_info.value.failed_ids == [str(i) for i in range(1000, 1500)]
+        assert isinstance(error_info.value, GmailError)
+
+    def test_it_does_not_wrap_programming_errors(self, mocker, client):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._execute", side_effect=TypeError
+        )
+        with pytest.raises(TypeError):
+            client.modify_multiple_messages(["1", "2"])
+
+
+class TestDeleteMultipleMessages:
+    def test_it_deletes_messages_in_chunks(self, client):
+        results = client.delete_multiple_messages(str(i) for i in range(1200))
+        assert [len(result.ids) for result in results] == [1000, 200]
+        assert client._messages_resource().batchDelete.call_count == 2
+
+    def test_it_does_nothing_without_messages(self, client):
+        assert client.delete_multiple_messages([]) == []
+        client._messages_resource().batchDelete.assert_not_called()
+
+
+class TestTrashMultipleMessages:
+    def test_it_trashes_messages_through_batches(self, mocker, client):
+        responses = {str(i): {"id": str(i), "labelIds": ["TRASH"]} for i in range(150)}
+        batches = make_batch_client(mocker, client, responses)
+        results = client.trash_multiple_messages(responses.keys())
+        assert [len(result.ids) for result in results] == [100, 50]
+        assert sorted(len(batch.request_ids) for batch in batches) == [50, 100]
+        client._messages_resource().trash.assert_any_call(userId="foo@bar.com", id="0")
+
+    def test_it_reports_only_the_messages_that_failed(self, mocker, client):
+        responses = {str(i): {"id": str(i), "labelIds": ["TRASH"]} for i in range(5)}
+        responses["1"] = HttpError(mocker.MagicMock(status=404), b"Not found")
+        responses["3"] = HttpError(mocker.MagicMock(status=500), b"Error")
+        batches = make_batch_client(mocker, client, responses)
+        with pytest.raises(BulkOperationError) as error_info:
+            client.trash_multiple_messages(responses.keys())
+        assert [result.ids for result in error_info.value.results] == [
+            ["0", "2", "4"],
+            ["3"],
+            ["1"],
+        ]
+        assert error_info.value.failed_ids == ["3", "1"]
+        assert isinstance(error_info.value.failed[0].error, GmailError)
+        assert error_info.value.failed[0].attempts == 2
+        assert isinstance(
+            error_info.value.failed[1].errors["1"], MessageNotFoundError
+        )
+        assert [batch.request_ids for batch in batches] == [
+            ["0", "1", "2", "3", "4"],
+            ["3"],
+        ]
+        assert "leaving 2 messages untouched" in str(error_info.value)
+
+
 class TestSendRaw:
     def test_it_creates_a_proper_sendable_message(self, client):
         subject = "Hi there!"
@@ -397,6 +1200,77 @@ class TestSend:
         assert sent_message.id == raw_complete_message["id"]
 
 
+class TestLabelsByName:
+    @pytest.fixture(autouse=True)
+    def mocked_get_labels(self, mocker):
+        return mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_labels",
+            return_value=[
+                Label({"id": "INBOX", "name": "INBOX", "type": "system"}),
+                Label({"id": "Label_1", "name": "processed", "type": "user"}),
+            ],
+        )
+
+    def test_it_resolves_names_to_ids(self, client, mocked_get_labels):
+        assert client.resolve_labels(["processed", "INBOX", "Label_9"]) == [
+            "Label_1",
+            "INBOX",
+            "Label_9",
+        ]
+        assert client.resolve_labels(["Processed"]) == ["Label_1"]
+        mocked_get_labels.assert_called_once_with()
+
+    def test_it_raises_on_unknown_names(self, client):
+        with pytest.raises(LabelNotFoundError):
+            client.resolve_labels(["unknown"])
+        assert client.resolve_labels(["unknown"], strict=False) == ["unknown"]
+
+    def test_it_modifies_messages_with_label_names(self, client):
+        client.modify_raw_message("123AAB", add_labels=["processed"])
+        client.modify_multiple_messages(["123AAB"], remove_labels=["processed"])
+        client._messages_resource().modify.assert_called_once_with(
+            userId="foo@bar.com",
+            id="123AAB",
+            body={"addLabelIds": ["Label_1"], "removeLabelIds": []},
+        )
+        client._messages_resource().batchModify.assert_called_once_with(
+            userId="foo@bar.com",
+            body={"ids": ["123AAB"], "addLabelIds": [], "removeLabelIds": ["Label_1"]},
+        )
+
+    def test_it_creates_missing_labels_in_one_batch(self, mocker, client):
+        batches = make_batch_client(
+            mocker,
+            client,
+            {
+                "0": {"id": "Label_2", "name": "archived"},
+                "1": {"id": "Label_3", "name": "reviewed"},
+            },
+        )
+        labels = client.ensure_labels(["processed", "archived", "reviewed"])
+        assert [label.id for label in labels] == ["Label_1", "Label_2", "Label_3"]
+        assert [batch.request_ids for batch in batches] == [["0", "1"]]
+        client._labels_resource().create.assert_any_call(
+            userId="foo@bar.com", body={"name": "archived"}
+        )
+        assert client.resolve_labels(["reviewed"]) == ["Label_3"]
+
+    def test_it_updates_the_index_on_create_and_delete(self, mocker, client):
+        client._labels_resource().create().execute.return_value = {
+            "id": "Label_2",
+            "name": "archived",
+        }
+        assert client.resolve_labels(["processed"]) == ["Label_1"]
+        assert client.create_label("archived").id == "Label_2"
+        assert client.resolve_labels(["archived"]) == ["Label_2"]
+        client.delete_label("Label_2")
+        client._labels_resource().delete.assert_called_once_with(
+            userId="foo@bar.com", id="Label_2"
+        )
+        with pytest.raises(LabelNotFoundError):
+            client.resolve_labels(["archived"])
+
+
 class TestGetRawLabels:
     def test_it_returns_raw_labels(self, mocker, list_label_payload):
         mocked_gmail_client = make_gmail_client(
@@ -411,6 +1285,19 @@ class TestGetRawLabels:
         list_call_args = mocked_gmail_client().users().labels().list.call_args[1]
         assert list_call_args == {"userId": "foo@bar.com"}
 
+    def test_get_labels_projects_listed_labels(self, mocker):
+        mocked_gmail_client = make_gmail_client(
+            mocker, list_return={"labels": []}, method="labels"
+        )
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=mocked_gmail_client,
+        )
+        client = GmailClient(email="foo@bar.com", secrets_json_string="{}")
+        client.get_labels(fields=Label.FIELDS_IDS)
+        list_call_args = mocked_gmail_client().users().labels().list.call_args[1]
+        assert list_call_args == {"userId": "foo@bar.com", "fields": "labels(id,name)"}
+
     def test_it_encapsulates_gmail_exceptions(self, mocker):
         server_error_response = mocker.MagicMock(status=500)
         mocker.patch(
@@ -474,11 +1361,29 @@ class TestGetLabels:
 
         labels = client.get_labels()
 
-        mocked_get_raw_labels.assert_called_once_with()
+        mocked_get_raw_labels.assert_called_once_with(None)
         assert all([isinstance(label, Label) for label in labels])
         assert all([label.id is not None for label in labels])
         assert len(labels) == 2
 
+    def test_it_fetches_fields_left_out_of_the_mask(self, mocker, client):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_labels",
+            return_value={"labels": [{"id": "Label_1", "name": "processed"}]},
+        )
+        mocked_get_raw_label = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_label",
+            return_value={"id": "Label_1", "name": "processed", "type": "user"},
+        )
+
+        label = client.get_labels(fields=Label.FIELDS_IDS)[0]
+
+        assert label.name == "processed"
+        mocked_get_raw_label.assert_not_called()
+        assert label.type == "user"
+        assert label.type == "user"
+        mocked_get_raw_label.assert_called_once_with("Label_1")
+
 
 class TestGetLabel:
     def test_get_label(self, mocker, client, get_label_payload):
@@ -491,6 +1396,6 @@ class TestGetLabel:
 
         label = client.get_label(label_id)
 
-        mocked_get_raw_label.assert_called_once_with(label_id)
+        mocked_get_raw_label.assert_called_once_with(label_id, None)
         assert isinstance(label, Label)
         assert label.id == label_id
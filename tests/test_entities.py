@@ -1,6 +1,17 @@
+import base64
 import datetime
+import io
+from email.message import EmailMessage
 
-from gmail_wrapper.entities import Message, Attachment, AttachmentBody, Label
+import pytest
+
+from gmail_wrapper.entities import (
+    Message,
+    Attachment,
+    AttachmentBody,
+    Label,
+    Thread,
+)
 
 
 class TestMessage:
@@ -36,6 +47,134 @@ class TestMessage:
         )
         mocked_get_raw_message.assert_called_once_with(raw_incomplete_message["id"])
 
+    def test_it_upgrades_to_the_format_a_property_needs(
+        self, mocker, client, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        minimal_message = Message(
+            client, {"id": "123AAB", "labelIds": []}, format="minimal"
+        )
+        assert minimal_message.labels == []
+        mocked_get_raw_message.assert_not_called()
+        assert minimal_message.subject == "Urgent errand"
+        mocked_get_raw_message.assert_called_once_with(
+            "123AAB", format="metadata", metadata_headers=None
+        )
+        assert minimal_message.format == "metadata"
+        assert len(minimal_message.attachments) == 3
+        mocked_get_raw_message.assert_called_with("123AAB")
+        assert minimal_message.format == "full"
+
+    def test_it_upgrades_messages_of_a_guessed_format_once(
+        self, mocker, client, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        sent_message = Message(
+            client, {"id": "123AAB", "threadId": "AA121212", "labelIds": ["SENT"]}
+        )
+        assert sent_message.labels == ["SENT"]
+        assert sent_message.subject == "Urgent errand"
+        assert len(sent_message.attachments) == 3
+        assert sent_message.message_id
+        mocked_get_raw_message.assert_called_once_with("123AAB")
+        assert sent_message.format == "full"
+
+    def test_it_keeps_a_richer_payload_on_poorer_updates(
+        self, mocker, client, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message"
+        )
+        message = Message(client, raw_complete_message)
+        message._update(
+            {
+                "id": "123AAB",
+                "sizeEstimate": 361,
+                "payload": {"headers": [{"name": "Subject", "value": "Other"}]},
+            },
+            "metadata",
+        )
+        assert message.format == "full"
+        assert message.subject == "Urgent errand"
+        assert len(message.attachments) == 3
+        mocked_get_raw_message.assert_not_called()
+
+    def test_it_fetches_headers_left_out_of_metadata_headers(
+        self, mocker, client, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        raw_message = {
+            "id": "123AAB",
+            "payload": {"headers": [{"name": "Subject", "value": "Urgent errand"}]},
+        }
+        message = Message(
+            client, raw_message, format="metadata", metadata_headers=["Subject"]
+        )
+        assert message.subject == "Urgent errand"
+        mocked_get_raw_message.assert_not_called()
+        assert message.from_address == "john@doe.com"
+        mocked_get_raw_message.assert_called_once_with(
+            "123AAB", format="metadata", metadata_headers=None
+        )
+
+    def test_it_fetches_fields_left_out_of_the_projection(
+        self, mocker, client, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        message = Message(
+            client,
+            {"id": "123AAB", "threadId": "AA121212", "labelIds": []},
+            fields=Message.FIELDS_ROUTING,
+        )
+        assert message.labels == []
+        assert message.thread_id == "AA121212"
+        mocked_get_raw_message.assert_not_called()
+        assert message.date == datetime.datetime(1970, 1, 19, 3, 6, 38, 665000)
+        mocked_get_raw_message.assert_called_once_with(
+            "123AAB", format="minimal", metadata_headers=None
+        )
+        assert message.fields is None
+
+    def test_it_finds_attachments_with_the_attachments_projection(
+        self, mocker, client, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        raw_complete_message["payload"]["parts"][1]["body"].pop("data")
+        message = Message(
+            client, raw_complete_message, fields=Message.FIELDS_ATTACHMENTS
+        )
+        assert len(message.attachments) == 3
+        assert message.subject == "Urgent errand"
+        mocked_get_raw_message.assert_not_called()
+        assert message.labels == ["phishing"]
+        mocked_get_raw_message.assert_not_called()
+
+    def test_it_parses_fields_masks(self, client):
+        message = Message(
+            client,
+            {"id": "123AAB"},
+            fields="id,payload(headers,body/size),payload/parts",
+        )
+        assert message.fields == {
+            "id": None,
+            "payload": {"headers": None, "body": {"size": None}, "parts": None},
+        }
+
     def test_it_return_none_if_no_subject_header(self, client, raw_complete_message):
         del raw_complete_message["payload"]["headers"][2]
         message = Message(client, raw_complete_message)
@@ -95,6 +234,225 @@ class TestMessage:
         complete_message = Message(client, raw_complete_message)
         assert complete_message.attachments == []
 
+    def test_it_indexes_the_part_tree_once(self, client, raw_complete_message):
+        message = Message(client, raw_complete_message)
+        parts = message.parts
+        assert parts is message.parts
+        assert [part["partId"] for part in parts] == [
+            "BB789",
+            "BB789",
+            "BB790",
+            "BB791",
+            "BB791.0",
+            "BB791.1",
+            "BB791.2",
+        ]
+        assert parts["BB791.1"]["filename"] == "tigers.pdf"
+        assert parts.get("missing") is None
+        assert parts.html_part["partId"] == "BB791.0"
+        assert [image.filename for image in message.inline_images] == ["image001.jpg"]
+
+    def test_it_memoizes_attachments(self, client, raw_complete_message):
+        message = Message(client, raw_complete_message)
+        attachments = message.attachments
+        assert [a.id for a in message.iter_attachments()] == [a.id for a in attachments]
+        assert all(
+            first is second for first, second in zip(attachments, message.attachments)
+        )
+
+    def test_it_memoizes_inline_images(self, client, raw_complete_message):
+        message = Message(client, raw_complete_message)
+        inline_images = message.inline_images
+        assert inline_images[0] is message.inline_images[0]
+        assert inline_images[0] is message.attachments[2]
+
+    def test_it_walks_deeply_nested_parts(self, client):
+        payload = {"partId": "", "mimeType": "multipart/mixed", "parts": []}
+        part = payload
+        for depth in range(5000):
+            nested = {"partId": str(depth), "mimeType": "multipart/mixed"}
+            part["parts"] = [nested]
+            part = nested
+        part["parts"] = [
+            {
+                "partId": "leaf",
+                "filename": "deep.pdf",
+                "body": {"attachmentId": "CCX999", "size": 1},
+            }
+        ]
+        message = Message(client, {"id": "123AAB", "payload": payload})
+        assert [attachment.id for attachment in message.attachments] == ["CCX999"]
+
+    @pytest.fixture
+    def raw_alternative_message(self):
+        def encode(content):
+            return base64.urlsafe_b64encode(content).decode("utf-8")
+
+        return {
+            "id": "123AAB",
+            "payload": {
+                "partId": "",
+                "mimeType": "multipart/mixed",
+                "parts": [
+                    {
+                        "partId": "0",
+                        "mimeType": "multipart/alternative",
+                        "parts": [
+                            {
+                                "partId": "0.0",
+                                "mimeType": "text/plain",
+                                "headers": [
+                                    {
+                                        "name": "Content-Type",
+                                        "value": 'text/plain; charset="ISO-8859-1"',
+                                    }
+                                ],
+                                "body": {
+                                    "data": encode("Olá, João".encode("latin-1")),
+                                    "size": 9,
+                                },
+                            },
+                            {
+                                "partId": "0.1",
+                                "mimeType": "text/html",
+                                "body": {"attachmentId": "CCX900", "size": 2048},
+                            },
+                        ],
+                    },
+                    {
+                        "partId": "1",
+                        "mimeType": "text/plain",
+                        "filename": "notes.txt",
+                        "body": {"attachmentId": "CCX901", "size": 12},
+                    },
+                ],
+            },
+        }
+
+    def test_it_decodes_bodies_with_their_charset(
+        self, client, raw_alternative_message
+    ):
+        message = Message(client, raw_alternative_message)
+        assert message.text_body == "Olá, João"
+        assert message.text_body is message.text_body
+        assert message.text_part.charset == "ISO-8859-1"
+        assert [part.part_id for part in message.iter_body_parts()] == ["0.0", "0.1"]
+
+    def test_it_fetches_bodies_stored_apart_once(
+        self, mocker, client, raw_alternative_message
+    ):
+        mocked_get_attachment_body = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_attachment_body",
+            return_value=AttachmentBody(
+                {"data": base64.urlsafe_b64encode(b"<p>Hi</p>").decode("utf-8")}
+            ),
+        )
+        message = Message(client, raw_alternative_message)
+        assert message.html_body == "<p>Hi</p>"
+        assert message.html_body == "<p>Hi</p>"
+        mocked_get_attachment_body.assert_called_once_with("CCX900", "123AAB")
+
+    def test_it_skips_bodies_over_the_size_cap(
+        self, mocker, client, raw_alternative_message
+    ):
+        mocked_get_attachment_body = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_attachment_body"
+        )
+        mocker.patch.object(Message, "MAX_BODY_SIZE", 1024)
+        message = Message(client, raw_alternative_message)
+        assert message.html_body is None
+        assert message.text_body == "Olá, João"
+        assert message.html_part.get_text(max_size=None) is not None
+        mocked_get_attachment_body.assert_called_once_with("CCX900", "123AAB")
+
+    def test_it_caps_body_sizes_per_call(self, mocker, client, raw_alternative_message):
+        mocked_get_attachment_body = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_attachment_body"
+        )
+        message = Message(client, raw_alternative_message)
+        assert message.get_html_body(max_size=1024) is None
+        assert message.get_text_body(max_size=1024) == "Olá, João"
+        mocked_get_attachment_body.assert_not_called()
+
+    @pytest.fixture
+    def rfc822_message(self):
+        mime = EmailMessage()
+        mime["Subject"] = "Urgent errand"
+        mime["From"] = "John Doe <john@doe.com>"
+        mime["To"] = "mary@doe.com"
+        mime.set_content("Olá, João", charset="iso-8859-1")
+        mime.add_alternative("<p>Olá, João</p>", subtype="html")
+        mime.add_attachment(
+            b"%PDF tigers", maintype="application", subtype="pdf", filename="tigers.pdf"
+        )
+
+        return mime.as_bytes()
+
+    @pytest.fixture
+    def raw_rfc822_message(self, rfc822_message):
+        return {
+            "id": "123AAB",
+            "threadId": "AA121212",
+            "labelIds": ["INBOX"],
+            "raw": base64.urlsafe_b64encode(rfc822_message).decode("utf-8"),
+        }
+
+    def test_it_parses_raw_messages_without_additional_fetch(
+        self, mocker, client, raw_rfc822_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message"
+        )
+        mocked_get_attachment_body = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_attachment_body"
+        )
+        message = Message(client, raw_rfc822_message, format="raw")
+        assert message.subject == "Urgent errand"
+        assert message.headers.get("To") == "mary@doe.com"
+        assert message.labels == ["INBOX"]
+        assert message._mime is None
+        assert message.text_body.strip() == "Olá, João"
+        assert message.html_body.strip() == "<p>Olá, João</p>"
+        assert message.text_part.charset == "iso-8859-1"
+        assert [attachment.filename for attachment in message.attachments] == [
+            "tigers.pdf"
+        ]
+        assert message.attachments[0].content == b"%PDF tigers"
+        assert message.attachments[0].mimetype == "application/pdf"
+        mocked_get_raw_message.assert_not_called()
+        mocked_get_attachment_body.assert_not_called()
+
+    def test_it_estimates_mime_part_sizes_by_encoding(
+        self, client, raw_rfc822_message
+    ):
+        message = Message(client, raw_rfc822_message, format="raw")
+        assert message.attachments[0]._body.size == len(b"%PDF tigers")
+        text_part = message.mime.get_body(("plain",))
+        assert text_part["Content-Transfer-Encoding"] != "base64"
+        assert message.text_part._body.size == len(text_part.get_payload())
+
+    def test_it_fetches_the_raw_format_for_mime_once(
+        self, mocker, client, raw_complete_message, raw_rfc822_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_rfc822_message,
+        )
+        message = Message(client, raw_complete_message)
+        assert message.mime["Subject"] == "Urgent errand"
+        assert message.mime is message.mime
+        assert message.subject == "Urgent errand"
+        mocked_get_raw_message.assert_called_once_with("123AAB", format="raw")
+
+    def test_it_saves_raw_messages(
+        self, tmp_path, client, raw_rfc822_message, rfc822_message
+    ):
+        message = Message(client, raw_rfc822_message)
+        assert b"".join(message.iter_raw(chunk_size=64)) == rfc822_message
+        destination = tmp_path / "message.eml"
+        assert message.save_raw_to(str(destination)) == len(rfc822_message)
+        assert destination.read_bytes() == rfc822_message
+
     def test_it_modifies_a_message(
         self, mocker, client, raw_incomplete_message, raw_complete_message
     ):
@@ -128,6 +486,7 @@ class TestMessage:
         raw_complete_message["payload"]["headers"].append(
             {"name": "Reply-To", "value": "luiz.rosa@loadsmart.com"}
         )
+        message = Message(client, raw_complete_message)
         assert message.reply_to == "luiz.rosa@loadsmart.com"
 
     def test_message_id_property(self, client, raw_complete_message):
@@ -137,13 +496,93 @@ class TestMessage:
             == "<BY5PR15MB353717D866FC27FEE4DB4EC7F77E0@BY5PR15MB3537.namprd15.prod.outlook.com>"
         )
         raw_complete_message["payload"]["headers"][3]["name"] = "Message-Id"
+        message = Message(client, raw_complete_message)
         assert (
             message.message_id
             == "<BY5PR15MB353717D866FC27FEE4DB4EC7F77E0@BY5PR15MB3537.namprd15.prod.outlook.com>"
         )
         raw_complete_message["payload"]["headers"][3]["name"] = "Invalid"
+        message = Message(client, raw_complete_message)
         assert message.message_id is None
 
+    def test_headers_are_case_insensitive_and_keep_repeated_ones(
+        self, client, raw_complete_message
+    ):
+        raw_complete_message["payload"]["headers"] += [
+            {"name": "Received", "value": "from mx1.loadsmart.com"},
+            {"name": "received", "value": "from mx2.loadsmart.com"},
+        ]
+        message = Message(client, raw_complete_message)
+        headers = message.headers
+        assert headers["subject"] == "Urgent errand"
+        assert headers["SUBJECT"] == "Urgent errand"
+        assert "message-id" in headers
+        assert headers.get_all("Received") == [
+            "from mx1.loadsmart.com",
+            "from mx2.loadsmart.com",
+        ]
+        assert list(headers) == ["To", "From", "Subject", "Message-ID", "Received"]
+
+    def test_headers_are_indexed_once_per_payload(
+        self, mocker, client, raw_incomplete_message, raw_complete_message
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        message = Message(client, raw_incomplete_message)
+        assert message.headers is message.headers
+        headers = message.headers
+        message._update({"payload": {"headers": []}}, "full")
+        assert message.headers is not headers
+        assert message.subject is None
+
+    def test_entities_have_no_instance_dict(self, client, raw_complete_message):
+        message = Message(client, raw_complete_message)
+        entities = [
+            message,
+            message.headers,
+            message.attachments[0],
+            AttachmentBody({}),
+            Label({}),
+        ]
+        assert all([not hasattr(entity, "__dict__") for entity in entities])
+
+    def test_compact_sheds_the_payload_and_keeps_extracted_fields(
+        self, mocker, client, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        message = Message(client, dict(raw_complete_message)).compact()
+        assert "payload" not in message._raw
+        assert message.subject == "Urgent errand"
+        assert message.labels == ["phishing"]
+        assert message.thread_id == "AA121212"
+        assert message.date == datetime.datetime(1970, 1, 19, 3, 6, 38, 665000)
+        assert [attachment.filename for attachment in message.attachments] == [
+            "fox.txt",
+            "tigers.pdf",
+            "image001.jpg",
+        ]
+        assert message.attachments[0].content_disposition == "inline"
+        assert "data" not in message.attachments[0]._raw["body"]
+        mocked_get_raw_message.assert_not_called()
+        assert message._payload["mimeType"] == "text/plain"
+        mocked_get_raw_message.assert_called_once_with("123AAB")
+
+    def test_compact_keeps_what_was_never_fetched_lazy(
+        self, mocker, client, raw_incomplete_message, raw_complete_message
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message",
+            return_value=raw_complete_message,
+        )
+        message = Message(client, raw_incomplete_message).compact()
+        assert message.subject == "Urgent errand"
+        mocked_get_raw_message.assert_called_once_with("123AAB")
+
     def test_reply(self, client, mocker, raw_complete_message):
         message = Message(client, raw_complete_message)
         expected_message_to_be_sent = {"id": "114ADC", "internalDate": "1566398665"}
@@ -179,6 +618,7 @@ class TestMessage:
         raw_complete_message["payload"]["headers"].append(
             {"name": "Reply-To", "value": "luiz.rosa@loadsmart.com"}
         )
+        message = Message(client, raw_complete_message)
         message.reply("Any content, again")
         assert mocked_send_raw_message.call_args[0][2] == "luiz.rosa@loadsmart.com"
         message.reply("Any content, again and again", use_reply_to=False)
@@ -216,6 +656,20 @@ class TestAttachment:
             raw_attachment_body["attachmentId"], "123AAB"
         )
 
+    def test_it_streams_content_fetched_once(
+        self, mocker, tmp_path, client, raw_complete_message, raw_attachment_body
+    ):
+        mocked_get_attachment_body = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_attachment_body",
+            return_value=AttachmentBody(raw_attachment_body),
+        )
+        attachment = Attachment(
+            "123AAB", client, raw_complete_message["payload"]["parts"][1]
+        )
+        assert b"".join(attachment.iter_content(8)) == attachment.content
+        assert attachment.save_to(tmp_path / "fox.txt") == 43
+        mocked_get_attachment_body.assert_called_once_with("CCX457", "123AAB")
+
 
 class TestAttachmentBody:
     def test_it_has_basic_properties_without_additional_fetch(
@@ -238,6 +692,81 @@ class TestAttachmentBody:
             == b"The Quick Brown Fox Jumps Over The Lazy Dog"
         )
 
+    def test_it_decodes_content_once(self, mocker, raw_attachment_body):
+        mocked_decode = mocker.spy(base64, "urlsafe_b64decode")
+        complete_attachment_body = AttachmentBody(raw_attachment_body)
+        assert complete_attachment_body.content is complete_attachment_body.content
+        assert mocked_decode.call_count == 1
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1024])
+    def test_it_iterates_decoded_content_in_chunks(
+        self, raw_attachment_body, chunk_size
+    ):
+        chunks = list(AttachmentBody(raw_attachment_body).iter_content(chunk_size))
+        assert b"".join(chunks) == b"The Quick Brown Fox Jumps Over The Lazy Dog"
+        assert all(len(chunk) <= max(chunk_size, 3) for chunk in chunks)
+
+    def test_it_computes_the_decoded_size(self, raw_attachment_body):
+        assert AttachmentBody(raw_attachment_body).decoded_size == 43
+
+    @pytest.mark.parametrize("memory_map", [False, True])
+    def test_it_saves_content_to_a_path(self, tmp_path, raw_attachment_body, memory_map):
+        path = tmp_path / "fox.txt"
+        written = AttachmentBody(raw_attachment_body).save_to(
+            path, chunk_size=4, memory_map=memory_map
+        )
+        assert written == 43
+        assert path.read_bytes() == b"The Quick Brown Fox Jumps Over The Lazy Dog"
+
+    def test_it_saves_content_to_a_file_object(self, raw_attachment_body):
+        destination = io.BytesIO()
+        AttachmentBody(raw_attachment_body).save_to(destination)
+        assert destination.getvalue() == b"The Quick Brown Fox Jumps Over The Lazy Dog"
+
+    def test_it_memory_maps_only_paths(self, raw_attachment_body):
+        with pytest.raises(ValueError):
+            AttachmentBody(raw_attachment_body).save_to(io.BytesIO(), memory_map=True)
+
+
+class TestThread:
+    def test_it_replies_to_the_last_message(
+        self, mocker, client, raw_complete_thread
+    ):
+        mocked_get_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_message"
+        )
+        mocked_send_raw_message = mocker.patch(
+            "gmail_wrapper.client.GmailClient.send_raw",
+            return_value={"id": "114ADC", "internalDate": "1566398665"},
+        )
+        thread = Thread(client, raw_complete_thread)
+        thread.reply("The quick brown fox jumps over the lazy dog")
+        mocked_send_raw_message.assert_called_once_with(
+            "Re:Re:Urgent errand",
+            "The quick brown fox jumps over the lazy dog",
+            "foo+reply@loadsmart.com",
+            None,
+            None,
+            ["<CAF123@mail.gmail.com>"],
+            ["<CAF123@mail.gmail.com>"],
+            "AA121212",
+        )
+        mocked_get_raw_message.assert_not_called()
+
+    def test_it_memoizes_its_messages(self, client, raw_complete_thread):
+        thread = Thread(client, raw_complete_thread)
+        messages = thread.messages
+        assert messages[0] is thread.messages[0]
+        assert thread.last_message is messages[-1]
+        thread._update({"messages": raw_complete_thread["messages"][:1]}, None)
+        assert len(thread.messages) == 1
+        assert thread.messages[0] is not messages[0]
+
+    def test_it_has_no_last_message_when_empty(self, client):
+        thread = Thread(client, {"id": "AA121212", "messages": []})
+        assert thread.messages == []
+        assert thread.last_message is None
+
 
 class TestLabel:
     def test_it_has_properties_with_incomplete_label(
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from gmail_wrapper.entities import Label
+from gmail_wrapper.label_index import LabelIndex, is_label_id
+
+
+@pytest.fixture
+def mocked_get_labels(mocker, client):
+    return mocker.patch(
+        "gmail_wrapper.client.GmailClient.get_labels",
+        return_value=[
+            Label({"id": "INBOX", "name": "INBOX", "type": "system"}),
+            Label({"id": "Label_1", "name": "Processed", "type": "user"}),
+        ],
+    )
+
+
+class TestIsLabelId:
+    @pytest.mark.parametrize(
+        "value,expected",
+        [("INBOX", True), ("Label_1", True), ("processed", False), ("Inbox", False)],
+    )
+    def test_it_tells_ids_from_names(self, value, expected):
+        assert is_label_id(value) is expected
+
+
+class TestLabelIndex:
+    def test_it_looks_labels_up_by_id_and_name(self, client, mocked_get_labels):
+        label_index = LabelIndex(client)
+        assert label_index.get_by_id("Label_1").name == "Processed"
+        assert label_index.get_by_name("processed").id == "Label_1"
+        assert label_index.get("INBOX").id == "INBOX"
+        assert label_index.get("unknown") is None
+        mocked_get_labels.assert_called_once_with()
+
+    def test_it_lists_labels_again_once_expired(self, client, mocked_get_labels):
+        label_index = LabelIndex(client, ttl=0.05)
+        label_index.get_by_id("Label_1")
+        label_index.get_by_id("Label_1")
+        time.sleep(0.1)
+        label_index.get_by_id("Label_1")
+        assert mocked_get_labels.call_count == 2
+
+    def test_it_tracks_created_and_deleted_labels(self, client, mocked_get_labels):
+        label_index = LabelIndex(client)
+        assert len(label_index.labels) == 2
+        label_index.add(Label({"id": "Label_2", "name": "Archived"}))
+        assert label_index.get_by_name("archived").id == "Label_2"
+        label_index.remove("Label_1")
+        assert label_index.get_by_name("processed") is None
+        assert len(label_index.labels) == 2
+        label_index.invalidate()
+        assert label_index.get_by_name("processed").id == "Label_1"
+        assert mocked_get_labels.call_count == 2
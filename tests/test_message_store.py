@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from gmail_wrapper.message_store import MemoryMessageStore, SqliteMessageStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_message_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryMessageStore(**kwargs)
+        return SqliteMessageStore(str(tmp_path / "messages.sqlite"), **kwargs)
+
+    return make
+
+
+class TestMessageStore:
+    def test_it_returns_stored_messages(self, make_message_store):
+        message_store = make_message_store()
+        message_store.set("foo@bar.com", "123AAB", {"id": "123AAB", "historyId": "1"})
+        assert message_store.get("foo@bar.com", "123AAB") == {
+            "id": "123AAB",
+            "historyId": "1",
+        }
+        assert message_store.get("foo@bar.com", "456CCD") is None
+
+    def test_it_isolates_mailboxes(self, make_message_store):
+        message_store = make_message_store(max_messages=2)
+        message_store.set("foo@bar.com", "123AAB", {"id": "123AAB"})
+        message_store.set("john@doe.com", "123AAB", {"id": "123AAB", "snippet": "Hi"})
+        assert message_store.get("foo@bar.com", "123AAB") == {"id": "123AAB"}
+        assert message_store.get("mary@doe.com", "123AAB") is None
+        message_store.delete("john@doe.com", "123AAB")
+        assert message_store.get("foo@bar.com", "123AAB") is not None
+        assert len(message_store) == 1
+
+    def test_it_hands_out_copies(self, make_message_store):
+        message_store = make_message_store()
+        message_store.set(
+            "foo@bar.com", "123AAB", {"id": "123AAB", "labelIds": ["INBOX"]}
+        )
+        message_store.get("foo@bar.com", "123AAB")["labelIds"].append("UNREAD")
+        assert message_store.get("foo@bar.com", "123AAB")["labelIds"] == ["INBOX"]
+
+    def test_it_expires_messages_after_max_age(self, make_message_store):
+        message_store = make_message_store(max_age=0.05)
+        message_store.set("foo@bar.com", "123AAB", {"id": "123AAB"})
+        assert message_store.get("foo@bar.com", "123AAB") is not None
+        time.sleep(0.1)
+        assert message_store.get("foo@bar.com", "123AAB") is None
+
+    def test_it_evicts_the_least_recently_used_messages(self, make_message_store):
+        message_store = make_message_store(max_messages=2)
+        message_store.set("foo@bar.com", "1", {"id": "1"})
+        time.sleep(0.01)
+        message_store.set("foo@bar.com", "2", {"id": "2"})
+        time.sleep(0.01)
+        message_store.get("foo@bar.com", "1")
+        time.sleep(0.01)
+        message_store.set("foo@bar.com", "3", {"id": "3"})
+        assert message_store.get("foo@bar.com", "2") is None
+        assert message_store.get("foo@bar.com", "1") == {"id": "1"}
+        assert len(message_store) == 2
+
+    def test_it_deletes_messages(self, make_message_store):
+        message_store = make_message_store()
+        message_store.set("foo@bar.com", "123AAB", {"id": "123AAB"})
+        message_store.delete("foo@bar.com", "123AAB")
+        assert message_store.get("foo@bar.com", "123AAB") is None
+
+    def test_sqlite_store_is_shared_through_the_file(self, tmp_path):
+        path = str(tmp_path / "messages.sqlite")
+        SqliteMessageStore(path).set("foo@bar.com", "123AAB", {"id": "123AAB"})
+        assert SqliteMessageStore(path).get("foo@bar.com", "123AAB") == {"id": "123AAB"}
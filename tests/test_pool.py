@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from gmail_wrapper import GmailClient, GmailClientPool
+from gmail_wrapper.transport import PooledHttp
+
+
+@pytest.fixture
+def mocked_account_credentials(mocker):
+    credentials = mocker.MagicMock()
+    credentials.with_subject.side_effect = lambda email: mocker.MagicMock(subject=email)
+    mocker.patch(
+        "gmail_wrapper.pool.service_account.Credentials.from_service_account_info",
+        return_value=credentials,
+    )
+    return credentials
+
+
+@pytest.fixture
+def mocked_build_service(mocker):
+    return mocker.patch("gmail_wrapper.client.build_service")
+
+
+class TestGmailClientPool:
+    def test_it_parses_the_account_once(
+        self, mocked_account_credentials, mocked_build_service
+    ):
+        pool = GmailClientPool({"type": "service_account"})
+        first_client = pool.get_client("foo@bar.com")
+        second_client = pool.get_client("john@doe.com")
+        assert isinstance(first_client, GmailClient)
+        assert first_client.email == "foo@bar.com"
+        assert first_client.credentials.subject == "foo@bar.com"
+        assert second_client.credentials.subject == "john@doe.com"
+        assert mocked_account_credentials.with_subject.call_count == 2
+
+    def test_clients_share_the_transport_and_token_cache(
+        self, mocked_account_credentials, mocked_build_service
+    ):
+        pool = GmailClientPool({"type": "service_account"})
+        first_client = pool.get_client("foo@bar.com")
+        second_client = pool.get_client("john@doe.com")
+        assert first_client.token_cache is second_client.token_cache
+        assert (
+            mocked_build_service.call_args_list[0][0][1]
+            is mocked_build_service.call_args_list[1][0][1]
+        )
+
+    def test_it_reuses_clients(self, mocked_account_credentials, mocked_build_service):
+        pool = GmailClientPool({"type": "service_account"})
+        assert pool.get_client("foo@bar.com") is pool.get_client("foo@bar.com")
+        assert mocked_build_service.call_count == 1
+
+    def test_it_evicts_the_least_recently_used_client(
+        self, mocked_account_credentials, mocked_build_service
+    ):
+        pool = GmailClientPool({"type": "service_account"}, max_clients=2)
+        pool.get_client("a@bar.com")
+        pool.get_client("b@bar.com")
+        pool.get_client("a@bar.com")
+        pool.get_client("c@bar.com")
+        assert len(pool) == 2
+        assert "a@bar.com" in pool
+        assert "b@bar.com" not in pool
+        pool.evict("a@bar.com")
+        assert "a@bar.com" not in pool
+
+    def test_threads_share_the_pooled_transport(
+        self, mocked_account_credentials, mocked_build_service
+    ):
+        pool = GmailClientPool({"type": "service_account"})
+        pool.get_client("a@bar.com")
+        thread = threading.Thread(target=pool.get_client, args=("b@bar.com",))
+        thread.start()
+        thread.join()
+        transports = [call[0][1] for call in mocked_build_service.call_args_list]
+        assert isinstance(transports[0], PooledHttp)
+        assert transports[0] is transports[1]
+
+    def test_it_plugs_a_given_transport(
+        self, mocker, mocked_account_credentials, mocked_build_service
+    ):
+        http = mocker.sentinel.http
+        GmailClientPool({"type": "service_account"}, http=http).get_client("a@bar.com")
+        assert mocked_build_service.call_args[0][1] is http
@@ -0,0 +1,140 @@
+import base64
+import io
+import json
+import threading
+
+import pytest
+
+from gmail_wrapper.entities import MessageAdded
+from gmail_wrapper.push import PushDispatcher, decode_push_message
+
+
+def make_push_payload(email_address="foo@bar.com", history_id=110):
+    data = json.dumps({"emailAddress": email_address, "historyId": history_id})
+    return json.dumps(
+        {
+            "message": {
+                "data": base64.b64encode(data.encode("utf-8")).decode("utf-8"),
+                "messageId": "2070443601311540",
+                "publishTime": "2021-02-26T19:13:55.749Z",
+            },
+            "subscription": "projects/myproject/subscriptions/mysubscription",
+        }
+    ).encode("utf-8")
+
+
+def post(dispatcher, body):
+    responses = []
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+    }
+    dispatcher.wsgi_app(environ, lambda status, headers: responses.append(status))
+
+    return responses[0]
+
+
+@pytest.fixture
+def mocked_sync(mocker, client):
+    def sync(start_history_id):
+        mailbox_sync = mocker.MagicMock(history_id="120")
+        mailbox_sync.__iter__.return_value = iter(
+            [MessageAdded(client, "115", {"message": {"id": "123AAB"}})]
+        )
+        return mailbox_sync
+
+    return mocker.patch("gmail_wrapper.client.GmailClient.sync", side_effect=sync)
+
+
+class TestDecodePushMessage:
+    def test_it_decodes_the_gmail_notification(self):
+        notification = decode_push_message(make_push_payload())
+        assert notification.email_address == "foo@bar.com"
+        assert notification.history_id == "110"
+        assert notification.message_id == "2070443601311540"
+
+    @pytest.mark.parametrize(
+        "payload", [b"not json", b"{}", json.dumps({"message": {"data": "e30="}})]
+    )
+    def test_it_rejects_invalid_payloads(self, payload):
+        with pytest.raises(ValueError):
+            decode_push_message(payload)
+
+
+class TestPushDispatcher:
+    def test_it_coalesces_notifications_into_one_sync(self, client, mocked_sync):
+        handled = []
+        dispatcher = PushDispatcher(
+            lambda email: client,
+            lambda email, event: handled.append((email, event.message_id)),
+            checkpoints={"foo@bar.com": "100"},
+            debounce=60,
+        )
+        for history_id in (105, 110, 112):
+            assert post(dispatcher, make_push_payload(history_id=history_id)) == (
+                "204 No Content"
+            )
+        assert dispatcher.pending == ["foo@bar.com"]
+        dispatcher.flush()
+        mocked_sync.assert_called_once_with("100")
+        assert handled == [("foo@bar.com", "123AAB")]
+        assert dispatcher.checkpoints == {"foo@bar.com": "120"}
+        assert dispatcher.pending == []
+
+    def test_it_syncs_after_the_debounce_window(self, client, mocked_sync):
+        handled = threading.Event()
+        dispatcher = PushDispatcher(
+            lambda email: client,
+            lambda email, event: handled.set(),
+            checkpoints={"foo@bar.com": "100"},
+            debounce=0.01,
+        )
+        dispatcher.dispatch_payload(make_push_payload())
+        assert handled.wait(1)
+        mocked_sync.assert_called_once_with("100")
+
+    def test_it_skips_notifications_already_synced(self, client, mocked_sync):
+        dispatcher = PushDispatcher(
+            lambda email: client, None, checkpoints={"foo@bar.com": "110"}
+        )
+        dispatcher.dispatch_payload(make_push_payload(history_id=110))
+        assert dispatcher.pending == []
+
+    def test_it_checkpoints_mailboxes_seen_for_the_first_time(
+        self, client, mocked_sync
+    ):
+        dispatcher = PushDispatcher(lambda email: client, None)
+        dispatcher.dispatch_payload(make_push_payload(history_id=110))
+        assert dispatcher.pending == []
+        assert dispatcher.checkpoints == {"foo@bar.com": "110"}
+
+    def test_it_checkpoints_watched_mailboxes(self, mocker, client):
+        mocked_watch = mocker.patch(
+            "gmail_wrapper.client.GmailClient.watch",
+            return_value={"historyId": "100", "expiration": "1431990098200"},
+        )
+        dispatcher = PushDispatcher(lambda email: client, None)
+        dispatcher.watch("foo@bar.com", "projects/myproject/topics/gmail")
+        mocked_watch.assert_called_once_with("projects/myproject/topics/gmail", None)
+        assert dispatcher.checkpoints == {"foo@bar.com": "100"}
+
+    def test_it_rejects_invalid_posts(self, client):
+        dispatcher = PushDispatcher(lambda email: client, None)
+        assert post(dispatcher, b"{}") == "400 Bad Request"
+
+
+class TestWatch:
+    def test_it_watches_the_mailbox(self, client):
+        client.watch("projects/myproject/topics/gmail", label_ids=["INBOX"])
+        client._client.users().watch.assert_called_once_with(
+            userId="foo@bar.com",
+            body={
+                "topicName": "projects/myproject/topics/gmail",
+                "labelIds": ["INBOX"],
+            },
+        )
+
+    def test_it_stops_watching_the_mailbox(self, client):
+        client.stop()
+        client._client.users().stop.assert_called_once_with(userId="foo@bar.com")
@@ -0,0 +1,231 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmail_wrapper import GmailClient
+from gmail_wrapper.exceptions import GmailError
+from gmail_wrapper.scheduler import (
+    QuotaScheduler,
+    TokenBucket,
+    is_retryable,
+    quota_units,
+    is_idempotent,
+    retry_after,
+)
+from tests.utils import make_gmail_client, make_batch_client
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_http_error(status, reason=None, headers=None):
+    content = {"error": {"code": status}}
+    if reason:
+        content["error"]["errors"] = [{"reason": reason}]
+    resp = httplib2.Response({"status": status, **(headers if headers else {})})
+    return HttpError(resp, json.dumps(content).encode("utf-8"))
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    return QuotaScheduler(units_per_second=100, clock=clock, sleep=clock.sleep)
+
+
+class TestRetryableErrors:
+    @pytest.mark.parametrize(
+        "error,expected",
+        [
+            (make_http_error(429), True),
+            (make_http_error(503), True),
+            (make_http_error(403, "userRateLimitExceeded"), True),
+            (make_http_error(403, "rateLimitExceeded"), True),
+            (make_http_error(403, "forbidden"), False),
+            (make_http_error(404), False),
+            (ValueError(), False),
+        ],
+    )
+    def test_is_retryable(self, error, expected):
+        assert is_retryable(error) == expected
+
+    @pytest.mark.parametrize(
+        "error,expected",
+        [
+            (make_http_error(429), True),
+            (make_http_error(403, "userRateLimitExceeded"), True),
+            (make_http_error(500), False),
+            (make_http_error(503), False),
+        ],
+    )
+    def test_non_idempotent_requests_are_retryable_only_when_rate_limited(
+        self, error, expected
+    ):
+        assert is_retryable(error, idempotent=False) == expected
+
+    def test_is_idempotent(self, mocker):
+        assert is_idempotent(mocker.MagicMock(methodId="gmail.users.messages.get"))
+        assert not is_idempotent(
+            mocker.MagicMock(methodId="gmail.users.messages.send")
+        )
+
+    def test_retry_after_in_seconds(self):
+        assert retry_after(make_http_error(429, headers={"retry-after": "7"})) == 7
+        assert retry_after(make_http_error(429)) is None
+
+    def test_quota_units(self, mocker):
+        assert (
+            quota_units(mocker.MagicMock(methodId="gmail.users.messages.send")) == 100
+        )
+        assert quota_units(mocker.MagicMock(methodId="gmail.users.labels.list")) == 1
+
+
+class TestTokenBucket:
+    def test_it_waits_for_units_to_refill(self, clock):
+        bucket = TokenBucket(100, 100, clock=clock, sleep=clock.sleep)
+        bucket.acquire(100)
+        assert clock.sleeps == []
+        bucket.acquire(50)
+        assert clock.sleeps == [0.5]
+
+    def test_it_charges_requests_larger_than_the_bucket_in_full(self, clock):
+        bucket = TokenBucket(100, 100, clock=clock, sleep=clock.sleep)
+        for _ in range(10):
+            # A hydration batch of 100 messages.get
+            bucket.acquire(500)
+        assert clock.now == pytest.approx(45)
+        bucket.acquire(5)
+        assert clock.now == pytest.approx(49.05)
+
+    def test_pause_holds_callers(self, clock):
+        bucket = TokenBucket(100, 100, clock=clock, sleep=clock.sleep)
+        bucket.pause(3)
+        bucket.acquire(5)
+        assert clock.now >= 3
+
+
+class TestQuotaScheduler:
+    def test_it_paces_requests_by_their_cost(self, scheduler, clock):
+        for _ in range(4):
+            scheduler.run("foo@bar.com", 50, lambda: None)
+        assert clock.now == pytest.approx(1)
+        scheduler.run("john@doe.com", 100, lambda: None)
+        assert clock.now == pytest.approx(1)
+
+    def test_it_retries_with_backoff_honouring_retry_after(
+        self, mocker, scheduler, clock
+    ):
+        call = mocker.MagicMock(
+            side_effect=[
+                make_http_error(429, headers={"retry-after": "10"}),
+                make_http_error(503),
+                "response",
+            ]
+        )
+        assert scheduler.run("foo@bar.com", 5, call) == "response"
+        assert call.call_count == 3
+        assert clock.sleeps[0] >= 10
+        assert clock.sleeps[1] <= 2
+
+    def test_it_gives_up_after_max_retries(self, mocker, clock):
+        scheduler = QuotaScheduler(max_retries=2, clock=clock, sleep=clock.sleep)
+        call = mocker.MagicMock(side_effect=make_http_error(429))
+        with pytest.raises(HttpError):
+            scheduler.run("foo@bar.com", 5, call)
+        assert call.call_count == 3
+
+    def test_it_does_not_retry_server_errors_of_non_idempotent_calls(
+        self, mocker, scheduler
+    ):
+        call = mocker.MagicMock(side_effect=make_http_error(503))
+        with pytest.raises(HttpError):
+            scheduler.run("foo@bar.com", 100, call, idempotent=False)
+        assert call.call_count == 1
+
+    def test_it_does_not_retry_other_errors(self, mocker, scheduler):
+        call = mocker.MagicMock(side_effect=make_http_error(404))
+        with pytest.raises(HttpError):
+            scheduler.run("foo@bar.com", 5, call)
+        assert call.call_count == 1
+
+
+class TestClientScheduler:
+    def test_it_runs_requests_through_the_scheduler(self, mocker, scheduler):
+        mocked_gmail_client = make_gmail_client(
+            mocker,
+            get_effect=[make_http_error(500), {"id": "123AAB"}],
+        )
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=mocked_gmail_client,
+        )
+        mocked_gmail_client().users().messages().get.return_value.methodId = (
+            "gmail.users.messages.get"
+        )
+        client = GmailClient(
+            email="foo@bar.com", secrets_json_string="{}", scheduler=scheduler
+        )
+        mocked_run = mocker.spy(scheduler, "run")
+        assert client.get_raw_message("123AAB") == {"id": "123AAB"}
+        assert mocked_run.call_args[0][:2] == ("foo@bar.com", 5)
+
+    def test_it_does_not_resend_messages_on_server_errors(self, mocker, scheduler):
+        mocked_gmail_client = make_gmail_client(mocker)
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=mocked_gmail_client,
+        )
+        send = mocked_gmail_client().users().messages().send.return_value
+        send.methodId = "gmail.users.messages.send"
+        send.execute.side_effect = [make_http_error(503), {"id": "114ADC"}]
+        client = GmailClient(
+            email="foo@bar.com", secrets_json_string="{}", scheduler=scheduler
+        )
+        with pytest.raises(GmailError):
+            client.send_raw("Subject", "Content", "john@doe.com")
+        assert send.execute.call_count == 1
+
+    def test_it_still_encapsulates_exhausted_server_errors(self, mocker, clock):
+        scheduler = QuotaScheduler(max_retries=1, clock=clock, sleep=clock.sleep)
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient._make_client",
+            return_value=make_gmail_client(mocker, list_effect=make_http_error(500)),
+        )
+        client = GmailClient(
+            email="foo@bar.com", secrets_json_string="{}", scheduler=scheduler
+        )
+        with pytest.raises(GmailError):
+            client.get_raw_messages()
+
+    def test_it_retries_only_rate_limited_requests_of_a_batch(
+        self, mocker, client, scheduler
+    ):
+        client.scheduler = scheduler
+        responses = {"1": {"id": "1"}, "2": make_http_error(429)}
+        batches = make_batch_client(mocker, client, responses)
+
+        def succeed_on_retry(*args, **kwargs):
+            responses["2"] = {"id": "2"}
+            return None
+
+        mocker.patch.object(
+            scheduler, "wait_before_retry", side_effect=succeed_on_retry
+        )
+        raw_messages = client.get_raw_messages_batch(["1", "2"])
+        assert raw_messages == [{"id": "1"}, {"id": "2"}]
+        assert [batch.request_ids for batch in batches] == [["1", "2"], ["2"]]
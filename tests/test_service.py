@@ -0,0 +1,31 @@
+from google.auth.credentials import AnonymousCredentials
+
+from gmail_wrapper import service
+from gmail_wrapper.service import build_service
+
+
+class TestBuildService:
+    def test_it_builds_from_the_bundled_document_without_network(self, mocker):
+        mocked_build = mocker.patch("googleapiclient.discovery.build")
+        gmail = build_service(AnonymousCredentials())
+        request = gmail.users().messages().get(userId="foo@bar.com", id="123AAB")
+        assert request.uri.startswith(
+            "https://gmail.googleapis.com/gmail/v1/users/foo%40bar.com/messages/123AAB"
+        )
+        mocked_build.assert_not_called()
+
+    def test_it_parses_the_document_once(self, mocker):
+        build_service(AnonymousCredentials())
+        mocked_load = mocker.spy(service.json, "load")
+        build_service(AnonymousCredentials())
+        mocked_load.assert_not_called()
+
+    def test_each_service_has_its_own_transport(self):
+        credentials = AnonymousCredentials()
+        first_service = build_service(credentials)
+        second_service = build_service(credentials)
+        assert first_service._http is not second_service._http
+        assert first_service._http.credentials is credentials
+        assert first_service.users().labels().list(userId="me").http is (
+            first_service._http
+        )
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from gmail_wrapper.single_flight import SingleFlight
+from tests.utils import patch_single_flight_followers
+
+
+def wait_for_followers(entered, following, count):
+    assert entered.wait(5)
+    for _ in range(count - 1):
+        assert following.acquire(timeout=5)
+
+
+def run_concurrently(single_flight, call, count):
+    outcomes = []
+
+    def run():
+        try:
+            outcomes.append(single_flight.run("123AAB", call))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+
+    return threads, outcomes
+
+
+class TestSingleFlight:
+    def test_it_runs_concurrent_calls_of_a_key_once(self, mocker):
+        following = patch_single_flight_followers(mocker)
+        single_flight = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(None)
+            entered.set()
+            release.wait()
+            return {"id": "123AAB"}
+
+        threads, outcomes = run_concurrently(single_flight, call, 4)
+        wait_for_followers(entered, following, 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert outcomes == [{"id": "123AAB"}] * 4
+
+    def test_it_shares_exceptions_with_waiting_callers(self, mocker):
+        following = patch_single_flight_followers(mocker)
+        single_flight = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(None)
+            entered.set()
+            release.wait()
+            raise ValueError("boom")
+
+        threads, outcomes = run_concurrently(single_flight, call, 3)
+        wait_for_followers(entered, following, 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert len(outcomes) == 3
+        assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+    def test_it_forgets_finished_calls(self):
+        single_flight = SingleFlight()
+        assert single_flight.run("123AAB", lambda: 1) == 1
+        assert single_flight.run("123AAB", lambda: 2) == 2
+        with pytest.raises(KeyError):
+            single_flight.run("123AAB", lambda: {}["missing"])
+        assert single_flight._calls == {}
@@ -0,0 +1,143 @@
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmail_wrapper.entities import (
+    Message,
+    MessageAdded,
+    MessageDeleted,
+    LabelsAdded,
+    LabelsRemoved,
+)
+from gmail_wrapper.exceptions import HistoryNotFoundError
+
+
+@pytest.fixture
+def raw_history_pages():
+    return [
+        {
+            "history": [
+                {
+                    "id": "101",
+                    "messages": [{"id": "123AAB", "threadId": "AA121212"}],
+                    "messagesAdded": [
+                        {
+                            "message": {
+                                "id": "123AAB",
+                                "threadId": "AA121212",
+                                "labelIds": ["INBOX"],
+                            }
+                        }
+                    ],
+                },
+                {
+                    "id": "102",
+                    "labelsAdded": [
+                        {
+                            "message": {"id": "123AAB", "threadId": "AA121212"},
+                            "labelIds": ["STARRED"],
+                        }
+                    ],
+                    "labelsRemoved": [
+                        {
+                            "message": {"id": "123AAB", "threadId": "AA121212"},
+                            "labelIds": ["UNREAD"],
+                        }
+                    ],
+                },
+            ],
+            "nextPageToken": "page-2",
+            "historyId": "105",
+        },
+        {
+            "history": [
+                {
+                    "id": "104",
+                    "messagesDeleted": [{"message": {"id": "456CCD"}}],
+                }
+            ],
+            "historyId": "106",
+        },
+    ]
+
+
+class TestGetRawHistory:
+    def test_it_lists_history_since_the_given_id(self, client):
+        client.get_raw_history(
+            "100", page_token="page-2", history_types=["messageAdded"], limit=50
+        )
+        client._client.users().history().list.assert_called_once_with(
+            userId="foo@bar.com",
+            startHistoryId="100",
+            pageToken="page-2",
+            historyTypes=["messageAdded"],
+            maxResults=50,
+        )
+
+    def test_it_raises_when_the_history_id_is_too_old(self, mocker, client):
+        error_response = mocker.MagicMock(status=404)
+        client._client.users().history().list().execute.side_effect = HttpError(
+            error_response, b"Content"
+        )
+        with pytest.raises(HistoryNotFoundError):
+            client.get_raw_history("100")
+
+
+class TestSync:
+    def test_it_yields_typed_events_across_pages(
+        self, mocker, client, raw_history_pages
+    ):
+        mocked_get_raw_history = mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            side_effect=raw_history_pages,
+        )
+        sync = client.sync("100")
+        events = list(sync)
+        assert [type(event) for event in events] == [
+            MessageAdded,
+            LabelsAdded,
+            LabelsRemoved,
+            MessageDeleted,
+        ]
+        assert [event.history_id for event in events] == ["101", "102", "102", "104"]
+        assert isinstance(events[0].message, Message)
+        assert events[0].message.labels == ["INBOX"]
+        assert events[1].label_ids == ["STARRED"]
+        assert events[3].message_id == "456CCD"
+        assert sync.history_id == "106"
+        assert not sync.resynced
+        assert mocked_get_raw_history.call_args_list[1][1]["page_token"] == "page-2"
+
+    def test_it_keeps_the_checkpoint_without_changes(self, mocker, client):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            return_value={"historyId": "100"},
+        )
+        sync = client.sync("100")
+        assert list(sync) == []
+        assert sync.history_id == "100"
+
+    @pytest.mark.parametrize("start_history_id", [None, "1"])
+    def test_it_resyncs_when_there_is_no_usable_history(
+        self, mocker, client, start_history_id
+    ):
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_history",
+            side_effect=HistoryNotFoundError("1"),
+        )
+        mocker.patch(
+            "gmail_wrapper.client.GmailClient.get_raw_profile",
+            return_value={"emailAddress": "foo@bar.com", "historyId": "200"},
+        )
+        mocked_iter_messages = mocker.patch(
+            "gmail_wrapper.client.GmailClient.iter_messages",
+            return_value=iter(
+                [Message(client, {"id": "123AAB"}), Message(client, {"id": "456CCD"})]
+            ),
+        )
+        sync = client.sync(start_history_id, resync_query="label:inbox")
+        events = list(sync)
+        assert [event.message_id for event in events] == ["123AAB", "456CCD"]
+        assert all(isinstance(event, MessageAdded) for event in events)
+        assert sync.resynced
+        assert sync.history_id == "200"
+        mocked_iter_messages.assert_called_once_with(query="label:inbox", page_size=500)
@@ -0,0 +1,177 @@
+import datetime
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from gmail_wrapper import GmailClient
+from gmail_wrapper.token_cache import (
+    MemoryTokenCache,
+    SqliteTokenCache,
+    token_cache_key,
+)
+
+
+def make_credentials(refresh_token="MyRefresh", scopes=None):
+    return Credentials(
+        None,
+        refresh_token=refresh_token,
+        client_id="foo-app.apps.googleusercontent.com",
+        client_secret="JohnDoeCries",
+        token_uri="https://oauth2.googleapis.com/token",
+        scopes=scopes if scopes else [GmailClient.SCOPE_READONLY],
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def token_cache(request, tmp_path):
+    if request.param == "memory":
+        return MemoryTokenCache()
+    return SqliteTokenCache(str(tmp_path / "tokens.sqlite"))
+
+
+class TestTokenCacheKey:
+    def test_it_is_stable_for_the_same_identity(self):
+        assert token_cache_key(make_credentials(), "foo@bar.com") == token_cache_key(
+            make_credentials(), "foo@bar.com"
+        )
+
+    def test_it_changes_with_subject_scopes_and_secrets(self):
+        key = token_cache_key(make_credentials(), "foo@bar.com")
+        assert key != token_cache_key(make_credentials(), "john@doe.com")
+        assert key != token_cache_key(
+            make_credentials(scopes=[GmailClient.SCOPE_MODIFY]), "foo@bar.com"
+        )
+        assert key != token_cache_key(
+            make_credentials(refresh_token="OtherRefresh"), "foo@bar.com"
+        )
+        assert "MyRefresh" not in key
+
+
+class TestTokenCache:
+    def test_it_returns_fresh_tokens(self, token_cache):
+        expiry = (datetime.datetime.utcnow() + datetime.timedelta(hours=1)).replace(
+            microsecond=0
+        )
+        token_cache.set("key", "token", expiry)
+        assert token_cache.get("key") == ("token", expiry)
+        assert token_cache.get("other") is None
+
+    def test_it_skips_tokens_about_to_expire(self, token_cache):
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=2)
+        token_cache.set("key", "token", expiry)
+        assert token_cache.get("key") is None
+
+    def test_memory_cache_drops_stale_tokens(self):
+        token_cache = MemoryTokenCache()
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=2)
+        token_cache.set("key", "token", expiry)
+        assert token_cache.get("key") is None
+        assert len(token_cache) == 0
+
+    def test_memory_cache_evicts_least_recently_used_tokens(self):
+        token_cache = MemoryTokenCache(max_tokens=2)
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        token_cache.set("first", "token", expiry)
+        token_cache.set("second", "token", expiry)
+        token_cache.get("first")
+        token_cache.set("third", "token", expiry)
+        assert len(token_cache) == 2
+        assert token_cache.get("second") is None
+        assert token_cache.get("first") is not None
+
+    def test_sqlite_cache_is_shared_through_the_file(self, tmp_path):
+        path = str(tmp_path / "tokens.sqlite")
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        SqliteTokenCache(path).set("key", "token", expiry)
+        assert SqliteTokenCache(path).get("key")[0] == "token"
+
+
+class TestClientTokenCache:
+    def test_it_reuses_cached_tokens_across_clients(
+        self, mocker, secrets_string, token_cache
+    ):
+        mocker.patch("gmail_wrapper.client.build_service")
+
+        def refresh(credentials, request):
+            credentials.token = "fresh-token"
+            credentials.expiry = datetime.datetime.utcnow() + datetime.timedelta(
+                hours=1
+            )
+
+        mocked_refresh = mocker.patch.object(
+            Credentials, "refresh", autospec=True, side_effect=refresh
+        )
+        first_client = GmailClient(
+            "foo@bar.com", secrets_string, token_cache=token_cache
+        )
+        second_client = GmailClient(
+            "foo@bar.com", secrets_string, token_cache=token_cache
+        )
+        assert mocked_refresh.call_count == 1
+        assert second_client.credentials.token == "fresh-token"
+        assert second_client.credentials.valid
+        assert first_client.credentials is not second_client.credentials
+
+    def test_it_refreshes_without_a_cache(self, mocker, secrets_string):
+        mocker.patch("gmail_wrapper.client.build_service")
+        mocked_refresh = mocker.patch.object(Credentials, "refresh")
+        GmailClient("foo@bar.com", secrets_string)
+        GmailClient("foo@bar.com", secrets_string)
+        assert mocked_refresh.call_count == 2
+
+    def test_it_caches_tokens_refreshed_during_a_client_lifetime(
+        self, mocker, secrets_string, token_cache
+    ):
+        mocker.patch("gmail_wrapper.client.build_service")
+        tokens = iter(["first-token", "second-token"])
+
+        def refresh(credentials, request):
+            credentials.token = next(tokens)
+            credentials.expiry = (
+                datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+            ).replace(microsecond=0)
+
+        mocked_refresh = mocker.patch.object(
+            Credentials, "refresh", autospec=True, side_effect=refresh
+        )
+        first_client = GmailClient(
+            "foo@bar.com", secrets_string, token_cache=token_cache
+        )
+
+        # An hour later, the token expired and the cache holds it no more
+        expired = (datetime.datetime.utcnow() - datetime.timedelta(minutes=1)).replace(
+            microsecond=0
+        )
+        credentials = first_client.credentials._credentials
+        credentials.expiry = expired
+        token_cache.set(
+            token_cache_key(credentials, "foo@bar.com"), credentials.token, expired
+        )
+        headers = {}
+        first_client.credentials.before_request(
+            mocker.Mock(), "GET", "https://gmail.googleapis.com", headers
+        )
+        assert headers["authorization"] == "Bearer second-token"
+
+        second_client = GmailClient(
+            "foo@bar.com", secrets_string, token_cache=token_cache
+        )
+        assert mocked_refresh.call_count == 2
+        assert second_client.credentials.token == "second-token"
+
+    def test_it_refreshes_tokens_rejected_while_cached(
+        self, mocker, secrets_string, token_cache
+    ):
+        mocker.patch("gmail_wrapper.client.build_service")
+        tokens = iter(["first-token", "second-token"])
+
+        def refresh(credentials, request):
+            credentials.token = next(tokens)
+            credentials.expiry = datetime.datetime.utcnow() + datetime.timedelta(
+                hours=1
+            )
+
+        mocker.patch.object(Credentials, "refresh", autospec=True, side_effect=refresh)
+        client = GmailClient("foo@bar.com", secrets_string, token_cache=token_cache)
+        client.credentials.refresh(mocker.Mock())
+        assert client.credentials.token == "second-token"
@@ -0,0 +1,94 @@
+import socket
+
+import pytest
+import requests
+from google.auth.credentials import AnonymousCredentials
+
+from gmail_wrapper.service import build_service
+from gmail_wrapper.transport import PooledHttp
+
+
+def make_response(status_code=200, content=b"{}", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = "OK"
+    response._content = content
+    response.headers.update(headers or {"Content-Type": "application/json"})
+    return response
+
+
+@pytest.fixture
+def session(mocker):
+    session = mocker.MagicMock()
+    session.request.return_value = make_response()
+    return session
+
+
+class TestPooledHttp:
+    def test_it_answers_like_httplib2(self, session):
+        session.request.return_value = make_response(
+            404, b"Not found", {"Content-Type": "text/plain", "Retry-After": "2"}
+        )
+        http = PooledHttp(session=session)
+        response, content = http.request(
+            "https://gmail.googleapis.com/gmail/v1/users/me/profile",
+            headers={"accept": "application/json"},
+        )
+        assert response.status == 404
+        assert response["content-type"] == "text/plain"
+        assert response.get("retry-after") == "2"
+        assert content == b"Not found"
+        session.request.assert_called_once_with(
+            "GET",
+            "https://gmail.googleapis.com/gmail/v1/users/me/profile",
+            data=None,
+            headers={"accept": "application/json"},
+            timeout=PooledHttp.DEFAULT_TIMEOUT,
+            allow_redirects=True,
+        )
+
+    def test_it_reports_decoded_content(self, session):
+        session.request.return_value = make_response(
+            headers={"Content-Encoding": "gzip", "Content-Length": "10"},
+            content=b"decoded content",
+        )
+        response, _ = PooledHttp(session=session).request("https://gmail.googleapis.com")
+        assert "content-encoding" not in response
+        assert response["content-length"] == "15"
+
+    def test_it_mounts_a_pool_of_the_given_size(self):
+        http = PooledHttp(pool_size=32)
+        adapter = http.session.get_adapter("https://gmail.googleapis.com")
+        assert adapter._pool_maxsize == 32
+
+    def test_it_can_close_connections_after_each_response(self, session):
+        PooledHttp(keep_alive=False, timeout=5, session=session).request(
+            "https://gmail.googleapis.com", "POST", body="{}"
+        )
+        assert session.request.call_args[1]["headers"] == {"connection": "close"}
+        assert session.request.call_args[1]["timeout"] == 5
+
+    @pytest.mark.parametrize(
+        "error,expected_error",
+        [
+            (requests.exceptions.ReadTimeout, socket.timeout),
+            (requests.exceptions.ConnectionError, ConnectionError),
+        ],
+    )
+    def test_it_raises_errors_googleapiclient_retries(
+        self, session, error, expected_error
+    ):
+        session.request.side_effect = error("boom")
+        with pytest.raises(expected_error):
+            PooledHttp(session=session).request("https://gmail.googleapis.com")
+
+    def test_services_run_on_it_by_default(self):
+        gmail = build_service(AnonymousCredentials())
+        assert isinstance(gmail._http.http, PooledHttp)
+
+    def test_services_execute_requests_through_it(self, session):
+        session.request.return_value = make_response(content=b'{"id": "123AAB"}')
+        gmail = build_service(AnonymousCredentials(), PooledHttp(session=session))
+        request = gmail.users().messages().get(userId="me", id="123AAB")
+        assert request.execute() == {"id": "123AAB"}
+        assert session.request.call_args[0][0] == "GET"
@@ -1,3 +1,7 @@
+import threading
+from concurrent.futures import Future
+
+
 def make_gmail_client(
     mocker,
     list_return=None,
@@ -65,3 +69,52 @@ def make_gmail_client(
             users=mocker.MagicMock(return_value=mocker.MagicMock(**args))
         )
     )
+
+
+class FakeBatchHttpRequest:
+    def __init__(self, responses, callback=None):
+        self._responses = responses
+        self._callback = callback
+        self.request_ids = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.request_ids.append(request_id)
+
+    def execute(self, http=None):
+        for request_id in self.request_ids:
+            response = self._responses[request_id]
+            if isinstance(response, Exception):
+                self._callback(request_id, None, response)
+            else:
+                self._callback(request_id, response, None)
+
+
+def make_batch_client(mocker, client, responses):
+    batches = []
+
+    def new_batch_http_request(callback=None):
+        batch = FakeBatchHttpRequest(responses, callback)
+        batches.append(batch)
+        return batch
+
+    client._client.new_batch_http_request = mocker.MagicMock(
+        side_effect=new_batch_http_request
+    )
+    return batches
+
+
+def patch_single_flight_followers(mocker):
+    """
+    Counts the callers of a SingleFlight that wait on the outcome of another
+    caller: acquire the returned semaphore once per expected follower.
+    """
+    following = threading.Semaphore(0)
+
+    class FollowedFuture(Future):
+        def result(self, timeout=None):
+            following.release()
+            return super().result(timeout)
+
+    mocker.patch("gmail_wrapper.single_flight.Future", FollowedFuture)
+
+    return following